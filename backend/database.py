@@ -1,24 +1,94 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 import os
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+def _normalize_url(url):
+    # Fix for Render (postgres:// -> postgresql://)
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
 
-# Fix for Render (postgres:// -> postgresql://)
-if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def _env_int(name, default):
+    return int(os.getenv(name, default))
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    # check_same_thread is only for SQLite
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() == "true"
+
+SQLALCHEMY_DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", "sqlite:///./sql_app.db"))
+
+# Optional read-only replica for list/report endpoints (see get_read_db). Unset: use the primary.
+READ_DATABASE_URL = _normalize_url(os.getenv("READ_DATABASE_URL", ""))
+
+# Connection pool (server databases). Defaults are above SQLAlchemy's 5+10, which
+# concurrent dashboard load exhausts. Size them against the server's max_connections,
+# counting every web instance (and the replica pool, if any).
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", "10")
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", "20")
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", "30")
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", "1800") # seconds; below the server/proxy idle timeout
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "true")
+
+# SQLite (single-node deploys): WAL lets readers run alongside the writer,
+# busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+SQLITE_WAL = _env_bool("SQLITE_WAL", "true")
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", "5000")
+
+def _is_sqlite(url):
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url):
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def _configure_sqlite(engine, url):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_WAL and not _is_sqlite_memory(url):
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL") # safe with WAL, fewer fsyncs
+        cursor.close()
+
+def make_engine(url):
+    if _is_sqlite(url):
+        # check_same_thread is only for SQLite; pool sizing is left to SQLAlchemy's SQLite defaults
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        _configure_sqlite(engine, url)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if READ_DATABASE_URL:
+    read_engine = make_engine(READ_DATABASE_URL)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """
+    Session for read-only list/report endpoints: the replica when READ_DATABASE_URL is set,
+    otherwise the primary. Replica data may lag a little; never write through this session.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
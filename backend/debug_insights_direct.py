@@ -9,7 +9,7 @@ sys.path.append(os.getcwd())
 
 import models
 from database import SessionLocal
-from services.google_api import GBPClient
+from services.google_api import AsyncGBPClient
 from services.sync_service import GoogleSyncService
 
 db = SessionLocal()
@@ -38,7 +38,7 @@ async def main():
     # Refresh Token if needed (simplified)
     # ...
 
-    client = GBPClient(user.google_connection.access_token)
+    client = AsyncGBPClient(user.google_connection.access_token)
     service = GoogleSyncService(client)
     
     # Test Insights Sync
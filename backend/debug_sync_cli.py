@@ -52,13 +52,13 @@ async def debug_sync():
         # Initialize Service
         print("\nInitializing GoogleSyncService...")
         try:
-            client = google_api.GBPClient(target_user.google_connection.access_token)
+            client = google_api.AsyncGBPClient(target_user.google_connection.access_token)
             service = GoogleSyncService(client)
             
             # 1. Test basic connectivity
             print("Testing basic connectivity (get_user_info)...")
             try:
-                info = client.get_user_info()
+                info = await client.get_user_info()
                 print(f"User Info: {info.get('email')}")
             except Exception as e:
                 print(f"Connectivity check failed: {e}")
@@ -1,17 +1,23 @@
+import startup_profile # first: starts the boot clock
 import os
 from dotenv import load_dotenv
 
 # Load .env explicitly before importing other modules that use env vars
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-import models, schemas, auth
-from routers import gbp, posts, reviews, admin, locations, insights, media, qa, ai, bulk, reports, sync, optimization, messages
-from services import scheduler
+with startup_profile.phase("core (fastapi, db)"):
+    from fastapi import FastAPI, Depends, HTTPException, status
+    from fastapi.security import OAuth2PasswordRequestForm
+    from fastapi.middleware.cors import CORSMiddleware
+    from sqlalchemy.orm import Session
+    from database import SessionLocal, engine
+    import models, schemas, auth
+# Heavy service modules (openai, reportlab, bs4, apscheduler, ...) are imported inside the
+# routes/jobs that use them, so importing the routers stays cheap.
+with startup_profile.phase("routers"):
+    from routers import gbp, posts, reviews, admin, locations, insights, media, qa, ai, bulk, reports, sync, optimization, messages
+    from routers import users, debug, social_auth, companies, stores, notifications, groups, billing, support
+    from services import scheduler, http_client, ai_generator
 from datetime import timedelta
 
 from contextlib import asynccontextmanager
@@ -20,25 +26,26 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("DEBUG: Lifespan startup...")
-    scheduler.start_scheduler()
+    with startup_profile.phase("scheduler"):
+        scheduler.start_scheduler()
+    startup_profile.report()
     yield
     # Shutdown
     print("DEBUG: Lifespan shutdown...")
     scheduler.shutdown_scheduler()
+    http_client.close_session()
+    await http_client.aclose_async_client()
+    await ai_generator.aclose_async_clients()
 
-# Run DB Migration (Add store_id if missing)
-try:
-    print("DEBUG: Creating database tables...")
-    models.Base.metadata.create_all(bind=engine)
-except Exception as e:
-    print(f"CRITICAL WARNING: failed to create tables: {e}")
-
-# Run DB Migration (Add store_id if missing)
+# Run DB Migrations (versioned, see migrate_db.py; a current schema costs one query)
 try:
     print("DEBUG: Starting application...")
-    import migrate_db
-    print("DEBUG: Running DB migration... Version 1.0.3 (Tracer)")
-    migrate_db.migrate()
+    with startup_profile.phase("migrations"):
+        import migrate_db
+        if migrate_db.MIGRATE_ON_STARTUP:
+            migrate_db.migrate()
+        else:
+            migrate_db.check()
 except Exception as e:
     print(f"WARNING: DB Migration failed: {e}")
 
@@ -190,7 +197,6 @@ app.include_router(sync.router)
 app.include_router(optimization.router)
 app.include_router(messages.router)
 
-from routers import users, debug, social_auth, companies, stores, notifications, groups, ranking, billing
 app.include_router(users.router)
 app.include_router(debug.router)
 app.include_router(social_auth.router)
@@ -198,10 +204,9 @@ app.include_router(companies.router)
 app.include_router(stores.router)
 app.include_router(notifications.router)
 app.include_router(groups.router)
-# app.include_router(ranking.router)
+# app.include_router(ranking.router) # not imported while disabled (pulls in bs4)
 app.include_router(billing.router)
 
-from routers import support
 app.include_router(support.router)
 
 # Dependency
@@ -259,5 +264,5 @@ def health_check():
     """
     Lightweight health check for Render/Vercel.
     """
-    return {"status": "ok", "scheduler": "running" if scheduler.scheduler.running else "stopped"}
+    return {"status": "ok", "scheduler": "running" if scheduler.is_running() else "stopped"}
 
@@ -2,9 +2,10 @@ from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
 from services.sync_service import GoogleSyncService
-from services.google_api import GBPClient
+from services.google_api import AsyncGBPClient
 import asyncio
 import os
+import sys
 
 # Mock client for local testing if needed, or use real one if env vars set
 # We need to act as a user.
@@ -34,10 +35,10 @@ def get_real_client(db: Session, store_id: str):
         return None, None
         
     print(f"Using user: {connected_user.email}")
-    client = GBPClient(connected_user.google_connection.access_token)
+    client = AsyncGBPClient(connected_user.google_connection.access_token)
     return client, store
 
-async def run_sync():
+async def run_sync(backfill: bool = False):
     db = SessionLocal()
     try:
         # Get first store
@@ -53,7 +54,7 @@ async def run_sync():
         service = GoogleSyncService(client)
         print("Starting Sync...")
         try:
-            results = await service.sync_all(db, store.id, store.google_location_id)
+            results = await service.sync_all(db, store.id, store.google_location_id, backfill=backfill)
             print("Sync Results:", results)
         except Exception as e:
             print(f"Sync Failed: {e}")
@@ -64,4 +65,5 @@ async def run_sync():
         db.close()
 
 if __name__ == "__main__":
-    asyncio.run(run_sync())
+    # python manual_sync.py --backfill  -> re-fetch the full insights history
+    asyncio.run(run_sync(backfill="--backfill" in sys.argv))
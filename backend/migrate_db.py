@@ -1,88 +1,248 @@
-from sqlalchemy import text
+"""
+Versioned schema migrations.
+
+Applied versions are recorded in the schema_migrations table. migrate() reads that
+table with one query and returns straight away when nothing is pending, so booting
+against a current schema costs a single SELECT (no per-column probes, no create_all).
+
+To change the schema: update models.py, then append a new entry to MIGRATIONS
+(next version number). Never edit or renumber an entry that has been deployed.
+
+CLI (e.g. as a pre-deploy command, with MIGRATE_ON_STARTUP=false on the web service):
+    python migrate_db.py            # apply pending migrations (exit status 1 if one fails)
+    python migrate_db.py status     # list applied / pending versions
+"""
+from sqlalchemy import text, inspect
 from database import engine
+from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
+# false: startup only checks the version table and warns about pending migrations
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+# The helpers below are idempotent (they skip what already exists) and raise on failure,
+# so a failed step stops migrate() before its version is recorded and is retried next run.
+
 def add_column_safe(conn, table, column, col_type):
     try:
         # Check if column exists (SQLite specific check, but versatile enough for simple cases)
         # For a truly DB-agnostic way, we'd inspect schema, but try/catch is robust for simple migrations.
         conn.execute(text(f"SELECT {column} FROM {table} LIMIT 1"))
         # print(f"Column '{column}' in '{table}' allready exists.") # No sync log to reduce noise
+        return
     except Exception:
-        # print(f"Adding column '{column}' to '{table}'...")
-        try:
-            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"))
-            conn.commit()
-            print(f"Added column: {table}.{column}")
-        except Exception as e:
-            print(f"Failed to add {table}.{column}: {e}")
+        conn.rollback() # Postgres aborts the transaction on the failed probe
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"))
+    conn.commit()
+    print(f"Added column: {table}.{column}")
 
-def migrate():
-    print("Starting DB Schema Migration...")
+def _index_exists(conn, table, index_name):
+    return any(ix.get("name") == index_name for ix in inspect(conn).get_indexes(table))
+
+def add_index_safe(conn, table, index_name, columns):
+    if _index_exists(conn, table, index_name):
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"))
+    conn.commit()
+    print(f"Added index: {index_name}")
+
+def dedupe_and_add_unique_index(conn, table, index_name, columns, prefer="", children=()):
+    """
+    Create a unique index on an existing table, first deleting duplicate rows
+    (keeps one row per key) so the CREATE does not fail on legacy data.
+    Rows with a NULL key column are never duplicates and are left alone.
+    prefer: ORDER BY terms ranking the row to keep first (e.g. the most recently updated,
+    or the one holding local data); ids are random UUIDs, so they only break ties.
+    children: [(child_table, fk_column)] rows pointing at a deleted duplicate are moved
+    to the row that is kept.
+    """
+    cols = ", ".join(columns)
+    not_null = " AND ".join(f"{c} IS NOT NULL" for c in columns)
+    window = f"OVER (PARTITION BY {cols} ORDER BY {prefer + ', ' if prefer else ''}id DESC)"
+    ranked = (
+        f"SELECT id, ROW_NUMBER() {window} AS rn, FIRST_VALUE(id) {window} AS keep_id "
+        f"FROM {table} WHERE {not_null}"
+    )
+    duplicates = f"SELECT id FROM ({ranked}) ranked WHERE rn > 1"
+    if _index_exists(conn, table, index_name):
+        return
+    # One transaction: the changes are only kept if the index is created
+    for child_table, fk_column in children:
+        conn.execute(text(
+            f"UPDATE {child_table} SET {fk_column} = "
+            f"(SELECT keep_id FROM ({ranked}) ranked WHERE ranked.id = {child_table}.{fk_column}) "
+            f"WHERE {fk_column} IN ({duplicates})"
+        ))
+    conn.execute(text(f"DELETE FROM {table} WHERE id IN ({duplicates})"))
+    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({cols})"))
+    conn.commit()
+    print(f"Added unique index: {index_name}")
+
+# Keep-first orderings for dedupe_and_add_unique_index: NULL timestamps sort last
+# on both SQLite and PostgreSQL
+def _latest(column):
+    return f"({column} IS NULL), {column} DESC"
+
+# --- Migrations ---
+
+def m0001_baseline(conn):
+    """Tables from models.py, plus columns added to older databases over time."""
+    import models
+    models.Base.metadata.create_all(bind=conn)
+    conn.commit()
+
+    # Stores Table
+    add_column_safe(conn, "stores", "auto_reply_enabled", "BOOLEAN DEFAULT 0")
+    add_column_safe(conn, "stores", "auto_reply_prompt", "VARCHAR")
+    add_column_safe(conn, "stores", "auto_reply_start_date", "TIMESTAMP")
+    add_column_safe(conn, "stores", "description", "VARCHAR")
+    add_column_safe(conn, "stores", "category", "VARCHAR")
+    
+    # Detailed Store Info
+    add_column_safe(conn, "stores", "phone_number", "VARCHAR")
+    add_column_safe(conn, "stores", "website_url", "VARCHAR")
+    add_column_safe(conn, "stores", "zip_code", "VARCHAR")
+    add_column_safe(conn, "stores", "prefecture", "VARCHAR")
+    add_column_safe(conn, "stores", "city", "VARCHAR")
+    add_column_safe(conn, "stores", "address_line2", "VARCHAR")
+    add_column_safe(conn, "stores", "regular_hours", "JSON")
+    add_column_safe(conn, "stores", "attributes", "JSON")
+
+    # Posts Table
+    add_column_safe(conn, "posts", "google_post_id", "VARCHAR")
+    add_column_safe(conn, "posts", "topic_type", "VARCHAR DEFAULT 'STANDARD'")
+    add_column_safe(conn, "posts", "alert_type", "VARCHAR DEFAULT 'ALERT'")
+    add_column_safe(conn, "posts", "cta_type", "VARCHAR DEFAULT 'ACTION_UNSPECIFIED'")
+    add_column_safe(conn, "posts", "cta_url", "VARCHAR")
+    add_column_safe(conn, "posts", "event_start", "TIMESTAMP")
+    add_column_safe(conn, "posts", "event_end", "TIMESTAMP")
+
+    # Phase 3: SNS Integration
+    add_column_safe(conn, "posts", "media_type", "VARCHAR DEFAULT 'PHOTO'")
+    add_column_safe(conn, "posts", "target_platforms", "JSON")
+    add_column_safe(conn, "posts", "social_post_ids", "JSON")
+
+def m0002_insights_unique_day(conn):
+    # Insights: one row per store/day (enables bulk upsert)
+    dedupe_and_add_unique_index(conn, "insights", "uq_insights_store_date", ["store_id", "date"],
+                                prefer=_latest("created_at"))
+
+def m0003_hot_path_indexes(conn):
+    # Hot query paths (see scripts/check_query_plans.py) and natural keys of synced rows
+    add_index_safe(conn, "posts", "ix_posts_status_scheduled_at", ["status", "scheduled_at"])
+    add_index_safe(conn, "posts", "ix_posts_store_created_at", ["store_id", "created_at"])
+    add_index_safe(conn, "reviews", "ix_reviews_store_create_time", ["store_id", "create_time"])
+    add_index_safe(conn, "reviews", "ix_reviews_store_reply_comment", ["store_id", "reply_comment"])
+    add_index_safe(conn, "rank_logs", "ix_rank_logs_keyword_date", ["keyword_id", "date"])
+    # Reviews: the copy with our reply first (reply_comment is local), then the latest
+    dedupe_and_add_unique_index(conn, "reviews", "uq_reviews_store_google_review", ["store_id", "google_review_id"],
+                                prefer=f"(reply_comment IS NULL), {_latest('reply_time')}, {_latest('update_time')}")
+    dedupe_and_add_unique_index(conn, "media_items", "uq_media_items_store_google_media", ["store_id", "google_media_id"],
+                                prefer=_latest("create_time"))
+    # Questions before answers: answers of a dropped question move to the kept one and
+    # may duplicate its own, which the answers dedupe then resolves
+    dedupe_and_add_unique_index(conn, "questions", "uq_questions_store_google_question", ["store_id", "google_question_id"],
+                                prefer=_latest("update_time"), children=[("answers", "question_id")])
+    dedupe_and_add_unique_index(conn, "answers", "uq_answers_question_google_answer", ["question_id", "google_answer_id"],
+                                prefer=_latest("update_time"))
+
+def m0004_publish_jobs(conn):
+    import models
+    models.PublishJob.__table__.create(bind=conn, checkfirst=True)
+    conn.commit()
+
+def m0005_ai_generation_cache(conn):
+    import models
+    models.AIGenerationCache.__table__.create(bind=conn, checkfirst=True)
+    conn.commit()
+
+def m0006_review_sentiment(conn):
+    import models
+    add_column_safe(conn, "reviews", "sentiment_score", "INTEGER")
+    add_column_safe(conn, "reviews", "sentiment_label", "VARCHAR")
+    add_column_safe(conn, "reviews", "sentiment_topics", "JSON")
+    add_column_safe(conn, "reviews", "sentiment_analyzed_at", "TIMESTAMP")
+    add_index_safe(conn, "reviews", "ix_reviews_store_sentiment_analyzed", ["store_id", "sentiment_analyzed_at"])
+    models.StoreSentimentSummary.__table__.create(bind=conn, checkfirst=True)
+    conn.commit()
+
+# (version, description, function) - append only
+MIGRATIONS = [
+    (1, "baseline schema", m0001_baseline),
+    (2, "unique insights per store/day", m0002_insights_unique_day),
+    (3, "hot path indexes and natural keys", m0003_hot_path_indexes),
+    (4, "publish job queue", m0004_publish_jobs),
+    (5, "AI generation cache", m0005_ai_generation_cache),
+    (6, "per-review sentiment and store summaries", m0006_review_sentiment),
+]
+
+
+# --- Runner ---
+
+def _applied_versions(conn):
     try:
-        with engine.connect() as conn:
-            # Stores Table
-            add_column_safe(conn, "stores", "auto_reply_enabled", "BOOLEAN DEFAULT 0")
-            add_column_safe(conn, "stores", "auto_reply_prompt", "VARCHAR")
-            add_column_safe(conn, "stores", "auto_reply_start_date", "TIMESTAMP")
-            add_column_safe(conn, "stores", "description", "VARCHAR")
-            add_column_safe(conn, "stores", "category", "VARCHAR")
-            
-            # Detailed Store Info
-            add_column_safe(conn, "stores", "phone_number", "VARCHAR")
-            add_column_safe(conn, "stores", "website_url", "VARCHAR")
-            add_column_safe(conn, "stores", "zip_code", "VARCHAR")
-            add_column_safe(conn, "stores", "prefecture", "VARCHAR")
-            add_column_safe(conn, "stores", "city", "VARCHAR")
-            add_column_safe(conn, "stores", "address_line2", "VARCHAR")
-            add_column_safe(conn, "stores", "regular_hours", "JSON")
-            add_column_safe(conn, "stores", "attributes", "JSON")
-
-            # Posts Table
-            add_column_safe(conn, "posts", "google_post_id", "VARCHAR")
-            add_column_safe(conn, "posts", "topic_type", "VARCHAR DEFAULT 'STANDARD'")
-            add_column_safe(conn, "posts", "alert_type", "VARCHAR DEFAULT 'ALERT'")
-            add_column_safe(conn, "posts", "cta_type", "VARCHAR DEFAULT 'ACTION_UNSPECIFIED'")
-            add_column_safe(conn, "posts", "cta_url", "VARCHAR")
-            add_column_safe(conn, "posts", "event_start", "TIMESTAMP")
-            add_column_safe(conn, "posts", "event_end", "TIMESTAMP")
-
-            # Phase 3: SNS Integration
-            add_column_safe(conn, "posts", "media_type", "VARCHAR DEFAULT 'PHOTO'")
-            add_column_safe(conn, "posts", "target_platforms", "JSON")
-            add_column_safe(conn, "posts", "social_post_ids", "JSON")
-
-            # Social Connections Table (New)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    except Exception:
+        conn.rollback()
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR, applied_at TIMESTAMP)"
+        ))
+        conn.commit()
+        return set()
+
+def pending_migrations(conn):
+    applied = _applied_versions(conn)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+def migrate():
+    with engine.connect() as conn:
+        pending = pending_migrations(conn)
+        if not pending:
+            print(f"DB schema is up to date (version {MIGRATIONS[-1][0]}).")
+            return
+
+        for version, description, step in pending:
+            print(f"Applying migration {version}: {description}...")
             try:
-                conn.execute(text("SELECT id FROM social_connections LIMIT 1"))
-            except Exception:
-                print("Creating table 'social_connections'...")
-                conn.execute(text("""
-                    CREATE TABLE social_connections (
-                        id VARCHAR PRIMARY KEY,
-                        user_id VARCHAR,
-                        platform VARCHAR,
-                        access_token VARCHAR,
-                        refresh_token VARCHAR,
-                        expires_at TIMESTAMP,
-                        provider_account_id VARCHAR,
-                        provider_username VARCHAR,
-                        client_id VARCHAR,
-                        client_secret VARCHAR,
-                        created_at TIMESTAMP,
-                        updated_at TIMESTAMP,
-                        FOREIGN KEY(user_id) REFERENCES users(id)
-                    )
-                """))
-                conn.commit()
-                print("Created table: social_connections")
-
-            print("DB Schema Migration Completed.")
-    except Exception as e:
-        print(f"Migration Error: {e}")
+                step(conn)
+            except Exception as e:
+                # Not recorded: retried on the next run (steps are idempotent)
+                conn.rollback()
+                raise RuntimeError(f"Migration {version} ({description}) failed: {e}") from e
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+            conn.commit()
+        print(f"DB Schema Migration Completed (version {MIGRATIONS[-1][0]}).")
+
+def check():
+    """Startup check when migrations run out of band: warn if the schema is behind."""
+    with engine.connect() as conn:
+        pending = pending_migrations(conn)
+    if pending:
+        print(f"WARNING: {len(pending)} DB migration(s) pending: {[m[0] for m in pending]}. Run: python migrate_db.py")
+    return not pending
+
+def status():
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+    for version, description, _ in MIGRATIONS:
+        print(f"{'applied' if version in applied else 'pending'}  {version:04d}  {description}")
 
 if __name__ == "__main__":
-    migrate()
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "status":
+        status()
+    elif command == "upgrade":
+        try:
+            migrate()
+        except Exception as e:
+            sys.exit(f"ERROR: {e}")
+    else:
+        sys.exit("Usage: python migrate_db.py [upgrade|status]")
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, JSON, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -74,6 +74,11 @@ class Store(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Scheduler: status == 'SCHEDULED' AND scheduled_at <= now (every minute)
+        Index("ix_posts_status_scheduled_at", "status", "scheduled_at"),
+        Index("ix_posts_store_created_at", "store_id", "created_at"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     store_id = Column(String, ForeignKey("stores.id"))
@@ -133,6 +138,10 @@ class SocialConnection(Base):
 
 class Insight(Base):
     __tablename__ = "insights"
+    __table_args__ = (
+        # One row per store per day; also the conflict target for bulk upserts (services/insight_writer.py)
+        Index("uq_insights_store_date", "store_id", "date", unique=True),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     store_id = Column(String, ForeignKey("stores.id"))
@@ -155,6 +164,14 @@ class Insight(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        Index("uq_reviews_store_google_review", "store_id", "google_review_id", unique=True),
+        Index("ix_reviews_store_create_time", "store_id", "create_time"),
+        # Auto-reply: unreplied reviews per store (reply_comment IS NULL)
+        Index("ix_reviews_store_reply_comment", "store_id", "reply_comment"),
+        # Sentiment scoring: reviews of a store not scored yet (sentiment_analyzed_at IS NULL)
+        Index("ix_reviews_store_sentiment_analyzed", "store_id", "sentiment_analyzed_at"),
+    )
 
     id = Column(String, primary_key=True, default=generate_uuid)
     store_id = Column(String, ForeignKey("stores.id"))
@@ -167,11 +184,26 @@ class Review(Base):
 
     create_time = Column(DateTime)
     update_time = Column(DateTime)
+
+    # Per-review sentiment, scored once by services/review_sentiment.py
+    sentiment_score = Column(Integer, nullable=True) # 0-100 (100 = most positive)
+    sentiment_label = Column(String, nullable=True) # POSITIVE, NEUTRAL, NEGATIVE
+    sentiment_topics = Column(JSON, nullable=True) # ["接客", "価格", ...]
+    sentiment_analyzed_at = Column(DateTime, nullable=True)
     
     store = relationship("Store", back_populates="reviews")
 
+@event.listens_for(Review.comment, "set")
+def _rescore_edited_review(target, value, oldvalue, initiator):
+    # An edited review text is scored again
+    if value != oldvalue:
+        target.sentiment_analyzed_at = None
+
 class MediaItem(Base):
     __tablename__ = "media_items"
+    __table_args__ = (
+        Index("uq_media_items_store_google_media", "store_id", "google_media_id", unique=True),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     store_id = Column(String, ForeignKey("stores.id"), nullable=False)
@@ -194,6 +226,9 @@ class MediaItem(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("uq_questions_store_google_question", "store_id", "google_question_id", unique=True),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     store_id = Column(String, ForeignKey("stores.id"), nullable=False)
@@ -211,6 +246,9 @@ class Question(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        Index("uq_answers_question_google_answer", "question_id", "google_answer_id", unique=True),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     question_id = Column(String, ForeignKey("questions.id"), nullable=False)
@@ -305,6 +343,9 @@ class Keyword(Base):
 
 class RankLog(Base):
     __tablename__ = "rank_logs"
+    __table_args__ = (
+        Index("ix_rank_logs_keyword_date", "keyword_id", "date"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     keyword_id = Column(String, ForeignKey("keywords.id"))
@@ -369,3 +410,106 @@ Company.subscription = relationship("Subscription", back_populates="company", us
 User.notifications = relationship("NotificationLog", back_populates="user", cascade="all, delete-orphan")
 Store.keywords = relationship("Keyword", back_populates="store", cascade="all, delete-orphan")
 # Store.group = relationship("StoreGroup", back_populates="stores") # Will add this after adding group_id column
+
+# --- Google Sync Caches ---
+
+class GoogleLocationPath(Base):
+    """
+    Resolved v4 path for a GBP location: "locations/X" -> "accounts/Y/locations/X".
+    Persisted so the account/location scan survives restarts (see services/location_resolver.py).
+    """
+    __tablename__ = "google_location_paths"
+
+    location_id = Column(String, primary_key=True) # Bare location ID (no "locations/" prefix)
+    v4_path = Column(String, nullable=False)
+    resolved_at = Column(DateTime, default=datetime.utcnow)
+
+class InsightSyncState(Base):
+    """
+    Per-store, per-metric high-water mark for the Performance API sync.
+    last_complete_date is the latest day Google has returned for the metric;
+    the next sync only re-fetches a short trailing window before it.
+    """
+    __tablename__ = "insight_sync_states"
+
+    store_id = Column(String, ForeignKey("stores.id"), primary_key=True)
+    metric = Column(String, primary_key=True) # e.g. BUSINESS_IMPRESSIONS_DESKTOP_MAPS
+    last_complete_date = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class InsightRollup(Base):
+    """
+    Weekly / monthly totals of the daily Insight rows for a store.
+    Maintained by the insights sync (services/insight_rollups.py) so summaries and
+    period comparisons read a handful of rows instead of every day in the range.
+    """
+    __tablename__ = "insight_rollups"
+    __table_args__ = (
+        Index("uq_insight_rollups_store_period", "store_id", "period", "period_start", unique=True),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    store_id = Column(String, ForeignKey("stores.id"), nullable=False)
+    period = Column(String, nullable=False) # WEEK (starts Monday), MONTH (starts on the 1st)
+    period_start = Column(DateTime, nullable=False)
+    days_count = Column(Integer, default=0) # Daily rows included in the totals
+
+    views_maps = Column(Integer, default=0)
+    views_search = Column(Integer, default=0)
+    actions_website = Column(Integer, default=0)
+    actions_phone = Column(Integer, default=0)
+    actions_driving_directions = Column(Integer, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PublishJob(Base):
+    """
+    Durable queue entry for publishing a scheduled post (services/publish_queue.py).
+    One job per (post, scheduled time). Workers claim jobs with a lease (locked_until);
+    a lease that runs out (crashed instance) makes the job claimable again.
+    """
+    __tablename__ = "publish_jobs"
+    __table_args__ = (
+        Index("uq_publish_jobs_post_scheduled", "post_id", "scheduled_at", unique=True),
+        # Workers: status == 'PENDING' AND run_at <= now, oldest first
+        Index("ix_publish_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    post_id = Column(String, nullable=False) # No FK: deleting a post must not be blocked by its jobs
+    scheduled_at = Column(DateTime, nullable=False) # Post.scheduled_at the job was created for
+    status = Column(String, default="PENDING") # PENDING, RUNNING, DONE, DEAD
+    run_at = Column(DateTime, nullable=False) # Next attempt (scheduled time, then retry backoff)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AIGenerationCache(Base):
+    """
+    Cached AI completion, addressed by a hash of model + prompts + sampling parameters
+    (services/ai_cache.py, AI_CACHE_BACKEND=db).
+    """
+    __tablename__ = "ai_generation_cache"
+
+    key = Column(String, primary_key=True) # sha256 hex
+    model = Column(String, nullable=True)
+    response = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class StoreSentimentSummary(Base):
+    """
+    Store-level review sentiment narrative for a period (services/review_sentiment.py).
+    Regenerated by the AI only when the fingerprint of the aggregated review scores changes.
+    """
+    __tablename__ = "store_sentiment_summaries"
+
+    store_id = Column(String, ForeignKey("stores.id"), primary_key=True)
+    period_key = Column(String, primary_key=True) # "all" or "YYYY-MM-DD:YYYY-MM-DD"
+    fingerprint = Column(String, nullable=False)
+    result = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,31 @@
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+
+import models
+
+# Named eager-loading profiles for list endpoints.
+# Each profile loads exactly what the endpoint's response serializes, so a listing costs
+# a fixed number of queries whatever the page size (no per-row lazy loads).
+# Usage: db.query(models.Store).options(*query_profiles.STORE_LIST)
+# scripts/check_query_counts.py checks the counts stay flat.
+
+# schemas.Store (includes posts)
+STORE_LIST = (
+    selectinload(models.Store.posts),
+)
+
+# Plain store rows (responses without a response_model only serialize loaded columns).
+# raiseload turns any accidental relationship access into an error instead of N lazy loads.
+STORE_COLUMNS = (
+    raiseload("*"),
+)
+
+# schemas.User (store with its posts, is_google_connected -> google_connection)
+USER_LIST = (
+    joinedload(models.User.google_connection),
+    selectinload(models.User.store).selectinload(models.Store.posts),
+)
+
+# schemas.StoreGroup (columns only)
+GROUP_LIST = (
+    raiseload("*"),
+)
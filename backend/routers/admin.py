@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-import models, database, auth
+import models, database, auth, schemas, query_profiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 import logging
 
@@ -67,18 +67,18 @@ class StoreCreate(BaseModel):
     name: str
     company_id: Optional[str] = None
 
-@router.get("/users")
+@router.get("/users", response_model=List[schemas.User])
 def list_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
     """
     List users. SUPER_ADMIN sees all. COMPANY_ADMIN sees company users.
     """
     if current_user.role == "SUPER_ADMIN":
-        users = db.query(models.User).offset(skip).limit(limit).all()
+        users = db.query(models.User).options(*query_profiles.USER_LIST).offset(skip).limit(limit).all()
         return users
     elif current_user.role == "COMPANY_ADMIN":
         if not current_user.company_id:
              return [current_user]
-        users = db.query(models.User).filter(models.User.company_id == current_user.company_id).offset(skip).limit(limit).all()
+        users = db.query(models.User).options(*query_profiles.USER_LIST).filter(models.User.company_id == current_user.company_id).offset(skip).limit(limit).all()
         return users
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -145,12 +145,12 @@ def list_all_stores(skip: int = 0, limit: int = 100, db: Session = Depends(datab
     List stores. SUPER_ADMIN sees all. COMPANY_ADMIN sees company stores.
     """
     if current_user.role == "SUPER_ADMIN":
-        stores = db.query(models.Store).offset(skip).limit(limit).all()
+        stores = db.query(models.Store).options(*query_profiles.STORE_COLUMNS).offset(skip).limit(limit).all()
         return stores
     elif current_user.role == "COMPANY_ADMIN":
          if not current_user.company_id:
             return []
-         stores = db.query(models.Store).filter(models.Store.company_id == current_user.company_id).offset(skip).limit(limit).all()
+         stores = db.query(models.Store).options(*query_profiles.STORE_COLUMNS).filter(models.Store.company_id == current_user.company_id).offset(skip).limit(limit).all()
          return stores
     else:
          raise HTTPException(status_code=403, detail="Not authorized")
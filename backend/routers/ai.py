@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Header as APIHeader
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import models, database, auth
-from services import ai_generator
+from services import ai_generator, review_sentiment
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+import asyncio
 import uuid
+import json
 
 print("DEBUG: Loading ai.py router...")
 
@@ -37,8 +40,7 @@ def debug_ai(
     api_key = x_openai_api_key or os.getenv("OPENAI_API_KEY")
     if api_key:
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
+            client = ai_generator.get_openai_client(api_key)
             # Simple test call
             response = client.chat.completions.create(
                 model="gpt-4o",
@@ -63,12 +65,14 @@ class GeneratePostRequest(BaseModel):
     custom_prompt: Optional[str] = None
     keywords_region: Optional[str] = None
     store_id: Optional[str] = None
+    regenerate: bool = False # True: skip the response cache and ask the model again
 
 class GenerateReplyRequest(BaseModel):
     review_text: str
     reviewer_name: str
     star_rating: str # "FIVE", "4", etc.
     tone: str = "polite"
+    regenerate: bool = False
 
 class PromptCreate(BaseModel):
     title: str
@@ -81,8 +85,114 @@ class PromptUpdate(BaseModel):
     content: Optional[str] = None
     is_locked: Optional[bool] = None
 
+# The *_generation_args helpers run blocking queries: async endpoints call them
+# through asyncio.to_thread so the event loop keeps serving streams and AI calls.
+
+def _post_generation_args(req: GeneratePostRequest, db: Session, current_user: models.User) -> dict:
+    """generate_post_content / stream_post_content arguments: the request plus store context."""
+    # Fetch past posts (latest 5) for context
+    past_posts_data = []
+    store_context = {}
+    
+    if current_user.store_id:
+        store = db.query(models.Store).filter(models.Store.id == current_user.store_id).first()
+        if store:
+             store_context = {
+                 "store_name": store.name,
+                 "store_description": store.description,
+                 "store_category": store.category,
+                 "store_address": store.address
+             }
+
+        past_posts = db.query(models.Post).filter(
+            models.Post.store_id == current_user.store_id
+        ).order_by(models.Post.created_at.desc()).limit(5).all()
+        
+        past_posts_data = [p.content for p in past_posts if p.content]
+
+    return dict(
+        use_cache=not req.regenerate,
+        keywords=req.keywords, 
+        length_option=req.length_option, 
+        tone=req.tone,
+        custom_prompt=req.custom_prompt,
+        keywords_region=req.keywords_region,
+        char_count=req.char_count,
+        past_posts=past_posts_data,
+        **store_context # Pass store details
+    )
+
+def _reply_generation_args(req: GenerateReplyRequest, db: Session, current_user: models.User) -> dict:
+    """generate_review_reply / stream_review_reply arguments: the request plus prompt and store context."""
+    # Check for global prompt
+    global_prompt = db.query(models.Prompt).filter(
+        models.Prompt.user_id == current_user.id,
+        models.Prompt.category == "REVIEW_REPLY"
+    ).first()
+    
+    custom_instruction = global_prompt.content if global_prompt else None
+
+    store_context = {}
+    if current_user.store_id:
+        store = db.query(models.Store).filter(models.Store.id == current_user.store_id).first()
+        if store:
+             store_context = {
+                 "store_name": store.name,
+                 "store_description": store.description,
+                 "store_category": store.category,
+             }
+
+    return dict(
+        use_cache=not req.regenerate,
+        review_text=req.review_text, 
+        reviewer_name=req.reviewer_name, 
+        star_rating=req.star_rating, 
+        tone=req.tone,
+        custom_instruction=custom_instruction,
+        **store_context
+    )
+
+def _sse(data: dict, event: str = None) -> str:
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _stream_response(tokens) -> StreamingResponse:
+    """
+    Server-sent events for a token stream:
+    `data: {"delta": "..."}` per piece, then `event: done` with the full content,
+    or `event: error` with a detail message if generation fails midway.
+    """
+    async def events():
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield _sse({"delta": token})
+        except Exception as e:
+            logger.error(f"Error while streaming generation: {e}")
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        yield _sse({"content": "".join(parts)}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # No proxy buffering, or the first token waits for the whole response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _stream_client(api_key: Optional[str]) -> ai_generator.AsyncAIClient:
+    """
+    Client for a streaming endpoint: same key handling as the non-streaming ones (header
+    key, else the server's OPENAI_API_KEY), but checked before the 200 stream starts.
+    """
+    client = ai_generator.AsyncAIClient(api_key=api_key)
+    if client.client is None:
+        raise HTTPException(status_code=401, detail=ai_generator.API_KEY_MISSING_MESSAGE)
+    return client
+
 @router.post("/generate/post")
-def generate_post(
+async def generate_post(
     req: GeneratePostRequest, 
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user),
@@ -100,37 +210,9 @@ def generate_post(
         else:
             logger.info("API Key provided.")
 
-        # Fetch past posts (latest 5) for context
-        past_posts_data = []
-        store_context = {}
-        
-        if current_user.store_id:
-            store = db.query(models.Store).filter(models.Store.id == current_user.store_id).first()
-            if store:
-                 store_context = {
-                     "store_name": store.name,
-                     "store_description": store.description,
-                     "store_category": store.category,
-                     "store_address": store.address
-                 }
-
-            past_posts = db.query(models.Post).filter(
-                models.Post.store_id == current_user.store_id
-            ).order_by(models.Post.created_at.desc()).limit(5).all()
-            
-            past_posts_data = [p.content for p in past_posts if p.content]
-
-        client = ai_generator.AIClient(api_key=api_key)
-        content = client.generate_post_content(
-            keywords=req.keywords, 
-            length_option=req.length_option, 
-            tone=req.tone,
-            custom_prompt=req.custom_prompt,
-            keywords_region=req.keywords_region,
-            char_count=req.char_count,
-            past_posts=past_posts_data,
-            **store_context # Pass store details
-        )
+        client = ai_generator.AsyncAIClient(api_key=api_key)
+        args = await asyncio.to_thread(_post_generation_args, req, db, current_user)
+        content = await client.generate_post_content(**args)
         return {"content": content}
     except Exception as e:
         logger.error(f"Error in generate_post: {e}")
@@ -141,24 +223,39 @@ def generate_post(
             raise HTTPException(status_code=401, detail="OpenAI APIキーが無効または未設定です。設定画面でAPIキーを確認してください。")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/post/stream")
+async def generate_post_stream(
+    req: GeneratePostRequest, 
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+    x_openai_api_key: Optional[str] = APIHeader(None, alias="X-OpenAI-Api-Key"),
+    x_gemini_api_key: Optional[str] = APIHeader(None, alias="X-Gemini-Api-Key")
+):
+    """Same as /generate/post, streamed as server-sent events (see _stream_response)."""
+    client = _stream_client(x_openai_api_key or x_gemini_api_key)
+    args = await asyncio.to_thread(_post_generation_args, req, db, current_user)
+    return _stream_response(client.stream_post_content(**args))
+
 class GenerateHashtagsRequest(BaseModel):
     keywords: str
     content: Optional[str] = None
     count: int = 10
+    regenerate: bool = False
 
 @router.post("/generate/hashtags")
-def generate_hashtags(
+async def generate_hashtags(
     req: GenerateHashtagsRequest,
     x_openai_api_key: Optional[str] = APIHeader(None, alias="X-OpenAI-Api-Key"),
     x_gemini_api_key: Optional[str] = APIHeader(None, alias="X-Gemini-Api-Key")
 ):
     try:
         api_key = x_openai_api_key or x_gemini_api_key
-        client = ai_generator.AIClient(api_key=api_key)
-        hashtags = client.generate_hashtags(
+        client = ai_generator.AsyncAIClient(api_key=api_key)
+        hashtags = await client.generate_hashtags(
             keywords=req.keywords,
             content=req.content,
-            count=req.count
+            count=req.count,
+            use_cache=not req.regenerate
         )
         return {"hashtags": hashtags}
     except Exception as e:
@@ -206,7 +303,7 @@ def create_or_update_prompt(prompt: PromptCreate, db: Session = Depends(database
         return new_prompt
 
 @router.post("/generate/reply")
-def generate_reply(
+async def generate_reply(
     req: GenerateReplyRequest, 
     db: Session = Depends(database.get_db), 
     current_user: models.User = Depends(auth.get_current_user),
@@ -214,75 +311,64 @@ def generate_reply(
     x_gemini_api_key: Optional[str] = APIHeader(None, alias="X-Gemini-Api-Key")
 ):
     try:
-        # Check for global prompt
-        global_prompt = db.query(models.Prompt).filter(
-            models.Prompt.user_id == current_user.id,
-            models.Prompt.category == "REVIEW_REPLY"
-        ).first()
-        
-        custom_instruction = global_prompt.content if global_prompt else None
-
-        store_context = {}
-        if current_user.store_id:
-            store = db.query(models.Store).filter(models.Store.id == current_user.store_id).first()
-            if store:
-                 store_context = {
-                     "store_name": store.name,
-                     "store_description": store.description,
-                     "store_category": store.category,
-                 }
-
         api_key = x_openai_api_key or x_gemini_api_key
-        client = ai_generator.AIClient(api_key=api_key)
-        content = client.generate_review_reply(
-            review_text=req.review_text, 
-            reviewer_name=req.reviewer_name, 
-            star_rating=req.star_rating, 
-            tone=req.tone,
-            custom_instruction=custom_instruction,
-            **store_context
-        )
+        client = ai_generator.AsyncAIClient(api_key=api_key)
+        args = await asyncio.to_thread(_reply_generation_args, req, db, current_user)
+        content = await client.generate_review_reply(**args)
         return {"content": content}
     except Exception as e:
         logger.error(f"Error in generate_reply: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/reply/stream")
+async def generate_reply_stream(
+    req: GenerateReplyRequest, 
+    db: Session = Depends(database.get_db), 
+    current_user: models.User = Depends(auth.get_current_user),
+    x_openai_api_key: Optional[str] = APIHeader(None, alias="X-OpenAI-Api-Key"),
+    x_gemini_api_key: Optional[str] = APIHeader(None, alias="X-Gemini-Api-Key")
+):
+    """Same as /generate/reply, streamed as server-sent events (see _stream_response)."""
+    client = _stream_client(x_openai_api_key or x_gemini_api_key)
+    args = await asyncio.to_thread(_reply_generation_args, req, db, current_user)
+    return _stream_response(client.stream_review_reply(**args))
+
 class AnalyzeSentimentRequest(BaseModel):
     store_id: str
 
 @router.post("/analyze/sentiment")
-def analyze_sentiment(
+async def analyze_sentiment(
     req: AnalyzeSentimentRequest, 
-    db: Session = Depends(database.get_db), 
     current_user: models.User = Depends(auth.get_current_user),
     x_openai_api_key: Optional[str] = APIHeader(None, alias="X-OpenAI-Api-Key"),
     x_gemini_api_key: Optional[str] = APIHeader(None, alias="X-Gemini-Api-Key")
 ):
-    # 1. Fetch reviews for store
-    # For MVP, just fetch last 50 reviews from DB
-    reviews = db.query(models.Review).filter(models.Review.store_id == req.store_id).order_by(models.Review.create_time.desc()).limit(50).all()
-    
-    if not reviews:
-        return {"summary": "レビューが見つかりません", "score": 0}
-        
-    review_data = [{"text": r.comment, "rating": r.star_rating} for r in reviews if r.comment]
-
     api_key = x_openai_api_key or x_gemini_api_key
     
     if not api_key:
         logger.warning("analyze_sentiment: No API key provided")
         raise HTTPException(status_code=400, detail="OpenAI APIキーが設定されていません。設定画面でAPIキーを入力してください。")
     
+    def run():
+        # All reviews of the store, from the per-review scores (services/review_sentiment.py).
+        # Scoring and the summary write to the DB: own session, in a worker thread.
+        db = database.SessionLocal()
+        try:
+            if not db.query(models.Review.id).filter(models.Review.store_id == req.store_id).first():
+                return {"summary": "レビューが見つかりません", "score": 0}
+            return review_sentiment.store_sentiment(db, req.store_id, ai_generator.AIClient(api_key=api_key))
+        finally:
+            db.close()
+
     try:
-        client = ai_generator.AIClient(api_key=api_key)
-        result = client.analyze_sentiment(review_data)
-        
-        # Future: Save result to Store model or separate InsightAnalysis model
-        return result
+        result = await asyncio.to_thread(run)
     except Exception as e:
         logger.error(f"Error in analyze_sentiment: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"分析エラー: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=500, detail="分析エラー: AIの応答を解析できませんでした")
+    return result
 
 # --- Prompt Management Removed ---
@@ -486,13 +486,10 @@ async def trigger_debug_sync(
              raise HTTPException(status_code=400, detail="Google not connected")
              
         # Refresh if needed
-        if connection.expiry and connection.expiry < datetime.utcnow() and connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            # Update expiry... (simplified)
-            db.commit()
+        from services.credentials import credentials
+        access_token = await credentials.aget_access_token(db, connection)
 
-        client = google_api.GBPClient(connection.access_token)
+        client = google_api.AsyncGBPClient(access_token)
         service = GoogleSyncService(client)
         
         result = {}
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
@@ -126,6 +127,7 @@ def callback_google(code: str, state: str, db: Session = Depends(database.get_db
         connection.expiry = datetime.utcnow() + timedelta(seconds=tokens.get("expires_in", 3600))
         
         db.commit()
+        credentials.invalidate(connection.id) # Drop any token cached for the previous grant
         auth_log("Connection saved successfully.")
         
         # 4. Generate App Token
@@ -153,15 +155,11 @@ def list_locations(db: Session = Depends(database.get_db), current_user: models.
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # Check expiry and refresh if needed
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if not connection.refresh_token:
-             raise HTTPException(status_code=400, detail="Token expired and no refresh token")
-        new_tokens = google_api.refresh_access_token(connection.refresh_token)
-        connection.access_token = new_tokens.get("access_token")
-        connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-        db.commit()
+    if connection.expiry and connection.expiry < datetime.utcnow() and not connection.refresh_token:
+         raise HTTPException(status_code=400, detail="Token expired and no refresh token")
+    access_token = credentials.get_access_token(db, connection)
 
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     try:
         accounts = client.list_accounts()
         if not accounts.get('accounts'):
@@ -196,12 +194,7 @@ async def sync_store_data(location_id: str, db: Session = Depends(database.get_d
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # 2. Refresh token if needed
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
+    access_token = await credentials.aget_access_token(db, connection)
     
     # 3. Perform Sync
     try:
@@ -217,7 +210,7 @@ async def sync_store_data(location_id: str, db: Session = Depends(database.get_d
              raise HTTPException(status_code=400, detail="Store is not linked to Google Location")
 
         from services.sync_service import GoogleSyncService
-        client = google_api.GBPClient(connection.access_token)
+        client = google_api.AsyncGBPClient(access_token)
         service = GoogleSyncService(client)
         
         # Sync everything
@@ -318,7 +311,8 @@ async def select_location(
              from services.sync_service import GoogleSyncService
              # We need a client. If current_user has connection, use it.
              if current_user.google_connection and current_user.google_connection.access_token:
-                  client = google_api.GBPClient(current_user.google_connection.access_token)
+                  access_token = await credentials.aget_access_token(db, current_user.google_connection)
+                  client = google_api.AsyncGBPClient(access_token)
                   service = GoogleSyncService(client)
                   # Sync Location Details (Description, Address, Hours, etc.)
                   await service.sync_location_details(db, store.id, store.google_location_id)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-import database, models, auth, schemas
+import database, models, auth, schemas, query_profiles
 from typing import List
 
 router = APIRouter(
@@ -19,7 +19,7 @@ def list_groups(
     If SUPER_ADMIN, can filter by company_id.
     If COMPANY_ADMIN, only sees their own groups.
     """
-    query = db.query(models.StoreGroup)
+    query = db.query(models.StoreGroup).options(*query_profiles.GROUP_LIST)
     
     if current_user.role == "SUPER_ADMIN":
         if company_id:
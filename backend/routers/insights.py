@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
+from services.insight_rollups import summarize_periods, summarize_store_periods, empty_totals
 from datetime import datetime, timedelta
 
 router = APIRouter(
@@ -9,24 +11,14 @@ router = APIRouter(
     tags=["insights"],
 )
 
-@router.get("/{store_id}")
-def get_insights(
-    store_id: str, 
-    start_date: str = None, 
-    end_date: str = None,
-    db: Session = Depends(database.get_db), 
-    current_user: models.User = Depends(auth.get_current_user)
-):
-    """
-    Get performance metrics from local DB.
-    Refreshed via /sync endpoint.
-    Optional start_date/end_date (YYYY-MM-DD). Default last 30 days.
-    """
-    store = db.query(models.Store).filter(models.Store.id == store_id).first()
-    if not store:
-        raise HTTPException(status_code=400, detail="Store not found")
-    
-    # Determine Date Range
+# Sort keys accepted by /insights/summary (summary field names, plus the store name)
+SUMMARY_SORT_KEYS = (
+    "total_impressions", "map_views", "search_views", "website_clicks",
+    "phone_calls", "direction_requests", "total_actions", "days_count", "name",
+)
+
+def _date_range(start_date: str = None, end_date: str = None):
+    """Parse optional YYYY-MM-DD bounds. Default: the 30 days up to today."""
     if end_date:
         try:
             end_date_dt = datetime.strptime(end_date, "%Y-%m-%d")
@@ -42,22 +34,167 @@ def get_insights(
             start_date_dt = end_date_dt - timedelta(days=30)
     else:
         start_date_dt = end_date_dt - timedelta(days=30) # Default 30 days
+    return start_date_dt, end_date_dt
 
-    # Fetch from local DB (Synced Data)
-    query = db.query(models.Insight).filter(
-        models.Insight.store_id == store_id
+def _previous_range(start_date_dt: datetime, end_date_dt: datetime):
+    """The same number of days right before start_date_dt."""
+    period_days = (end_date_dt - start_date_dt).days
+    prev_end_date = start_date_dt - timedelta(days=1)
+    prev_start_date = prev_end_date - timedelta(days=period_days)
+    return prev_start_date, prev_end_date
+
+def _calc_change(current, previous):
+    if previous == 0:
+        return 0 if current == 0 else 100
+    return ((current - previous) / previous) * 100
+
+def _summary_block(totals: dict) -> dict:
+    total_impressions = totals["views_maps"] + totals["views_search"]
+    return {
+        "total_impressions": total_impressions,
+        "map_views": totals["views_maps"],
+        "search_views": totals["views_search"],
+        "website_clicks": totals["actions_website"],
+        "phone_calls": totals["actions_phone"],
+        "direction_requests": totals["actions_driving_directions"],
+        "total_actions": totals["actions_website"] + totals["actions_phone"] + totals["actions_driving_directions"],
+        "days_count": totals["days_count"],
+    }
+
+def _comparison_block(current: dict, previous: dict) -> dict:
+    return {
+        "map_views_change": _calc_change(current["map_views"], previous["map_views"]),
+        "search_views_change": _calc_change(current["search_views"], previous["search_views"]),
+        "website_clicks_change": _calc_change(current["website_clicks"], previous["website_clicks"]),
+        "phone_calls_change": _calc_change(current["phone_calls"], previous["phone_calls"]),
+        "direction_requests_change": _calc_change(current["direction_requests"], previous["direction_requests"]),
+        "total_impressions_change": _calc_change(current["total_impressions"], previous["total_impressions"]),
+    }
+
+@router.get("/summary")
+def get_insights_summary(
+    company_id: str = None,
+    group_id: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    sort: str = "total_impressions",
+    order: str = "desc",
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(database.get_read_db),
+    current_user: models.User = Depends(auth.require_company_admin)
+):
+    """
+    Aggregated and per-store insight summaries for a company or a store group.
+    Pass group_id or company_id (COMPANY_ADMIN defaults to, and is limited to, their company).
+    Per-store rows are sorted by `sort` (see SUMMARY_SORT_KEYS) and paginated with skip/limit.
+    All stores are totalled with grouped queries (rollups + edge days), not one request per store.
+    """
+    if sort not in SUMMARY_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SUMMARY_SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+    # Resolve scope
+    if group_id:
+        group = db.query(models.StoreGroup).filter(models.StoreGroup.id == group_id).first()
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        if current_user.role != "SUPER_ADMIN" and group.company_id != current_user.company_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        scope = {"type": "group", "id": group.id, "name": group.name}
+        store_filter = models.Store.group_id == group.id
+    else:
+        if current_user.role != "SUPER_ADMIN":
+            if company_id and company_id != current_user.company_id:
+                raise HTTPException(status_code=403, detail="Not authorized")
+            company_id = current_user.company_id
+        if not company_id:
+            raise HTTPException(status_code=400, detail="company_id or group_id is required")
+        company = db.query(models.Company).filter(models.Company.id == company_id).first()
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+        scope = {"type": "company", "id": company.id, "name": company.name}
+        store_filter = models.Store.company_id == company.id
+
+    start_date_dt, end_date_dt = _date_range(start_date, end_date)
+    prev_start_date, prev_end_date = _previous_range(start_date_dt, end_date_dt)
+
+    stores = db.query(models.Store.id, models.Store.name).filter(store_filter).all()
+    totals_by_store = summarize_store_periods(
+        db, [s.id for s in stores], [(start_date_dt, end_date_dt), (prev_start_date, prev_end_date)]
     )
+
+    overall_current = _summary_block(empty_totals())
+    overall_previous = _summary_block(empty_totals())
+    rows = []
+    for store in stores:
+        current_totals, previous_totals = totals_by_store[store.id]
+        current = _summary_block(current_totals)
+        previous = _summary_block(previous_totals)
+        for key in overall_current:
+            overall_current[key] += current[key]
+            overall_previous[key] += previous[key]
+        rows.append({
+            "store_id": store.id,
+            "name": store.name,
+            "summary": current,
+            "comparison": _comparison_block(current, previous),
+        })
+
+    if sort == "name":
+        rows.sort(key=lambda r: r["name"] or "", reverse=(order == "desc"))
+    else:
+        rows.sort(key=lambda r: r["summary"][sort], reverse=(order == "desc"))
+
+    return {
+        "period": f"{start_date_dt.strftime('%Y/%m/%d')} - {end_date_dt.strftime('%Y/%m/%d')}",
+        "scope": scope,
+        "store_count": len(stores),
+        "summary": overall_current,
+        "comparison": _comparison_block(overall_current, overall_previous),
+        "stores": rows[skip:skip + limit],
+        "skip": skip,
+        "limit": limit,
+    }
+
+@router.get("/{store_id}")
+def get_insights(
+    store_id: str, 
+    start_date: str = None, 
+    end_date: str = None,
+    db: Session = Depends(database.get_read_db), 
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Get performance metrics from local DB.
+    Refreshed via /sync endpoint.
+    Optional start_date/end_date (YYYY-MM-DD). Default last 30 days.
+    """
+    store = db.query(models.Store).filter(models.Store.id == store_id).first()
+    if not store:
+        raise HTTPException(status_code=400, detail="Store not found")
     
-    # Filter by date range
-    query = query.filter(models.Insight.date >= start_date_dt.date())
-    query = query.filter(models.Insight.date <= end_date_dt.date())
-    
-    insights = query.order_by(models.Insight.date.asc()).all()
+    start_date_dt, end_date_dt = _date_range(start_date, end_date)
+
+    # Fetch from local DB (Synced Data) - plain column tuples, only what the chart needs
+    daily_rows = db.query(
+        models.Insight.date,
+        models.Insight.views_maps,
+        models.Insight.views_search,
+        models.Insight.actions_website,
+        models.Insight.actions_phone,
+        models.Insight.actions_driving_directions,
+    ).filter(
+        models.Insight.store_id == store_id,
+        models.Insight.date >= start_date_dt.date(),
+        models.Insight.date <= end_date_dt.date(),
+    ).order_by(models.Insight.date.asc()).all()
     
     # Format for Frontend (match Google API structure approx or simplify)
     # Frontend expects: { metrics: [ { dailyMetric: "KEY", dailyMetricTimeSeries: [{date, value}] } ] }
     
-    if not insights:
+    if not daily_rows:
         return {"period": "No Data", "metrics": []}
 
     # Reshape Data
@@ -78,7 +215,7 @@ def get_insights(
     # DB 'views_maps' combines desktop/mobile. We'll assign it to 'MOBILE_MAPS' for simplicity or split?
     # Let's assign to MOBILE_MAPS effectively.
     
-    for i in insights:
+    for i in daily_rows:
         d = {"year": i.date.year, "month": i.date.month, "day": i.date.day}
         
         # Maps
@@ -104,12 +241,20 @@ def get_insights(
         if v:
             metrics.append({"dailyMetric": k, "dailyMetricTimeSeries": v})
 
-    # Calculate summary statistics
-    total_maps = sum(i.views_maps or 0 for i in insights)
-    total_search = sum(i.views_search or 0 for i in insights)
-    total_website = sum(i.actions_website or 0 for i in insights)
-    total_phone = sum(i.actions_phone or 0 for i in insights)
-    total_directions = sum(i.actions_driving_directions or 0 for i in insights)
+    # --- Summary + Comparison (Previous Period) ---
+    # Current Period: start_date_dt to end_date_dt (approx 30 days)
+    # Previous Period: the same number of days right before start_date_dt
+    # Both are totalled in SQL in one pass (rollups + edge days), see services/insight_rollups.py
+    prev_start_date, prev_end_date = _previous_range(start_date_dt, end_date_dt)
+    
+    current_totals, previous_totals = summarize_periods(
+        db, store_id, [(start_date_dt, end_date_dt), (prev_start_date, prev_end_date)]
+    )
+    total_maps = current_totals["views_maps"]
+    total_search = current_totals["views_search"]
+    total_website = current_totals["actions_website"]
+    total_phone = current_totals["actions_phone"]
+    total_directions = current_totals["actions_driving_directions"]
     
     total_impressions = total_maps + total_search
     total_actions = total_website + total_phone + total_directions
@@ -143,44 +288,24 @@ def get_insights(
         "desktop_total": int(total_impressions * desktop_ratio),
     }
     
-    # --- Calculate Comparison (Previous Period) ---
-    # Current Period: start_date_dt to end_date_dt (approx 30 days)
-    # Previous Period: start_date_dt - (end_date_dt - start_date_dt) to start_date_dt
+    prev_total_maps = previous_totals["views_maps"]
+    prev_total_search = previous_totals["views_search"]
+    prev_total_website = previous_totals["actions_website"]
+    prev_total_phone = previous_totals["actions_phone"]
+    prev_total_directions = previous_totals["actions_driving_directions"]
     
-    period_days = (end_date_dt - start_date_dt).days
-    prev_end_date = start_date_dt - timedelta(days=1)
-    prev_start_date = prev_end_date - timedelta(days=period_days)
-    
-    prev_query = db.query(models.Insight).filter(
-        models.Insight.store_id == store_id,
-        models.Insight.date >= prev_start_date.date(),
-        models.Insight.date <= prev_end_date.date()
-    )
-    prev_insights = prev_query.all()
-    
-    prev_total_maps = sum(i.views_maps or 0 for i in prev_insights)
-    prev_total_search = sum(i.views_search or 0 for i in prev_insights)
-    prev_total_website = sum(i.actions_website or 0 for i in prev_insights)
-    prev_total_phone = sum(i.actions_phone or 0 for i in prev_insights)
-    prev_total_directions = sum(i.actions_driving_directions or 0 for i in prev_insights)
-    
-    def calc_change(current, previous):
-        if previous == 0:
-            return 0 if current == 0 else 100
-        return ((current - previous) / previous) * 100
-
     comparison = {
-        "map_views_change": calc_change(total_maps, prev_total_maps),
-        "search_views_change": calc_change(total_search, prev_total_search),
-        "website_clicks_change": calc_change(total_website, prev_total_website),
-        "phone_calls_change": calc_change(total_phone, prev_total_phone),
-        "direction_requests_change": calc_change(total_directions, prev_total_directions),
-        "total_impressions_change": calc_change(total_impressions, (prev_total_maps + prev_total_search)),
+        "map_views_change": _calc_change(total_maps, prev_total_maps),
+        "search_views_change": _calc_change(total_search, prev_total_search),
+        "website_clicks_change": _calc_change(total_website, prev_total_website),
+        "phone_calls_change": _calc_change(total_phone, prev_total_phone),
+        "direction_requests_change": _calc_change(total_directions, prev_total_directions),
+        "total_impressions_change": _calc_change(total_impressions, (prev_total_maps + prev_total_search)),
     }
 
     return {
         "period": f"{start_date_dt.strftime('%Y/%m/%d')} - {end_date_dt.strftime('%Y/%m/%d')}",
-        "days_count": len(insights),
+        "days_count": current_totals["days_count"],
         "summary": {
             "total_impressions": total_impressions,
             "map_views": total_maps,
@@ -218,17 +343,12 @@ def get_search_keywords(store_id: str, db: Session = Depends(database.get_db), c
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # Refresh token if expired
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            try:
-                new_tokens = google_api.refresh_access_token(connection.refresh_token)
-                connection.access_token = new_tokens.get("access_token")
-                connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-                db.commit()
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Token refresh failed: {str(e)}")
+    try:
+        access_token = credentials.get_access_token(db, connection)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Token refresh failed: {str(e)}")
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     
     # Resolve correct location name (v1 or v4 format depending on what API needs, 
     # but Performance API documentation says 'locations/{locationId}'.
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
@@ -96,7 +97,7 @@ async def get_location_details(store_id: str, force_refresh: bool = False, db: S
     from services.sync_service import GoogleSyncService
     
     # FIX: Initialize with Client, not DB
-    client = google_api.GBPClient(current_user.google_connection.access_token)
+    client = google_api.AsyncGBPClient(current_user.google_connection.access_token)
     sync_service = GoogleSyncService(client)
     
     # This executes the robust logic (get_location_details + fallback find_location_robust)
@@ -128,18 +129,13 @@ async def update_location_details(store_id: str, update_data: LocationUpdate, db
     if not connection:
          raise HTTPException(status_code=400, detail="Google account not connected")
 
-    # 2. TOKEN REFRESH (Pre-emptive)
-    if connection.expiry and connection.expiry < datetime.utcnow() + timedelta(minutes=10) and connection.refresh_token:
-        try:
-             new_tokens = google_api.refresh_access_token(connection.refresh_token)
-             connection.access_token = new_tokens.get("access_token")
-             connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-             db.commit()
-             print("DEBUG: Token refreshed pre-emptively for update.")
-        except Exception:
-             raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    # 2. TOKEN REFRESH (Pre-emptive, cached, single-flight)
+    try:
+         access_token = await credentials.aget_access_token(db, connection)
+    except Exception:
+         raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     
     # 3. ID VERIFICATION (Handshake)
     try:
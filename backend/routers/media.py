@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
+from services.reconcile import reconcile
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
@@ -79,50 +81,43 @@ def sync_media_from_google(store_id: str, db: Session = Depends(database.get_db)
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # Refresh token if needed
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
+    access_token = credentials.get_access_token(db, connection)
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     try:
         google_media = client.list_media(store.google_location_id)
         
-        synced_count = 0
-        for item in google_media.get("mediaItems", []):
-            
-            # Format: accounts/.../locations/.../media/{id}
-            google_id = item.get("name", "").split("/")[-1]
-            existing = db.query(models.MediaItem).filter(models.MediaItem.google_media_id == google_id).first()
-            
+        def parse_create_time(item):
             create_time_str = item.get("createTime")
-            created_at = datetime.utcnow()
             if create_time_str:
                 try:
-                    created_at = datetime.fromisoformat(create_time_str.replace("Z", "+00:00"))
+                    return datetime.fromisoformat(create_time_str.replace("Z", "+00:00"))
                 except:
                     pass
-            
-            if not existing:
-                new_media = models.MediaItem(
-                    store_id=store_id,
-                    google_media_id=google_id,
-                    media_format=item.get("mediaFormat", "PHOTO"),
-                    location_association=item.get("locationAssociation", {}).get("category"),
-                    google_url=item.get("googleUrl"),
-                    thumbnail_url=item.get("thumbnailUrl"),
-                    description=item.get("description"),
-                    views=item.get("insightsData", {}).get("viewCount", 0),
-                    create_time=created_at
-                )
-                db.add(new_media)
-                synced_count += 1
-            else:
-                # Update existing
-                existing.google_url = item.get("googleUrl")
-                existing.views = item.get("insightsData", {}).get("viewCount", 0)
+            return datetime.utcnow()
+
+        result = reconcile(
+            db, models.MediaItem, models.MediaItem.google_media_id,
+            google_media.get("mediaItems", []),
+            # Format: accounts/.../locations/.../media/{id}
+            key_of=lambda item: item.get("name", "").split("/")[-1],
+            new_values=lambda item: {
+                "store_id": store_id,
+                "media_format": item.get("mediaFormat", "PHOTO"),
+                "location_association": item.get("locationAssociation", {}).get("category"),
+                "google_url": item.get("googleUrl"),
+                "thumbnail_url": item.get("thumbnailUrl"),
+                "description": item.get("description"),
+                "views": item.get("insightsData", {}).get("viewCount", 0),
+                "create_time": parse_create_time(item),
+            },
+            update_values=lambda item: {
+                "google_url": item.get("googleUrl"),
+                "views": item.get("insightsData", {}).get("viewCount", 0),
+            },
+            scope=[models.MediaItem.store_id == store_id],
+        )
+        synced_count = result.created
         
         db.commit()
         return {"message": f"Synced {synced_count} new media items", "total_google": len(google_media.get("mediaItems", []))}
@@ -150,14 +145,9 @@ def upload_media(
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # Refresh token if needed
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
+    access_token = credentials.get_access_token(db, connection)
             
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     try:
         media_data = {
             "mediaFormat": media.media_format,
@@ -216,16 +206,12 @@ def delete_media(media_id: str, db: Session = Depends(database.get_db), current_
         raise HTTPException(status_code=400, detail="Google連携が切断されているため、写真を削除できません。設定画面から再接続してください。")
         
     # Refresh token if needed
-    if connection.expiry and connection.expiry < datetime.utcnow() and connection.refresh_token:
-        try:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
-        except Exception:
-            raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    try:
+        access_token = credentials.get_access_token(db, connection)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
 
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     try:
         # Pass location_name to help resolve v4 path
         client.delete_media(item.google_media_id, location_name=store.google_location_id)
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth
@@ -110,18 +111,19 @@ def get_optimization_suggestions(store_id: str, db: Session = Depends(database.g
     }
 
 @router.post("/{store_id}/generate")
-def generate_optimization_content(store_id: str, type: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+async def generate_optimization_content(store_id: str, type: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
     """
     Generate optimized content using AI
     type: DESCRIPTION, POST_IDEA, etc.
     """
-    client = ai_generator.AIClient()
-    store = db.query(models.Store).filter(models.Store.id == store_id).first()
+    client = ai_generator.AsyncAIClient()
+    # Blocking query: off the event loop
+    store = await asyncio.to_thread(lambda: db.query(models.Store).filter(models.Store.id == store_id).first())
     
     if type == "DESCRIPTION":
         # Generate description
         prompt = f"ビジネス名: {store.name}\n業種: {store.category or '未設定'}\n\nこのビジネスの魅力を伝える、SEOに強いビジネス説明文を300文字程度で作成してください。"
-        content = client.generate_text("あなたはMEOのプロフェッショナルです。", prompt)
+        content = await client.generate_text("あなたはMEOのプロフェッショナルです。", prompt)
         return {"content": content}
         
     return {"message": "Invalid type"}
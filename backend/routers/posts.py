@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth, schemas
 from services import google_api
+from services.credentials import credentials
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
@@ -106,13 +107,9 @@ def update_post(post_id: str, post_update: PostUpdate, db: Session = Depends(dat
         try:
              # Refresh token if needed
              connection = current_user.google_connection
-             if connection.expiry and connection.expiry < datetime.utcnow() and connection.refresh_token:
-                 new_tokens = google_api.refresh_access_token(connection.refresh_token)
-                 connection.access_token = new_tokens.get("access_token")
-                 connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-                 db.commit()
+             access_token = credentials.get_access_token(db, connection)
                  
-             client = google_api.GBPClient(connection.access_token)
+             client = google_api.GBPClient(access_token)
              
              # Prepare Update Data
              post_data = {
@@ -146,17 +143,13 @@ def delete_post(post_id: str, db: Session = Depends(database.get_db), current_us
 
         connection = current_user.google_connection
         # Refresh Token Logic
-        if connection.expiry and connection.expiry < datetime.utcnow() and connection.refresh_token:
-             try:
-                 new_tokens = google_api.refresh_access_token(connection.refresh_token)
-                 connection.access_token = new_tokens.get("access_token")
-                 connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-                 db.commit()
-             except Exception as e:
-                 print(f"Failed to refresh token: {e}")
-                 raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+        try:
+             access_token = credentials.get_access_token(db, connection)
+        except Exception as e:
+             print(f"Failed to refresh token: {e}")
+             raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
 
-        client = google_api.GBPClient(connection.access_token)
+        client = google_api.GBPClient(access_token)
         
         # Get Location ID
         store = db.query(models.Store).filter(models.Store.id == post.store_id).first()
@@ -217,14 +210,9 @@ def sync_posts_from_google(store_id: str, db: Session = Depends(database.get_db)
         raise HTTPException(status_code=400, detail="Google account not connected")
     
     # Refresh token if needed
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
+    access_token = credentials.get_access_token(db, connection)
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     try:
         google_posts = client.list_local_posts(store.google_location_id)
         
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
+from services.reconcile import reconcile
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
@@ -31,17 +33,13 @@ def sync_qa_from_google(store_id: str, db: Session = Depends(database.get_db), c
     if not connection or not connection.access_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
     
-    # 1. Pre-emptive Refresh
-    if connection.expiry and connection.expiry < datetime.utcnow() + timedelta(minutes=10) and connection.refresh_token:
-        try:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
-        except:
-             raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    # 1. Pre-emptive Refresh (cached, single-flight)
+    try:
+        access_token = credentials.get_access_token(db, connection)
+    except:
+         raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
 
     # 2. Handshake
     try:
@@ -52,63 +50,60 @@ def sync_qa_from_google(store_id: str, db: Session = Depends(database.get_db), c
     try:
         # Use simple list (v1 or v4 handled in params)
         questions_resp = client.list_questions(store.google_location_id)
-        synced_q_count = 0
-        
-        for q_data in questions_resp.get("questions", []):
-            q_google_id = q_data.get("name", "").split("/")[-1]
-            existing_q = db.query(models.Question).filter(models.Question.google_question_id == q_google_id).first()
-            
-            def parse_time(t_str):
-                if not t_str: return datetime.utcnow()
-                try: return datetime.fromisoformat(t_str.replace("Z", "+00:00"))
-                except: return datetime.utcnow()
+        def parse_time(t_str):
+            if not t_str: return datetime.utcnow()
+            try: return datetime.fromisoformat(t_str.replace("Z", "+00:00"))
+            except: return datetime.utcnow()
 
-            create_time = parse_time(q_data.get("createTime"))
-            update_time = parse_time(q_data.get("updateTime"))
-            
-            if not existing_q:
-                existing_q = models.Question(
-                    store_id=store_id,
-                    google_question_id=q_google_id,
-                    authore_name=q_data.get("author", {}).get("displayName", "Anonymous"),
-                    text=q_data.get("text"),
-                    upvote_count=q_data.get("upvoteCount", 0),
-                    create_time=create_time,
-                    update_time=update_time
-                )
-                db.add(existing_q)
-                synced_q_count += 1
-            else:
-                existing_q.update_time = update_time
-                existing_q.upvote_count = q_data.get("upvoteCount", 0)
-            
-            db.commit() # Commit to get ID for answers
-            db.refresh(existing_q) 
-            
-            # Sync Answers
+        questions = questions_resp.get("questions", [])
+        q_result = reconcile(
+            db, models.Question, models.Question.google_question_id,
+            questions,
+            key_of=lambda q: q.get("name", "").split("/")[-1],
+            new_values=lambda q_data: {
+                "store_id": store_id,
+                "authore_name": q_data.get("author", {}).get("displayName", "Anonymous"),
+                "text": q_data.get("text"),
+                "upvote_count": q_data.get("upvoteCount", 0),
+                "create_time": parse_time(q_data.get("createTime")),
+                "update_time": parse_time(q_data.get("updateTime")),
+            },
+            update_values=lambda q_data: {
+                "update_time": parse_time(q_data.get("updateTime")),
+                "upvote_count": q_data.get("upvoteCount", 0),
+            },
+            scope=[models.Question.store_id == store_id],
+        )
+        synced_q_count = q_result.created
+        
+        # Sync Answers: collect every question's answers, then reconcile them in one pass
+        answer_items = []
+        for q_data in questions:
+            question_id = q_result.ids.get(q_data.get("name", "").split("/")[-1])
+            if not question_id:
+                continue
             try:
                 answers_resp = client.list_answers(q_data.get("name"))
                 for a_data in answers_resp.get("answers", []):
-                    a_google_id = a_data.get("name", "").split("/")[-1]
-                    existing_a = db.query(models.Answer).filter(models.Answer.google_answer_id == a_google_id).first()
-                    
-                    a_create_time = parse_time(a_data.get("createTime"))
-                    a_update_time = parse_time(a_data.get("updateTime"))
-                    
-                    if not existing_a:
-                        new_a = models.Answer(
-                            question_id=existing_q.id,
-                            google_answer_id=a_google_id,
-                            author_name=a_data.get("author", {}).get("displayName", "Anonymous"),
-                            text=a_data.get("text"),
-                            upvote_count=a_data.get("upvoteCount", 0),
-                            author_type=a_data.get("author", {}).get("type", "REGULAR_USER"),
-                            create_time=a_create_time,
-                            update_time=a_update_time
-                        )
-                        db.add(new_a)
+                    answer_items.append({**a_data, "_question_id": question_id})
             except Exception as e_ans:
                 print(f"Answer sync warning: {e_ans}")
+
+        reconcile(
+            db, models.Answer, models.Answer.google_answer_id,
+            answer_items,
+            key_of=lambda a: a.get("name", "").split("/")[-1],
+            new_values=lambda a_data: {
+                "question_id": a_data["_question_id"],
+                "author_name": a_data.get("author", {}).get("displayName", "Anonymous"),
+                "text": a_data.get("text"),
+                "upvote_count": a_data.get("upvoteCount", 0),
+                "author_type": a_data.get("author", {}).get("type", "REGULAR_USER"),
+                "create_time": parse_time(a_data.get("createTime")),
+                "update_time": parse_time(a_data.get("updateTime")),
+            },
+            scope=[models.Answer.question_id.in_(list(q_result.ids.values()))],
+        )
                 
         db.commit()
         return {"message": f"Synced {synced_q_count} new questions"}
@@ -135,17 +130,13 @@ def create_answer(
     if not connection or not connection.access_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
 
-    # 1. Pre-emptive Refresh
-    if connection.expiry and connection.expiry < datetime.utcnow() + timedelta(minutes=10) and connection.refresh_token:
-        try:
-             new_tokens = google_api.refresh_access_token(connection.refresh_token)
-             connection.access_token = new_tokens.get("access_token")
-             connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-             db.commit()
-        except:
-             raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    # 1. Pre-emptive Refresh (cached, single-flight)
+    try:
+         access_token = credentials.get_access_token(db, connection)
+    except:
+         raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
 
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     
     # 2. Handshake
     try:
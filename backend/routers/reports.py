@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Header as APIHeader
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import models, database, auth
-from services import report_generator, ai_generator
+from services import ai_generator, review_sentiment
+from services.insight_rollups import summarize_insights
 from datetime import datetime, timedelta
 from io import StringIO
 import csv
@@ -24,7 +25,7 @@ def get_monthly_report(
     year: int = None, 
     month: int = None,
     format: str = "json",
-    db: Session = Depends(database.get_db), 
+    db: Session = Depends(database.get_read_db), 
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
@@ -48,8 +49,15 @@ def get_monthly_report(
     else:
         end_date = datetime(year, month + 1, 1) - timedelta(seconds=1)
     
-    # インサイトデータ取得
-    insights = db.query(models.Insight).filter(
+    # インサイトデータ取得 (日別内訳用)
+    insights = db.query(
+        models.Insight.date,
+        models.Insight.views_maps,
+        models.Insight.views_search,
+        models.Insight.actions_website,
+        models.Insight.actions_phone,
+        models.Insight.actions_driving_directions,
+    ).filter(
         models.Insight.store_id == store_id,
         models.Insight.date >= start_date,
         models.Insight.date <= end_date
@@ -70,11 +78,13 @@ def get_monthly_report(
     ).all()
     
     # 集計
-    total_views_maps = sum(i.views_maps or 0 for i in insights)
-    total_views_search = sum(i.views_search or 0 for i in insights)
-    total_website_clicks = sum(i.actions_website or 0 for i in insights)
-    total_phone_clicks = sum(i.actions_phone or 0 for i in insights)
-    total_directions = sum(i.actions_driving_directions or 0 for i in insights)
+    # Month totals come from the MONTH rollup (daily rows only if it is not built yet)
+    totals = summarize_insights(db, store_id, start_date, end_date)
+    total_views_maps = totals["views_maps"]
+    total_views_search = totals["views_search"]
+    total_website_clicks = totals["actions_website"]
+    total_phone_clicks = totals["actions_phone"]
+    total_directions = totals["actions_driving_directions"]
     
     avg_rating = sum(r.star_rating or 0 for r in reviews) / len(reviews) if reviews else 0
     
@@ -160,7 +170,7 @@ def download_report(
     store_id: str, 
     year: int = None,
     month: int = None,
-    db: Session = Depends(database.get_db), 
+    db: Session = Depends(database.get_read_db), 
     current_user: models.User = Depends(auth.get_current_user),
     x_openai_api_key: str = APIHeader(None, alias="X-OpenAI-Api-Key")
 ):
@@ -199,38 +209,34 @@ def download_report(
         }
         
         # 2. Fetch Sentiment - with fallback if AI fails
-        sentiment_data = {
-            "summary": "データなし",
-            "sentiment_score": 50,
-            "positive_points": [],
-            "negative_points": []
-        }
+        # Aggregated over every review of the period from the per-review scores; the AI
+        # only writes the narrative, and only when the numbers changed.
+        sentiment_data = dict(review_sentiment.FALLBACK)
         
+        client = None
+        if x_openai_api_key:
+            client = ai_generator.AIClient(api_key=x_openai_api_key)
+        else:
+            # Stored scores (and narrative) only; never falls back to the server's key
+            logger.warning("No OpenAI API key provided for sentiment analysis")
+        # db is the read replica: scoring and the stored summary go to the primary
+        write_db = database.SessionLocal()
         try:
-            r_query = db.query(models.Review).filter(models.Review.store_id == store_id)
-            if start_date:
-                r_query = r_query.filter(models.Review.create_time >= start_date, models.Review.create_time <= end_date)
-            else:
-                r_query = r_query.order_by(models.Review.create_time.desc()).limit(20) # Analyze recent 20 for default
-                
-            reviews = r_query.all()
-            
-            logger.info(f"Found {len(reviews)} reviews for store {store_id} ({period_label})")
-            if reviews:
-                review_data = [{"text": r.comment, "rating": r.star_rating} for r in reviews if r.comment]
-                logger.info(f"Reviews with comments: {len(review_data)}")
-                if review_data and x_openai_api_key:
-                    client = ai_generator.AIClient(api_key=x_openai_api_key)
-                    sentiment_data = client.analyze_sentiment(review_data)
-                elif not x_openai_api_key:
-                    logger.warning("No OpenAI API key provided for sentiment analysis")
+            result = review_sentiment.store_sentiment(write_db, store_id, client, start_date, end_date)
+            if result:
+                sentiment_data = result
+            logger.info(f"Sentiment for store {store_id} ({period_label}): {sentiment_data.get('scored_count', 0)} scored reviews")
         except Exception as e:
+            write_db.rollback()
             logger.error(f"AI sentiment analysis failed (non-critical): {e}")
             traceback.print_exc()
             # Continue with fallback sentiment_data
+        finally:
+            write_db.close()
         
         # Generate PDF
         logger.info(f"Generating PDF for store {store.name}")
+        from services import report_generator # deferred: pulls in reportlab
         generator = report_generator.ReportGenerator()
         pdf_buffer = generator.generate_report(store.name, insight_data, sentiment_data, period_label=period_label)
         
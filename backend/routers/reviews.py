@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, database, auth
 from services import google_api
+from services.credentials import credentials
+from services.reconcile import reconcile
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
@@ -15,7 +17,7 @@ class ReviewReply(BaseModel):
     reply_text: str
 
 @router.get("/")
-def list_reviews(store_id: Optional[str] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+def list_reviews(store_id: Optional[str] = None, db: Session = Depends(database.get_read_db), current_user: models.User = Depends(auth.get_current_user)):
     """
     List reviews from the local database.
     To sync with Google, use /google/sync/{location_id} first.
@@ -38,17 +40,13 @@ def sync_reviews_from_google(store_id: str, db: Session = Depends(database.get_d
     if not connection or not connection.access_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
     
-    # 1. Pre-emptive Token Refresh
-    if connection.expiry and connection.expiry < datetime.utcnow() + timedelta(minutes=10) and connection.refresh_token:
-        try:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
-        except:
-            raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    # 1. Pre-emptive Token Refresh (cached, single-flight)
+    try:
+        access_token = credentials.get_access_token(db, connection)
+    except:
+        raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     
     # 2. Handshake / ID Verification
     try:
@@ -57,45 +55,53 @@ def sync_reviews_from_google(store_id: str, db: Session = Depends(database.get_d
          raise HTTPException(status_code=404, detail="Google上の店舗IDが無効です。設定画面で店舗を再選択してください。")
 
     try:
-        # 3. Execute List
-        google_reviews = client.list_reviews(store.google_location_id)
-        
-        synced_count = 0
-        for review_data in google_reviews.get("reviews", []):
-            review_id = review_data.get("reviewId") or review_data.get("name", "").split("/")[-1]
-            existing = db.query(models.Review).filter(models.Review.google_review_id == review_id).first()
-            
-            # Helper to parse time safely
-            def parse_time(t_str):
-                if not t_str: return datetime.utcnow()
-                try: return datetime.fromisoformat(t_str.replace("Z", "+00:00"))
-                except: return datetime.utcnow()
+        # Helper to parse time safely
+        def parse_time(t_str):
+            if not t_str: return datetime.utcnow()
+            try: return datetime.fromisoformat(t_str.replace("Z", "+00:00"))
+            except: return datetime.utcnow()
+
+        def review_key(review_data):
+            return review_data.get("reviewId") or review_data.get("name", "").split("/")[-1]
 
-            create_time = parse_time(review_data.get("createTime"))
-            update_time = parse_time(review_data.get("updateTime"))
+        # 3. Execute List (page by page, committing each page)
+        synced_count = 0
+        total_from_google = 0
+        for page in client.iter_review_pages(store.google_location_id):
+            page_reviews = page.get("reviews", [])
+            if not page_reviews:
+                continue
+            total_from_google += len(page_reviews)
 
-            if not existing:
-                new_review = models.Review(
-                    store_id=store_id,
-                    google_review_id=review_id,
-                    reviewer_name=review_data.get("reviewer", {}).get("displayName", "Anonymous"),
-                    comment=review_data.get("comment"),
-                    star_rating=review_data.get("starRating"),
-                    reply_comment=review_data.get("reviewReply", {}).get("comment"),
-                    create_time=create_time,
-                    update_time=update_time,
-                )
-                db.add(new_review)
-                synced_count += 1
-            else:
+            result = reconcile(
+                db, models.Review, models.Review.google_review_id,
+                page_reviews,
+                key_of=review_key,
+                new_values=lambda review_data: {
+                    "store_id": store_id,
+                    "reviewer_name": review_data.get("reviewer", {}).get("displayName", "Anonymous"),
+                    "comment": review_data.get("comment"),
+                    "star_rating": review_data.get("starRating"),
+                    "reply_comment": review_data.get("reviewReply", {}).get("comment"),
+                    "create_time": parse_time(review_data.get("createTime")),
+                    "update_time": parse_time(review_data.get("updateTime")),
+                },
                 # Update existing review data
-                existing.comment = review_data.get("comment")
-                existing.star_rating = review_data.get("starRating")
-                existing.reply_comment = review_data.get("reviewReply", {}).get("comment")
-                existing.update_time = update_time
+                update_values=lambda review_data: {
+                    "comment": review_data.get("comment"),
+                    "star_rating": review_data.get("starRating"),
+                    "reply_comment": review_data.get("reviewReply", {}).get("comment"),
+                    "update_time": parse_time(review_data.get("updateTime")),
+                },
+                scope=[
+                    models.Review.store_id == store_id,
+                    models.Review.google_review_id.in_([review_key(r) for r in page_reviews]),
+                ],
+            )
+            synced_count += result.created
+            db.commit()
         
-        db.commit()
-        return {"message": f"Synced {synced_count} new reviews", "total_from_google": len(google_reviews.get("reviews", []))}
+        return {"message": f"Synced {synced_count} new reviews", "total_from_google": total_from_google}
     except Exception as e:
         print(f"Sync Reviews Failed: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -117,17 +123,13 @@ def reply_to_review(review_id: str, reply: ReviewReply, db: Session = Depends(da
     if not connection or not connection.access_token:
         raise HTTPException(status_code=400, detail="Google account not connected")
     
-    # 1. Pre-emptive Token Refresh
-    if connection.expiry and connection.expiry < datetime.utcnow() + timedelta(minutes=10) and connection.refresh_token:
-        try:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
-        except:
-            raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
+    # 1. Pre-emptive Token Refresh (cached, single-flight)
+    try:
+        access_token = credentials.get_access_token(db, connection)
+    except:
+        raise HTTPException(status_code=401, detail="Google認証の更新に失敗しました。再ログインしてください。")
     
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.GBPClient(access_token)
     
     # 2. Handshake
     try:
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import models, schemas, auth, database
+import models, schemas, auth, database, query_profiles
 
 router = APIRouter(
     prefix="/admin/stores",
@@ -23,7 +23,7 @@ def list_stores(
     COMPANY_ADMIN: Can only see their own company's stores (company_id param ignored/overridden).
     STORE_USER: Can only see their assigned store.
     """
-    query = db.query(models.Store)
+    query = db.query(models.Store).options(*query_profiles.STORE_LIST)
 
     if current_user.role == 'SUPER_ADMIN':
         if company_id:
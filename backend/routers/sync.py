@@ -15,11 +15,13 @@ router = APIRouter(
 @router.post("/{store_id}", response_model=Dict[str, Any])
 async def trigger_manual_sync(
     store_id: str,
+    backfill: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
     Trigger manual synchronization for a specific store.
+    backfill=true re-fetches the full insights history (otherwise only recent days).
     """
     # 1. Permission Check
     # Verify user has access to store_id (Role check or ownership check)
@@ -42,22 +44,18 @@ async def trigger_manual_sync(
     if not connection or not connection.access_token:
         return {"status": "error", "message": "Google account not connected"}
     
-    # Refresh if needed (logic duplicated from other routers, should be centralized but handled here for safety)
+    # Refresh if needed (cached, single-flight)
     from services import google_api 
-    from datetime import datetime, timedelta
+    from services.credentials import credentials
+    from datetime import datetime
     
-    if connection.expiry and connection.expiry < datetime.utcnow():
-        if connection.refresh_token:
-            new_tokens = google_api.refresh_access_token(connection.refresh_token)
-            connection.access_token = new_tokens.get("access_token")
-            connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-            db.commit()
+    access_token = await credentials.aget_access_token(db, connection)
 
     # Create Client & Service with User's Token
-    client = google_api.GBPClient(connection.access_token)
+    client = google_api.AsyncGBPClient(access_token)
     service = GoogleSyncService(client)
     
-    results = await service.sync_all(db, store_id, store.google_location_id)
+    results = await service.sync_all(db, store_id, store.google_location_id, backfill=backfill)
     
     # 4. Update models.Store.last_synced_at
     store.last_synced_at = datetime.utcnow() # Use utcnow
@@ -0,0 +1,120 @@
+"""
+Query-count harness for list endpoints.
+
+Seeds an in-memory SQLite database with a small and a large data set and calls each
+list endpoint through FastAPI's TestClient, counting SQL statements per request.
+The count must not grow with the number of rows (see query_profiles.py).
+
+Usage: python scripts/check_query_counts.py
+Exits with status 1 if any endpoint's query count depends on page size.
+"""
+import sys
+import os
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models, database, auth
+from routers import stores, admin, groups
+
+SIZES = (5, 100)
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def seed(db, size: int) -> models.User:
+    company = models.Company(name="Query Count Co")
+    db.add(company)
+    db.flush()
+
+    admin_user = models.User(email="admin@example.com", hashed_password="x", role="SUPER_ADMIN", company_id=company.id)
+    db.add(admin_user)
+
+    for i in range(size):
+        group = models.StoreGroup(name=f"Group {i}", company_id=company.id)
+        db.add(group)
+        db.flush()
+        store = models.Store(name=f"Store {i}", company_id=company.id, group_id=group.id)
+        db.add(store)
+        db.flush()
+        db.add(models.Post(store_id=store.id, content=f"Post {i}"))
+        user = models.User(email=f"user{i}@example.com", hashed_password="x", role="STORE_USER",
+                           company_id=company.id, store_id=store.id)
+        db.add(user)
+        db.flush()
+        db.add(models.GoogleConnection(user_id=user.id, access_token="token"))
+
+    db.commit()
+    return admin_user
+
+
+def measure(size: int) -> dict:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    admin_id = seed(db, size).id
+    db.close()
+
+    app = FastAPI()
+    for router in (stores.router, admin.router, groups.router):
+        app.include_router(router)
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def override_current_user():
+        session = Session()
+        return session.query(models.User).filter(models.User.id == admin_id).first()
+
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[auth.get_current_user] = override_current_user
+
+    client = TestClient(app)
+    counter = QueryCounter(engine)
+    counts = {}
+    for path in ("/admin/stores/", "/admin/stores", "/admin/users", "/groups/"):
+        counter.count = 0
+        response = client.get(path, params={"limit": size})
+        if response.status_code != 200:
+            raise SystemExit(f"{path} returned {response.status_code}: {response.text[:300]}")
+        counts[path] = counter.count
+    return counts
+
+
+def main():
+    results = {size: measure(size) for size in SIZES}
+    failed = False
+    for path in results[SIZES[0]]:
+        per_size = [results[size][path] for size in SIZES]
+        ok = len(set(per_size)) == 1
+        failed = failed or not ok
+        detail = ", ".join(f"{size} rows: {n} queries" for size, n in zip(SIZES, per_size))
+        print(f"{'OK  ' if ok else 'FAIL'} {path} ({detail})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Query-plan check for hot query paths.
+
+Runs EXPLAIN for the queries behind the scheduler and the busiest endpoints and
+fails if any of them scans a table instead of using an index.
+
+- SQLite (default): builds the schema in memory from models.py and reads EXPLAIN QUERY PLAN.
+- Postgres: pass --url (or set DATABASE_URL) pointing at a migrated database. Sequential
+  scans are disabled for the session so the planner reports whether an index *can* serve
+  the query, even on small tables where a seq scan would be cheaper.
+
+Usage: python scripts/check_query_plans.py [--url postgresql://...]
+Exits with status 1 if any query does not use an index.
+"""
+import argparse
+import json
+import sys
+import os
+from datetime import datetime
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+import models
+
+NOW = datetime(2026, 1, 1)
+
+# name -> (sql, params); mirrors the ORM filters used in routers/ and services/
+HOT_QUERIES = {
+    "scheduler: due scheduled posts": (
+        "SELECT id FROM posts WHERE status = :status AND scheduled_at <= :now",
+        {"status": "SCHEDULED", "now": NOW},
+    ),
+    "posts: list by store": (
+        "SELECT id FROM posts WHERE store_id = :store_id ORDER BY created_at DESC",
+        {"store_id": "s1"},
+    ),
+    "insights: daily series": (
+        "SELECT date, views_maps, views_search FROM insights "
+        "WHERE store_id = :store_id AND date >= :start AND date <= :end ORDER BY date",
+        {"store_id": "s1", "start": NOW, "end": NOW},
+    ),
+    "insights: rollup lookup": (
+        "SELECT days_count, views_maps FROM insight_rollups "
+        "WHERE store_id = :store_id AND period = :period AND period_start = :start",
+        {"store_id": "s1", "period": "MONTH", "start": NOW},
+    ),
+    "reviews: list by store": (
+        "SELECT id FROM reviews WHERE store_id = :store_id ORDER BY create_time DESC",
+        {"store_id": "s1"},
+    ),
+    "reviews: unreplied (auto-reply)": (
+        "SELECT id FROM reviews WHERE store_id = :store_id AND reply_comment IS NULL "
+        "AND create_time >= :since",
+        {"store_id": "s1", "since": NOW},
+    ),
+    "reviews: reconcile page": (
+        "SELECT id FROM reviews WHERE store_id = :store_id AND google_review_id IN (:a, :b)",
+        {"store_id": "s1", "a": "r1", "b": "r2"},
+    ),
+    "media: reconcile": (
+        "SELECT id FROM media_items WHERE store_id = :store_id AND google_media_id = :key",
+        {"store_id": "s1", "key": "m1"},
+    ),
+    "questions: reconcile": (
+        "SELECT id FROM questions WHERE store_id = :store_id AND google_question_id = :key",
+        {"store_id": "s1", "key": "q1"},
+    ),
+    "answers: reconcile": (
+        "SELECT id FROM answers WHERE question_id = :question_id AND google_answer_id = :key",
+        {"question_id": "q1", "key": "a1"},
+    ),
+    "rank logs: history by keyword": (
+        "SELECT rank FROM rank_logs WHERE keyword_id = :keyword_id AND date >= :since ORDER BY date",
+        {"keyword_id": "k1", "since": NOW},
+    ),
+}
+
+
+def sqlite_plan(conn, sql, params):
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+    details = [row[-1] for row in rows]
+    # "SEARCH t USING INDEX ..." / "SCAN t USING INDEX ..." are fine, a bare "SCAN t" is not
+    ok = not any(d.startswith("SCAN") and "INDEX" not in d for d in details)
+    return ok, details
+
+
+def _pg_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _pg_nodes(child)
+
+
+def postgres_plan(conn, sql, params):
+    conn.execute(text("SET enable_seqscan = off"))
+    raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    nodes = list(_pg_nodes(plan[0]["Plan"]))
+    details = [f"{n['Node Type']} {n.get('Index Name') or n.get('Relation Name') or ''}".strip() for n in nodes]
+    ok = not any(n["Node Type"] == "Seq Scan" for n in nodes)
+    return ok, details
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that hot queries use indexes")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), help="Postgres URL (default: in-memory SQLite)")
+    args = parser.parse_args()
+
+    url = args.url if args.url and args.url.startswith("postgres") else "sqlite://"
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    engine = create_engine(url)
+    if url == "sqlite://":
+        models.Base.metadata.create_all(bind=engine)
+    explain = postgres_plan if engine.dialect.name == "postgresql" else sqlite_plan
+
+    failed = False
+    with engine.connect() as conn:
+        print(f"Dialect: {engine.dialect.name}")
+        for name, (sql, params) in HOT_QUERIES.items():
+            ok, details = explain(conn, sql, params)
+            failed = failed or not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {name}: {' | '.join(details)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold-start check for the API process.
+
+Imports main.py in a fresh interpreter with `python -X importtime`, prints the slowest
+top-level packages and the total, and checks that none of the deferred heavy modules
+(startup_profile.DEFERRED_MODULES) is imported at boot.
+
+Usage: python scripts/check_startup_time.py [--top N]
+Exits with status 1 if the import takes longer than STARTUP_TARGET_SECONDS (default 5)
+or a deferred module is loaded. Run against the same DATABASE_URL as the deploy, since
+the migration check at import talks to the database.
+"""
+import sys
+import os
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import startup_profile
+
+
+def import_times():
+    """(module, self_us, cumulative_us) for every module imported by `import main`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit("import main failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    top = int(sys.argv[sys.argv.index("--top") + 1]) if "--top" in sys.argv else 15
+    rows = import_times()
+
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    total = sum(by_package.values()) / 1e6
+
+    print(f"import main: {total:.2f}s (target {startup_profile.STARTUP_TARGET_SECONDS:.1f}s)")
+    for package, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {package:<28} {us / 1e6:6.3f}s")
+
+    loaded = sorted({name.split(".")[0] for name, _, _ in rows} & set(startup_profile.DEFERRED_MODULES))
+    failed = False
+    if loaded:
+        print(f"FAIL: deferred modules imported at boot: {', '.join(loaded)}")
+        failed = True
+    if total > startup_profile.STARTUP_TARGET_SECONDS:
+        print("FAIL: over the cold start target")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Response cache for AI generations (services/ai_generator.py).
+# Entries are addressed by a hash of everything that determines the completion
+# (model, prompts, sampling parameters), so a double-click, a retry or a bulk preview
+# with the same prompt is answered without calling OpenAI again.
+# Callers opt out per call (use_cache=False) for "regenerate" actions: the lookup is
+# skipped and the new completion replaces the cached one.
+#
+# AI_CACHE_BACKEND: "memory" (per process, TTL + LRU), "db" (shared by all instances,
+# table ai_generation_cache), or "none".
+
+AI_CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "memory").lower()
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000")) # memory backend
+
+# DB backend: delete expired rows on roughly this share of writes
+_DB_PRUNE_PROBABILITY = 0.01
+
+
+def cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([model, system_prompt, user_prompt, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Per-process cache with TTL expiry and LRU eviction. Thread-safe."""
+    blocking = False
+
+    def __init__(self, ttl_seconds: int = AI_CACHE_TTL_SECONDS, max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict() # key -> (expires_at monotonic, text)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, text = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def put(self, key: str, text: str, model: str = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DatabaseCache:
+    """
+    Cache rows in ai_generation_cache, shared by every instance. TTL expiry; expired rows
+    are pruned now and then on write. Runs short queries in its own session, so async
+    callers hand it to a worker thread (blocking = True).
+    """
+    blocking = True
+
+    def __init__(self, ttl_seconds: int = AI_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        from database import SessionLocal
+        import models
+        db = SessionLocal()
+        try:
+            row = db.query(models.AIGenerationCache.response, models.AIGenerationCache.expires_at).filter(
+                models.AIGenerationCache.key == key
+            ).first()
+            if row is None or row.expires_at < datetime.utcnow():
+                return None
+            return row.response
+        finally:
+            db.close()
+
+    def put(self, key: str, text: str, model: str = None):
+        from database import SessionLocal
+        import models
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            # merge: insert, or overwrite an expired/concurrent entry with the same key
+            db.merge(models.AIGenerationCache(
+                key=key, model=model, response=text,
+                created_at=now, expires_at=now + timedelta(seconds=self.ttl_seconds),
+            ))
+            if random.random() < _DB_PRUNE_PROBABILITY:
+                db.query(models.AIGenerationCache).filter(
+                    models.AIGenerationCache.expires_at < now
+                ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: AI cache write failed: {e}")
+        finally:
+            db.close()
+
+    def clear(self):
+        from database import SessionLocal
+        import models
+        db = SessionLocal()
+        try:
+            db.query(models.AIGenerationCache).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def _build_cache():
+    if AI_CACHE_BACKEND == "db":
+        return DatabaseCache()
+    if AI_CACHE_BACKEND == "memory":
+        return MemoryCache()
+    if AI_CACHE_BACKEND != "none":
+        print(f"WARNING: Unknown AI_CACHE_BACKEND '{AI_CACHE_BACKEND}'. AI response cache disabled.")
+    return None
+
+
+# Process-wide cache used by AIClient / AsyncAIClient (None = disabled)
+cache = _build_cache()
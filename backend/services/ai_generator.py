@@ -1,43 +1,120 @@
 import os
 import json
-from openai import OpenAI
-import httpx
+import asyncio
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 
-class AIClient:
+from services import ai_cache
+
+# OpenAI clients are cached process-wide per API key, so every request reuses the
+# client's HTTP connection pool instead of building a new one.
+# Async clients are bound to the event loop that opened their connections, so they are
+# cached per running loop (normally just the FastAPI loop), like services/http_client.py.
+
+OPENAI_CLIENT_CACHE_SIZE = int(os.getenv("OPENAI_CLIENT_CACHE_SIZE", "256"))
+
+API_KEY_MISSING_MESSAGE = "OpenAI APIキーが設定されていません。設定画面でAPIキーを入力してください。"
+
+_sync_clients = OrderedDict()
+_sync_clients_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary() # loop -> OrderedDict(api_key -> AsyncOpenAI)
+
+
+def _cache_put(cache: OrderedDict, api_key: str, client):
+    cache[api_key] = client
+    while len(cache) > OPENAI_CLIENT_CACHE_SIZE:
+        cache.popitem(last=False) # evicted clients are closed when garbage-collected
+
+
+def get_openai_client(api_key: str):
+    """Shared openai.OpenAI client for api_key (thread-safe)."""
+    with _sync_clients_lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            from openai import OpenAI # deferred: heavy import, only needed once AI is used
+            client = OpenAI(api_key=api_key)
+            _cache_put(_sync_clients, api_key, client)
+        else:
+            _sync_clients.move_to_end(api_key)
+        return client
+
+
+def get_async_openai_client(api_key: str):
+    """Shared openai.AsyncOpenAI client for api_key on the current event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = _async_clients[loop] = OrderedDict()
+    client = clients.get(api_key)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key)
+        _cache_put(clients, api_key, client)
+    else:
+        clients.move_to_end(api_key)
+    return client
+
+
+async def aclose_async_clients():
+    """Close the async OpenAI clients of the current event loop (application shutdown)."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), None) or {}
+    for client in clients.values():
+        await client.close()
+
+
+class _AIClientBase(ABC):
+    """
+    Prompt building shared by AIClient and AsyncAIClient.
+    The generate_* methods hand their prompts to _complete(), which returns the text
+    (AIClient) or an awaitable of it (AsyncAIClient).
+    """
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        # Initialize OpenAI client
         # Note: If no API key is provided here or in env, client creation might not fail immediately,
         # but subsequent calls will. We handle this check in methods.
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-        else:
-            self.client = None
-            
         self.model = "gpt-4o"
 
-    def generate_text(self, system_prompt: str, user_prompt: str):
-        if not self.client:
-            print("Error: OpenAI client not initialized (API key missing)")
-            raise ValueError("OpenAI APIキーが設定されていません。設定画面でAPIキーを入力してください。")
+    temperature = 0.7
+    max_tokens = 1000
 
-        try:
-            print(f"DEBUG: Calling OpenAI API ({self.model})...")
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Error calling OpenAI API: {e}")
-            return f"生成エラー: {str(e)}"
+    def _request(self, system_prompt: str, user_prompt: str) -> dict:
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
+
+    def _cache_key(self, system_prompt: str, user_prompt: str) -> str:
+        return ai_cache.cache_key(self.model, system_prompt, user_prompt, self.temperature, self.max_tokens)
+
+    @abstractmethod
+    def _complete(self, system_prompt: str, user_prompt: str, parse=None, use_cache: bool = True):
+        """Generate (and parse) a completion, in the client's calling convention."""
+
+    @abstractmethod
+    def _value(self, value):
+        """Result that needs no API call, in the client's calling convention."""
 
-    def generate_post_content(self, keywords: str, length_option: str, tone: str = "friendly", custom_prompt: str = None, keywords_region: str = None, char_count: int = None, past_posts: list = None, store_name: str = None, store_description: str = None, store_category: str = None, store_address: str = None):
+    @staticmethod
+    def _parse_sentiment(res: str):
+        # Clean up potential markdown code blocks
+        res = res.replace("```json", "").replace("```", "").strip()
+        return json.loads(res)
+
+    # use_cache=False ("regenerate") skips the cache lookup (services/ai_cache.py);
+    # the fresh result still replaces the cached one.
+
+    def generate_post_content(self, keywords: str, length_option: str, tone: str = "friendly", custom_prompt: str = None, keywords_region: str = None, char_count: int = None, past_posts: list = None, store_name: str = None, store_description: str = None, store_category: str = None, store_address: str = None, use_cache: bool = True):
+        prompts = self._post_content_prompts(keywords, length_option, tone, custom_prompt, keywords_region, char_count, past_posts, store_name, store_description, store_category, store_address)
+        return self._complete(*prompts, use_cache=use_cache)
+
+    def _post_content_prompts(self, keywords: str, length_option: str, tone: str = "friendly", custom_prompt: str = None, keywords_region: str = None, char_count: int = None, past_posts: list = None, store_name: str = None, store_description: str = None, store_category: str = None, store_address: str = None):
         # length_option: "SHORT", "MEDIUM", "LONG" or specific char_count
         
         length_guide = ""
@@ -102,9 +179,9 @@ class AIClient:
 
 投稿文を作成してください。ハッシュタグも含めてください。 
 """
-        return self.generate_text(system_prompt, user_prompt)
+        return system_prompt, user_prompt
 
-    def generate_hashtags(self, keywords: str, content: str = None, count: int = 10):
+    def generate_hashtags(self, keywords: str, content: str = None, count: int = 10, use_cache: bool = True):
         system_prompt = f"""
 あなたはSNSマーケティングのエキスパートです。
 提供された投稿内容やキーワードに基づいて、集客効果が高く、関連性の強いハッシュタグを**{count}個**提案してください。
@@ -117,9 +194,13 @@ class AIClient:
 
 ハッシュタグを生成してください。
 """
-        return self.generate_text(system_prompt, user_prompt)
+        return self._complete(system_prompt, user_prompt, use_cache=use_cache)
+
+    def generate_review_reply(self, review_text: str, reviewer_name: str, star_rating: str, tone: str = "polite", custom_instruction: str = None, store_name: str = None, store_description: str = None, store_category: str = None, use_cache: bool = True):
+        prompts = self._review_reply_prompts(review_text, reviewer_name, star_rating, tone, custom_instruction, store_name, store_description, store_category)
+        return self._complete(*prompts, use_cache=use_cache)
 
-    def generate_review_reply(self, review_text: str, reviewer_name: str, star_rating: str, tone: str = "polite", custom_instruction: str = None, store_name: str = None, store_description: str = None, store_category: str = None):
+    def _review_reply_prompts(self, review_text: str, reviewer_name: str, star_rating: str, tone: str = "polite", custom_instruction: str = None, store_name: str = None, store_description: str = None, store_category: str = None):
         
         store_info_prompt = ""
         if store_name:
@@ -150,12 +231,12 @@ class AIClient:
 
 これに対する返信文を作成してください。
 """
-        return self.generate_text(system_prompt, user_prompt)
+        return system_prompt, user_prompt
 
     def analyze_sentiment(self, reviews: list):
         # reviews is a list of dicts: {"text": "...", "rating": "..."}
         if not reviews:
-            return {"summary": "データがありません", "score": 0, "positive_points": [], "negative_points": []}
+            return self._value({"summary": "データがありません", "score": 0, "positive_points": [], "negative_points": []})
             
         reviews_text = "\n".join([f"- {r['text']} (評価: {r['rating']})" for r in reviews[:30]]) # Limit to 30 for token limits
         
@@ -180,15 +261,78 @@ JSON以外の余計なテキストは含めないでください。
 以下のクチコミを分析してください:
 {reviews_text}
 """
-        try:
-            res = self.generate_text(system_prompt, user_prompt)
-            # Clean up potential markdown code blocks
-            res = res.replace("```json", "").replace("```", "").strip()
-            return json.loads(res)
-        except Exception as e:
-            print(f"Analysis error: {e}")
+        return self._complete(system_prompt, user_prompt, parse=self._parse_sentiment)
+
+    def score_reviews(self, reviews: list):
+        """
+        Per-review sentiment for a batch of reviews ({"id", "text", "rating"}).
+        Result: {review id: {"score": 0-100, "label": ..., "topics": [...]}}, None on failure.
+        """
+        if not reviews:
+            return self._value({})
+
+        system_prompt = """
+あなたはクチコミ分析のAIです。
+各クチコミについて、感情スコア・感情ラベル・言及されているトピックを判定してください。
+
+以下のJSON形式で結果を出力してください。
+```json
+{
+    "results": [
+        {"id": "クチコミのid", "score": 0〜100の数値（100が最もポジティブ）, "label": "POSITIVE | NEUTRAL | NEGATIVE", "topics": ["接客", "味", "価格" など1〜5語の短い名詞]}
+    ]
+}
+```
+すべてのクチコミについて結果を出力し、JSON以外の余計なテキストは含めないでください。
+"""
+        reviews_json = json.dumps(
+            [{"id": r["id"], "rating": r["rating"], "text": (r["text"] or "")[:500]} for r in reviews],
+            ensure_ascii=False,
+        )
+        user_prompt = f"""
+以下のクチコミを判定してください:
+{reviews_json}
+"""
+        # Not cached: results are kept on the Review rows, and a cached malformed reply
+        # would fail the same batch again until it expired
+        return self._complete(system_prompt, user_prompt, parse=self._parse_review_scores, use_cache=False)
+
+    @classmethod
+    def _parse_review_scores(cls, res: str):
+        results = cls._parse_sentiment(res).get("results", [])
+        return {str(r["id"]): r for r in results if isinstance(r, dict) and r.get("id") is not None}
+
+    def narrate_sentiment(self, stats: dict):
+        """
+        Store-level report (same JSON as analyze_sentiment) written from aggregated
+        per-review scores plus a few sample comments, instead of the raw reviews.
+        """
+        system_prompt = """
+あなたは高度なMEOコンサルタントAIです。
+店舗のクチコミを1件ずつ分析した集計結果（件数、平均スコア、ポジティブ/ネガティブなトピックの出現数）と代表的なクチコミを基に、
+**プロフェッショナルかつ詳細なレポート**を作成してください。
+件数やトピックの出現数など、集計の数字に具体的に言及してください。
+
+以下のJSON形式で結果を出力してください。
+```json
+{
+    "summary": "全体の総評。400文字以上で、顧客の感情、店舗の強み、弱み、具体的なエピソードを織り交ぜて詳細に記述してください。",
+    "positive_points": ["良い点1（具体的に）", "良い点2（具体的に）", "良い点3（具体的に）", "良い点4", "良い点5"],
+    "negative_points": ["改善点1（具体的に）", "改善点2（具体的に）", "改善点3（具体的に）"],
+    "action_plan": "具体的なアクションプラン（箇条書きではなく、実行可能な具体的な施策を1〜2文で提案）"
+}
+```
+JSON以外の余計なテキストは含めないでください。
+"""
+        user_prompt = f"""
+以下の集計結果を分析してください:
+{json.dumps(stats, ensure_ascii=False, default=str)}
+"""
+        # Not cached: StoreSentimentSummary keeps the parsed narrative
+        return self._complete(system_prompt, user_prompt, parse=self._parse_sentiment, use_cache=False)
+
     def summarize_text(self, text: str, max_chars: int = 140):
-        if not text: return ""
+        if not text: return self._value("")
         
         system_prompt = f"""
 あなたはテキスト要約のプロフェッショナルです。
@@ -199,4 +343,132 @@ JSON以外の余計なテキストは含めないでください。
 以下のテキストを要約してください:
 {text}
 """
-        return self.generate_text(system_prompt, user_prompt)
+        return self._complete(system_prompt, user_prompt)
+
+
+class AIClient(_AIClientBase):
+    """Blocking client (scripts, sync endpoints, worker threads)."""
+    def __init__(self, api_key: str = None):
+        super().__init__(api_key)
+        self.client = get_openai_client(self.api_key) if self.api_key else None
+
+    def generate_text(self, system_prompt: str, user_prompt: str, use_cache: bool = True):
+        if not self.client:
+            print("Error: OpenAI client not initialized (API key missing)")
+            raise ValueError(API_KEY_MISSING_MESSAGE)
+
+        cache = ai_cache.cache
+        key = self._cache_key(system_prompt, user_prompt) if cache else None
+        if cache and use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            print(f"DEBUG: Calling OpenAI API ({self.model})...")
+            response = self.client.chat.completions.create(**self._request(system_prompt, user_prompt))
+            text = response.choices[0].message.content
+        except Exception as e:
+            print(f"Error calling OpenAI API: {e}")
+            return f"生成エラー: {str(e)}"
+        if cache and text:
+            cache.put(key, text, model=self.model)
+        return text
+
+    def _complete(self, system_prompt: str, user_prompt: str, parse=None, use_cache: bool = True):
+        if parse is None:
+            return self.generate_text(system_prompt, user_prompt, use_cache=use_cache)
+        try:
+            return parse(self.generate_text(system_prompt, user_prompt, use_cache=use_cache))
+        except Exception as e:
+            print(f"Analysis error: {e}")
+
+    def _value(self, value):
+        return value
+
+
+class AsyncAIClient(_AIClientBase):
+    """
+    Non-blocking counterpart of AIClient: same methods, awaitable.
+    Use from async endpoints and the scheduler so a multi-second generation does not
+    hold a threadpool worker.
+    """
+    def __init__(self, api_key: str = None):
+        super().__init__(api_key)
+        self.client = get_async_openai_client(self.api_key) if self.api_key else None
+
+    @staticmethod
+    async def _cache_call(method, *args, **kwargs):
+        # The DB backend runs queries: keep them off the event loop
+        if ai_cache.cache.blocking:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def generate_text(self, system_prompt: str, user_prompt: str, use_cache: bool = True):
+        if not self.client:
+            print("Error: OpenAI client not initialized (API key missing)")
+            raise ValueError(API_KEY_MISSING_MESSAGE)
+
+        cache = ai_cache.cache
+        key = self._cache_key(system_prompt, user_prompt) if cache else None
+        if cache and use_cache:
+            cached = await self._cache_call(cache.get, key)
+            if cached is not None:
+                return cached
+
+        try:
+            print(f"DEBUG: Calling OpenAI API ({self.model})...")
+            response = await self.client.chat.completions.create(**self._request(system_prompt, user_prompt))
+            text = response.choices[0].message.content
+        except Exception as e:
+            print(f"Error calling OpenAI API: {e}")
+            return f"生成エラー: {str(e)}"
+        if cache and text:
+            await self._cache_call(cache.put, key, text, model=self.model)
+        return text
+
+    async def _complete(self, system_prompt: str, user_prompt: str, parse=None, use_cache: bool = True):
+        if parse is None:
+            return await self.generate_text(system_prompt, user_prompt, use_cache=use_cache)
+        try:
+            return parse(await self.generate_text(system_prompt, user_prompt, use_cache=use_cache))
+        except Exception as e:
+            print(f"Analysis error: {e}")
+
+    async def _value(self, value):
+        return value
+
+    async def stream_text(self, system_prompt: str, user_prompt: str, use_cache: bool = True):
+        """
+        Yield the completion piece by piece as OpenAI produces it
+        (a cached completion comes as a single piece).
+        Unlike generate_text, API errors are raised (the caller reports them to its client).
+        """
+        if not self.client:
+            raise ValueError(API_KEY_MISSING_MESSAGE)
+
+        cache = ai_cache.cache
+        key = self._cache_key(system_prompt, user_prompt) if cache else None
+        if cache and use_cache:
+            cached = await self._cache_call(cache.get, key)
+            if cached is not None:
+                yield cached
+                return
+
+        print(f"DEBUG: Streaming from OpenAI API ({self.model})...")
+        stream = await self.client.chat.completions.create(**self._request(system_prompt, user_prompt), stream=True)
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+        if cache and parts:
+            await self._cache_call(cache.put, key, "".join(parts), model=self.model)
+
+    def stream_post_content(self, keywords: str, length_option: str, tone: str = "friendly", custom_prompt: str = None, keywords_region: str = None, char_count: int = None, past_posts: list = None, store_name: str = None, store_description: str = None, store_category: str = None, store_address: str = None, use_cache: bool = True):
+        prompts = self._post_content_prompts(keywords, length_option, tone, custom_prompt, keywords_region, char_count, past_posts, store_name, store_description, store_category, store_address)
+        return self.stream_text(*prompts, use_cache=use_cache)
+
+    def stream_review_reply(self, review_text: str, reviewer_name: str, star_rating: str, tone: str = "polite", custom_instruction: str = None, store_name: str = None, store_description: str = None, store_category: str = None, use_cache: bool = True):
+        prompts = self._review_reply_prompts(review_text, reviewer_name, star_rating, tone, custom_instruction, store_name, store_description, store_category)
+        return self.stream_text(*prompts, use_cache=use_cache)
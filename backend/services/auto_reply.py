@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+import models
+from services import google_api
+from services.concurrency import KeyedSemaphore
+from services.credentials import credentials, build_store_credential_index
+
+# Auto-reply pipeline (scheduler.auto_reply_to_reviews).
+# Every unreplied review goes through two stages, each with its own concurrency limit:
+# AI generation (per OpenAI API key) and posting the reply to Google (per Google account).
+# Reviews from all stores flow through the pipeline together. The per-cycle cap is a
+# throughput budget (replies and seconds) rather than a fixed count per store, so a
+# store that gets a burst of reviews clears it in a few cycles.
+
+logger = logging.getLogger(__name__)
+
+# Concurrent AI generations per OpenAI API key, and concurrent reply posts per Google account
+AUTO_REPLY_AI_CONCURRENCY = int(os.getenv("AUTO_REPLY_AI_CONCURRENCY", "4"))
+AUTO_REPLY_GOOGLE_CONCURRENCY = int(os.getenv("AUTO_REPLY_GOOGLE_CONCURRENCY", "4"))
+# Per cycle: replies started in total, and seconds before no new reply is started
+# (keep it under the 5 minute job interval).
+AUTO_REPLY_CYCLE_BUDGET = int(os.getenv("AUTO_REPLY_CYCLE_BUDGET", "200"))
+AUTO_REPLY_CYCLE_SECONDS = float(os.getenv("AUTO_REPLY_CYCLE_SECONDS", "240"))
+
+# generate_text returns its errors as text instead of raising; never post those
+AI_ERROR_PREFIX = "生成エラー"
+
+
+@dataclass
+class ReplyJob:
+    review: models.Review
+    store: models.Store
+    api_key: str
+    connection_id: str
+    access_token: str
+
+
+def _interleave(per_store: List[List[ReplyJob]]) -> List[ReplyJob]:
+    """Round-robin over stores, so one store's backlog cannot use up the whole budget."""
+    jobs = []
+    for i in range(max((len(store_jobs) for store_jobs in per_store), default=0)):
+        jobs.extend(store_jobs[i] for store_jobs in per_store if i < len(store_jobs))
+    return jobs
+
+
+async def _collect_jobs(db: Session, budget: int) -> List[ReplyJob]:
+    auto_reply_stores = db.query(models.Store).filter(
+        models.Store.auto_reply_enabled == True
+    ).all()
+    logger.info(f"Found {len(auto_reply_stores)} stores with auto-reply enabled.")
+
+    cred_index = build_store_credential_index(db, [s.id for s in auto_reply_stores])
+
+    per_store = []
+    for store in auto_reply_stores:
+        # Find a user with Google connection (and an OpenAI key saved in settings) for this store
+        store_creds = cred_index.get(store.id)
+        if not store_creds or not store_creds.ai_user:
+            logger.warning(f"No user with both a Google connection and an OpenAI API key for store {store.name}")
+            continue
+
+        query = db.query(models.Review).filter(
+            models.Review.store_id == store.id,
+            models.Review.reply_comment == None
+        )
+        # Filter by start date if set
+        if store.auto_reply_start_date:
+            query = query.filter(models.Review.create_time >= store.auto_reply_start_date)
+        unreplied_reviews = query.order_by(models.Review.create_time.asc()).limit(budget).all()
+        if not unreplied_reviews:
+            continue
+        logger.info(f"Store {store.name}: Found {len(unreplied_reviews)} unreplied reviews.")
+
+        connection = store_creds.ai_user.google_connection
+        try:
+            # Refresh token if needed
+            access_token = await credentials.aget_access_token(db, connection)
+        except Exception as e:
+            logger.warning(f"Token refresh failed for store {store.name}: {e}")
+            continue
+
+        per_store.append([
+            ReplyJob(review, store, store_creds.openai_api_key, connection.id, access_token)
+            for review in unreplied_reviews
+        ])
+
+    return _interleave(per_store)[:budget]
+
+
+async def run_cycle(db: Session, budget: int = None, deadline_seconds: float = None) -> Dict[str, int]:
+    """
+    Reply to unreplied reviews of auto-reply stores, within the cycle budget.
+    Each reply is committed as soon as it is posted. Returns counts of replied/failed/deferred.
+    """
+    from services import ai_generator
+
+    budget = AUTO_REPLY_CYCLE_BUDGET if budget is None else budget
+    deadline = time.monotonic() + (AUTO_REPLY_CYCLE_SECONDS if deadline_seconds is None else deadline_seconds)
+    ai_slots = KeyedSemaphore(AUTO_REPLY_AI_CONCURRENCY)
+    google_slots = KeyedSemaphore(AUTO_REPLY_GOOGLE_CONCURRENCY)
+    counts = {"replied": 0, "failed": 0, "deferred": 0}
+
+    jobs = await _collect_jobs(db, budget)
+
+    async def process(job: ReplyJob):
+        review, store = job.review, job.store
+        try:
+            async with ai_slots(job.api_key):
+                if time.monotonic() > deadline:
+                    counts["deferred"] += 1 # picked up again next cycle
+                    return
+                # Generate AI reply (clients are shared per API key)
+                reply_text = await ai_generator.AsyncAIClient(api_key=job.api_key).generate_review_reply(
+                    review_text=review.comment or "",
+                    reviewer_name=review.reviewer_name,
+                    star_rating=review.star_rating,
+                    tone="friendly",
+                    custom_instruction=store.auto_reply_prompt,
+                )
+            if not reply_text or reply_text.startswith(AI_ERROR_PREFIX):
+                raise RuntimeError(reply_text or "empty reply")
+
+            # Post reply to Google
+            async with google_slots(job.connection_id):
+                review_name = f"{store.google_location_id}/reviews/{review.google_review_id}"
+                await google_api.AsyncGBPClient(job.access_token).reply_to_review(review_name, reply_text)
+
+            # Update local record right away, so a later failure cannot lead to a second reply
+            review.reply_comment = reply_text
+            review.reply_time = datetime.utcnow()
+            db.commit()
+            counts["replied"] += 1
+            logger.info(f"Auto-replied to review {review.id} for store {store.name}")
+        except Exception as e:
+            db.rollback()
+            counts["failed"] += 1
+            logger.error(f"Failed to auto-reply to review {review.id}: {e}")
+
+    await asyncio.gather(*(process(job) for job in jobs))
+    return counts
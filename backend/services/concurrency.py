@@ -0,0 +1,68 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+# Small asyncio primitives for fan-out jobs (scheduler, bulk syncs).
+# Both are keyed so one noisy key (e.g. a Google account with many stores)
+# cannot starve or get throttled on behalf of the others.
+
+# How often KeyedRateLimiter drops idle keys
+_PRUNE_INTERVAL_SECONDS = 60
+
+
+class KeyedSemaphore:
+    """
+    At most `limit` concurrent holders per key. Use as `async with slots(key):`.
+    A key's semaphore is dropped once nobody holds or waits for it, so long-running
+    processes do not keep one per account/API key ever seen.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._semaphores: Dict[Hashable, list] = {} # key -> [semaphore, holders + waiters]
+
+    @asynccontextmanager
+    async def __call__(self, key: Hashable):
+        entry = self._semaphores.get(key)
+        if entry is None:
+            entry = self._semaphores[key] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._semaphores[key]
+
+
+class KeyedRateLimiter:
+    """
+    Spaces out acquisitions per key so each key gets at most `rate_per_minute`.
+    rate_per_minute <= 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next_slot: Dict[Hashable, float] = {}
+        self._pruned_at = time.monotonic()
+
+    async def wait(self, key: Hashable):
+        if not self.interval:
+            return
+        # Reserve the next slot before sleeping so concurrent waiters queue up in order
+        now = time.monotonic()
+        self._prune(now)
+        slot = max(now, self._next_slot.get(key, now))
+        self._next_slot[key] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _prune(self, now: float):
+        # A key whose next slot has passed behaves exactly like an unseen key: drop it
+        if now - self._pruned_at < _PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        for key in [k for k, slot in self._next_slot.items() if slot <= now]:
+            del self._next_slot[key]
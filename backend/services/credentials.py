@@ -0,0 +1,184 @@
+import os
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from . import google_api
+
+# Central access-token handling for GoogleConnection rows.
+# - Valid tokens are cached in memory by connection id, so hot request paths
+#   skip the expiry bookkeeping and never block on OAuth while a token is fresh.
+# - Tokens are refreshed proactively, REFRESH_MARGIN before they expire.
+# - Concurrent refreshes of the same connection are coalesced into one call
+#   (single-flight), both for sync callers (threads) and async callers (tasks).
+
+REFRESH_MARGIN = timedelta(seconds=int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", "600")))
+
+
+class CredentialManager:
+    def __init__(self, margin: timedelta = REFRESH_MARGIN):
+        self.margin = margin
+        self._tokens: Dict[str, Tuple[str, datetime]] = {} # connection_id -> (access_token, expiry)
+        self._lock = threading.Lock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._inflight: Dict[tuple, asyncio.Task] = {} # (loop, connection_id) -> refresh task
+
+    # --- cache helpers ---
+
+    def _is_fresh(self, expiry: Optional[datetime]) -> bool:
+        # No expiry recorded: nothing to go by, use the token as is (legacy behaviour)
+        return expiry is None or expiry - self.margin > datetime.utcnow()
+
+    def _current(self, connection) -> Tuple[Optional[str], Optional[datetime]]:
+        """Newest known token for the connection (memory cache vs. DB row)."""
+        cached = self._tokens.get(connection.id)
+        if cached and (connection.expiry is None or cached[1] > connection.expiry):
+            return cached
+        return connection.access_token, connection.expiry
+
+    def _store(self, db: Session, connection, access_token: str, expiry: datetime):
+        with self._lock:
+            self._tokens[connection.id] = (access_token, expiry)
+        if connection.access_token != access_token or connection.expiry != expiry:
+            connection.access_token = access_token
+            connection.expiry = expiry
+            db.commit()
+
+    def _refresh_lock(self, connection_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._refresh_locks.get(connection_id)
+            if lock is None:
+                lock = self._refresh_locks[connection_id] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def _parse(new_tokens: dict) -> Tuple[str, datetime]:
+        expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
+        return new_tokens.get("access_token"), expiry
+
+    def invalidate(self, connection_id: str):
+        """Forget the cached token (e.g. user disconnected or re-authorized)."""
+        with self._lock:
+            self._tokens.pop(connection_id, None)
+
+    # --- public API ---
+
+    def get_access_token(self, db: Session, connection) -> str:
+        """
+        Valid access token for a GoogleConnection, refreshing it if it is about to expire.
+        Raises if the refresh call fails.
+        """
+        access_token, expiry = self._current(connection)
+        if self._is_fresh(expiry) or not connection.refresh_token:
+            if access_token != connection.access_token:
+                self._store(db, connection, access_token, expiry)
+            return access_token
+
+        with self._refresh_lock(connection.id):
+            # Another thread may have refreshed while we waited
+            access_token, expiry = self._current(connection)
+            if not self._is_fresh(expiry):
+                access_token, expiry = self._parse(google_api.refresh_access_token(connection.refresh_token))
+                print(f"DEBUG: Refreshed Google token for connection {connection.id}")
+            self._store(db, connection, access_token, expiry)
+            return access_token
+
+    async def aget_access_token(self, db: Session, connection) -> str:
+        """Async variant of get_access_token (refresh does not block the event loop)."""
+        access_token, expiry = self._current(connection)
+        if self._is_fresh(expiry) or not connection.refresh_token:
+            if access_token != connection.access_token:
+                self._store(db, connection, access_token, expiry)
+            return access_token
+
+        key = (asyncio.get_running_loop(), connection.id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(google_api.arefresh_access_token(connection.refresh_token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            print(f"DEBUG: Refreshing Google token for connection {connection.id}")
+
+        access_token, expiry = self._parse(await asyncio.shield(task))
+        self._store(db, connection, access_token, expiry)
+        return access_token
+
+
+# Process-wide instance
+credentials = CredentialManager()
+
+
+# --- Store -> credential index (scheduler jobs) ---
+
+@dataclass
+class StoreCredentials:
+    # Users with a Google connection who can act for the store:
+    # the store's own users first, then the rest of the company.
+    users: List["models.User"] = field(default_factory=list)
+    # First user with a usable access token
+    user: Optional["models.User"] = None
+    connection: Optional["models.GoogleConnection"] = None
+    # First user holding both a Google connection and an OpenAI key (auto-reply)
+    ai_user: Optional["models.User"] = None
+    openai_api_key: Optional[str] = None
+
+
+def build_store_credential_index(db: Session, store_ids: Iterable[str]) -> Dict[str, StoreCredentials]:
+    """
+    Map store_id -> StoreCredentials with two queries in total (stores, then users with
+    their connection and settings eager-loaded), instead of walking store.users /
+    store.company.users lazily and querying UserSettings per user.
+    Build once per job cycle; the returned ORM objects belong to `db`.
+    """
+    store_ids = list(set(store_ids))
+    if not store_ids:
+        return {}
+
+    store_companies = dict(
+        db.query(models.Store.id, models.Store.company_id).filter(models.Store.id.in_(store_ids))
+    )
+    company_ids = {cid for cid in store_companies.values() if cid}
+
+    user_filter = models.User.store_id.in_(store_ids)
+    if company_ids:
+        user_filter = or_(user_filter, models.User.company_id.in_(company_ids))
+    users = (
+        db.query(models.User)
+        .options(joinedload(models.User.google_connection), joinedload(models.User.settings))
+        .filter(user_filter, models.User.google_connection.has())
+        .all()
+    )
+
+    by_store: Dict[str, list] = {}
+    by_company: Dict[str, list] = {}
+    for user in users:
+        if user.store_id:
+            by_store.setdefault(user.store_id, []).append(user)
+        if user.company_id:
+            by_company.setdefault(user.company_id, []).append(user)
+
+    index = {}
+    for store_id, company_id in store_companies.items():
+        entry = StoreCredentials()
+        seen = set()
+        for user in by_store.get(store_id, []) + by_company.get(company_id, []):
+            if user.id in seen:
+                continue
+            seen.add(user.id)
+            entry.users.append(user)
+
+            conn = user.google_connection
+            if not conn or not conn.access_token:
+                continue
+            if entry.connection is None:
+                entry.user, entry.connection = user, conn
+            if entry.ai_user is None and user.settings and user.settings.openai_api_key:
+                entry.ai_user, entry.openai_api_key = user, user.settings.openai_api_key
+        index[store_id] = entry
+    return index
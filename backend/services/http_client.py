@@ -0,0 +1,119 @@
+import os
+import asyncio
+import threading
+import weakref
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP transport for Google APIs.
+# One keep-alive session per process so repeated calls reuse TCP/TLS connections
+# instead of paying a fresh handshake on every request.
+
+CONNECT_TIMEOUT = float(os.getenv("GOOGLE_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GOOGLE_HTTP_READ_TIMEOUT", "30"))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+DEFAULT_POOL_MAXSIZE = int(os.getenv("GOOGLE_HTTP_POOL_MAXSIZE", "10"))
+
+# Async transport (httpx): total connection cap across all Google hosts
+ASYNC_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_ASYNC_MAX_CONNECTIONS", "100"))
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("GOOGLE_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Connection pool size per Google host (hosts hit during sync get larger pools)
+GOOGLE_HOST_POOLS = {
+    "https://mybusiness.googleapis.com": int(os.getenv("GOOGLE_HTTP_POOL_V4", "20")),
+    "https://mybusinessbusinessinformation.googleapis.com": int(os.getenv("GOOGLE_HTTP_POOL_INFO", "20")),
+    "https://mybusinessaccountmanagement.googleapis.com": DEFAULT_POOL_MAXSIZE,
+    "https://mybusinessqanda.googleapis.com": DEFAULT_POOL_MAXSIZE,
+    "https://businessprofileperformance.googleapis.com": int(os.getenv("GOOGLE_HTTP_POOL_PERFORMANCE", "20")),
+    "https://oauth2.googleapis.com": DEFAULT_POOL_MAXSIZE,
+    "https://www.googleapis.com": DEFAULT_POOL_MAXSIZE,
+}
+
+
+class _TimeoutSession(requests.Session):
+    """requests.Session that applies DEFAULT_TIMEOUT when the caller gives none."""
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = DEFAULT_TIMEOUT
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = _TimeoutSession()
+    for prefix, pool_size in GOOGLE_HOST_POOLS.items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    # Anything else (non-Google hosts) still gets pooling with the default size
+    session.mount("https://", HTTPAdapter(pool_maxsize=DEFAULT_POOL_MAXSIZE))
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide pooled session (created on first use).
+    Safe to call from multiple threads.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_session():
+    """Close pooled connections (called on application shutdown)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# --- Async transport ---
+# httpx.AsyncClient connections are bound to the event loop that opened them,
+# so we keep one client per running loop (normally just the FastAPI loop).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("WARNING: GOOGLE_HTTP2 is set but 'h2' is not installed. Falling back to HTTP/1.1.")
+        return False
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled httpx.AsyncClient for the current event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+            ),
+            http2=_http2_available(),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client():
+    """Close the async client bound to the current event loop (application shutdown)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
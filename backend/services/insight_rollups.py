@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+
+import models
+
+# Weekly / monthly insight totals (models.InsightRollup).
+# - refresh_rollups() recomputes the buckets touched by a sync from the daily rows.
+# - summarize_periods() / summarize_insights() answer "totals for [start, end]" from whole
+#   months and weeks, summing daily rows in SQL only for the partial days at the edges.
+# Buckets without a rollup row (data synced before rollups existed) are read from the
+# daily rows as well, so results never depend on every bucket having been built.
+
+WEEK = "WEEK"
+MONTH = "MONTH"
+
+ROLLUP_METRICS = (
+    "views_maps",
+    "views_search",
+    "actions_website",
+    "actions_phone",
+    "actions_driving_directions",
+)
+
+
+def _day(value) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def period_start(day: datetime, period: str) -> datetime:
+    day = _day(day)
+    if period == WEEK:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period_start(start: datetime, period: str) -> datetime:
+    if period == WEEK:
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return datetime(start.year + 1, 1, 1)
+    return datetime(start.year, start.month + 1, 1)
+
+
+def empty_totals() -> dict:
+    totals = {metric: 0 for metric in ROLLUP_METRICS}
+    totals["days_count"] = 0
+    return totals
+
+
+def refresh_rollups(db: Session, store_id: str, first_day: datetime, last_day: datetime) -> int:
+    """
+    Recompute every WEEK and MONTH bucket overlapping [first_day, last_day] from the
+    stored daily rows. Call after upserting those days. Returns the number of buckets
+    written. Does not commit.
+    """
+    buckets: Dict[Tuple[str, datetime], dict] = {}
+    for period in (WEEK, MONTH):
+        start = period_start(first_day, period)
+        while start <= _day(last_day):
+            buckets[(period, start)] = empty_totals()
+            start = next_period_start(start, period)
+
+    lo = min(start for _, start in buckets)
+    hi = max(next_period_start(start, period) for period, start in buckets)
+
+    columns = [getattr(models.Insight, metric) for metric in ROLLUP_METRICS]
+    rows = db.query(models.Insight.date, *columns).filter(
+        models.Insight.store_id == store_id,
+        models.Insight.date >= lo,
+        models.Insight.date < hi,
+    )
+    for row in rows:
+        day = _day(row[0])
+        for period in (WEEK, MONTH):
+            totals = buckets.get((period, period_start(day, period)))
+            if totals is None:
+                continue
+            totals["days_count"] += 1
+            for metric, value in zip(ROLLUP_METRICS, row[1:]):
+                totals[metric] += value or 0
+
+    existing = {
+        (rollup.period, rollup.period_start): rollup
+        for rollup in db.query(models.InsightRollup).filter(
+            models.InsightRollup.store_id == store_id,
+            models.InsightRollup.period_start >= lo,
+            models.InsightRollup.period_start < hi,
+        )
+    }
+    for (period, start), totals in buckets.items():
+        rollup = existing.get((period, start))
+        if rollup is None:
+            rollup = models.InsightRollup(store_id=store_id, period=period, period_start=start)
+            db.add(rollup)
+        for key, value in totals.items():
+            setattr(rollup, key, value)
+    return len(buckets)
+
+
+def plan_range(start: datetime, end: datetime):
+    """
+    Split the inclusive day range [start, end] into whole months, whole weeks
+    (Monday-Sunday) and the leftover days.
+    Returns (months, weeks, day_ranges) with day_ranges as [(first, end_exclusive)].
+    """
+    months: List[datetime] = []
+    weeks: List[datetime] = []
+    day_ranges: List[List[datetime]] = []
+
+    cursor, end = _day(start), _day(end)
+    while cursor <= end:
+        month_end = next_period_start(cursor, MONTH)
+        if cursor.day == 1 and month_end - timedelta(days=1) <= end:
+            months.append(cursor)
+            cursor = month_end
+        elif cursor.weekday() == 0 and cursor + timedelta(days=6) <= end:
+            weeks.append(cursor)
+            cursor += timedelta(days=7)
+        else:
+            next_day = cursor + timedelta(days=1)
+            if day_ranges and day_ranges[-1][1] == cursor:
+                day_ranges[-1][1] = next_day
+            else:
+                day_ranges.append([cursor, next_day])
+            cursor = next_day
+    return months, weeks, [tuple(r) for r in day_ranges]
+
+
+def summarize_store_periods(
+    db: Session, store_ids: List[str], ranges: List[Tuple[datetime, datetime]]
+) -> Dict[str, List[dict]]:
+    """
+    Totals of the rollup metrics per store for each inclusive day range [start, end],
+    plus "days_count" (days with data): {store_id: [totals per range, in order]}.
+    Two round trips whatever the number of stores and ranges: one for the rollup rows,
+    one SUM ... GROUP BY store over the daily rows, bucketed per range with CASE.
+    """
+    store_ids = list(dict.fromkeys(store_ids))
+    results = {store_id: [empty_totals() for _ in ranges] for store_id in store_ids}
+    if not store_ids or not ranges:
+        return results
+
+    # (period, period_start) -> indexes of the ranges that use the bucket
+    wanted: Dict[Tuple[str, datetime], List[int]] = {}
+    # Per range: conditions selecting the daily rows to sum in SQL
+    day_conditions: List[list] = []
+    for i, (start, end) in enumerate(ranges):
+        months, weeks, edges = plan_range(start, end)
+        for bucket_start in months:
+            wanted.setdefault((MONTH, bucket_start), []).append(i)
+        for bucket_start in weeks:
+            wanted.setdefault((WEEK, bucket_start), []).append(i)
+        day_conditions.append([and_(models.Insight.date >= lo, models.Insight.date < hi) for lo, hi in edges])
+
+    if wanted:
+        conditions = []
+        for period in (MONTH, WEEK):
+            starts = [start for p, start in wanted if p == period]
+            if starts:
+                conditions.append(and_(models.InsightRollup.period == period, models.InsightRollup.period_start.in_(starts)))
+        columns = [getattr(models.InsightRollup, metric) for metric in ROLLUP_METRICS]
+        found = {key: set() for key in wanted}
+        rows = db.query(
+            models.InsightRollup.store_id, models.InsightRollup.period,
+            models.InsightRollup.period_start, models.InsightRollup.days_count, *columns
+        ).filter(models.InsightRollup.store_id.in_(store_ids), or_(*conditions))
+        for row in rows:
+            key = (row[1], _day(row[2]))
+            if key not in wanted or row[0] not in results:
+                continue
+            found[key].add(row[0])
+            for i in wanted[key]:
+                totals = results[row[0]][i]
+                totals["days_count"] += row[3] or 0
+                for metric, value in zip(ROLLUP_METRICS, row[4:]):
+                    totals[metric] += value or 0
+
+        # Buckets that were never rolled up for some stores: read them from the daily rows
+        for (period, bucket_start), indexes in wanted.items():
+            missing = [store_id for store_id in store_ids if store_id not in found[(period, bucket_start)]]
+            if not missing:
+                continue
+            condition = and_(
+                models.Insight.date >= bucket_start,
+                models.Insight.date < next_period_start(bucket_start, period),
+            )
+            if len(missing) < len(store_ids):
+                condition = and_(models.Insight.store_id.in_(missing), condition)
+            for i in indexes:
+                day_conditions[i].append(condition)
+
+    whens = [(or_(*conds), i) for i, conds in enumerate(day_conditions) if conds]
+    if whens:
+        bucket = case(*whens, else_=-1).label("bucket")
+        sums = [func.coalesce(func.sum(getattr(models.Insight, metric)), 0) for metric in ROLLUP_METRICS]
+        rows = db.query(models.Insight.store_id, bucket, func.count(models.Insight.id), *sums).filter(
+            models.Insight.store_id.in_(store_ids),
+            or_(*[when for when, _ in whens]),
+        ).group_by(models.Insight.store_id, bucket)
+        for row in rows:
+            if row[1] is None or row[1] < 0:
+                continue
+            totals = results[row[0]][row[1]]
+            totals["days_count"] += row[2] or 0
+            for metric, value in zip(ROLLUP_METRICS, row[3:]):
+                totals[metric] += int(value or 0)
+
+    return results
+
+
+def summarize_periods(db: Session, store_id: str, ranges: List[Tuple[datetime, datetime]]) -> List[dict]:
+    """Totals for one store over several inclusive day ranges (see summarize_store_periods)."""
+    return summarize_store_periods(db, [store_id], ranges)[store_id]
+
+
+def summarize_insights(db: Session, store_id: str, start: datetime, end: datetime) -> dict:
+    """Totals for a single inclusive day range (see summarize_store_periods)."""
+    return summarize_periods(db, store_id, [(start, end)])[0]
@@ -0,0 +1,171 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+import models
+
+# Bulk writer for daily Insight rows.
+# sync_insights receives up to ~730 days per store; writing them one SELECT + INSERT/UPDATE
+# at a time costs ~730 round trips per store. Here we read the existing rows for the range
+# once and write in chunks, using INSERT ... ON CONFLICT where the dialect supports it.
+
+INSIGHT_UPSERT_CHUNK_SIZE = int(os.getenv("INSIGHT_UPSERT_CHUNK_SIZE", "500"))
+
+INSIGHT_UNIQUE_INDEX = "uq_insights_store_date"
+
+# Full history requested for new stores / explicit backfills (API keeps ~18 months)
+INSIGHTS_BACKFILL_DAYS = int(os.getenv("INSIGHTS_BACKFILL_DAYS", "730"))
+# Google keeps revising the most recent days, so incremental syncs re-read this many days
+# before the stored watermark.
+INSIGHTS_REVISION_DAYS = int(os.getenv("INSIGHTS_REVISION_DAYS", "5"))
+
+# Cached per engine URL: does the insights table carry the (store_id, date) unique index?
+_native_upsert_support = {}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _supports_native_upsert(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _native_upsert_support:
+        supported = False
+        if bind.dialect.name in ("postgresql", "sqlite"):
+            try:
+                indexes = inspect(bind).get_indexes("insights")
+                supported = any(
+                    ix.get("unique") and ix.get("name") == INSIGHT_UNIQUE_INDEX
+                    for ix in indexes
+                )
+            except Exception as e:
+                print(f"WARNING: Could not inspect insights indexes: {e}")
+        _native_upsert_support[key] = supported
+    return _native_upsert_support[key]
+
+
+def _insert_for(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def upsert_daily_insights(db: Session, store_id: str, daily_data: Dict[datetime, dict]) -> int:
+    """
+    Insert or update one Insight row per day for a store.
+    daily_data: {datetime(day): {"views_maps": 10, ...}} - only the given columns are written,
+    missing metrics keep their stored value.
+    Returns the number of newly created days. Does not commit.
+    """
+    if not daily_data:
+        return 0
+
+    # One query for every stored day in the range (replaces the per-day SELECT)
+    existing_ids = {
+        row_date: row_id
+        for row_id, row_date in db.query(models.Insight.id, models.Insight.date).filter(
+            models.Insight.store_id == store_id,
+            models.Insight.date >= min(daily_data),
+            models.Insight.date <= max(daily_data),
+        )
+    }
+    new_days = [d for d in daily_data if d not in existing_ids]
+
+    if _supports_native_upsert(db):
+        insert = _insert_for(db.get_bind().dialect.name)
+        table = models.Insight.__table__
+
+        # ON CONFLICT needs the same SET list for every row in a statement,
+        # so group days by which metrics they carry (normally all days match).
+        groups = {}
+        for day, values in daily_data.items():
+            groups.setdefault(tuple(sorted(values)), []).append((day, values))
+
+        for columns, rows in groups.items():
+            stmt = insert(table)
+            if columns:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["store_id", "date"],
+                    set_={c: stmt.excluded[c] for c in columns},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["store_id", "date"])
+
+            params = [
+                {"id": models.generate_uuid(), "store_id": store_id, "date": day,
+                 "created_at": datetime.utcnow(), **values}
+                for day, values in rows
+            ]
+            for chunk in _chunks(params, INSIGHT_UPSERT_CHUNK_SIZE):
+                db.execute(stmt, chunk)
+    else:
+        # Portable path: bulk insert the new days, bulk update the rest by primary key
+        inserts = [
+            {"id": models.generate_uuid(), "store_id": store_id, "date": day,
+             "created_at": datetime.utcnow(), **daily_data[day]}
+            for day in new_days
+        ]
+        updates = [
+            {"id": existing_ids[day], **values}
+            for day, values in daily_data.items()
+            if day in existing_ids and values
+        ]
+        for chunk in _chunks(inserts, INSIGHT_UPSERT_CHUNK_SIZE):
+            db.bulk_insert_mappings(models.Insight, chunk)
+        for chunk in _chunks(updates, INSIGHT_UPSERT_CHUNK_SIZE):
+            db.bulk_update_mappings(models.Insight, chunk)
+
+    return len(new_days)
+
+
+# --- Incremental sync watermarks ---
+
+def insights_fetch_start(db: Session, store_id: str, metrics: Iterable[str], end_date: datetime, backfill: bool = False):
+    """
+    First day to request from the Performance API.
+    Returns (start_date, is_backfill). Falls back to the full window when backfill
+    is requested or any metric has no watermark yet (new store / new metric).
+    """
+    full_start = end_date - timedelta(days=INSIGHTS_BACKFILL_DAYS)
+    if backfill:
+        return full_start, True
+
+    metrics = list(metrics)
+    watermarks = {
+        state.metric: state.last_complete_date
+        for state in db.query(models.InsightSyncState).filter(
+            models.InsightSyncState.store_id == store_id,
+            models.InsightSyncState.metric.in_(metrics),
+        )
+    }
+    if len(watermarks) < len(metrics):
+        return full_start, True
+
+    start = min(watermarks.values()) - timedelta(days=INSIGHTS_REVISION_DAYS)
+    return max(start, full_start), False
+
+
+def advance_insight_watermarks(db: Session, store_id: str, last_dates: Dict[str, datetime]):
+    """Store the latest day returned per metric ({metric: datetime}). Does not commit."""
+    if not last_dates:
+        return
+    existing = {
+        state.metric: state
+        for state in db.query(models.InsightSyncState).filter(
+            models.InsightSyncState.store_id == store_id,
+            models.InsightSyncState.metric.in_(list(last_dates.keys())),
+        )
+    }
+    for metric, last_date in last_dates.items():
+        state = existing.get(metric)
+        if state:
+            state.last_complete_date = last_date
+        else:
+            db.add(models.InsightSyncState(store_id=store_id, metric=metric, last_complete_date=last_date))
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+# Cache of v4 location paths: "locations/X" -> "accounts/Y/locations/X".
+# Resolving a path means listing every account and every location under it,
+# so we keep results in an in-process LRU backed by the google_location_paths table.
+
+LOCATION_PATH_TTL = timedelta(hours=int(os.getenv("LOCATION_PATH_TTL_HOURS", "24")))
+LOCATION_PATH_CACHE_SIZE = int(os.getenv("LOCATION_PATH_CACHE_SIZE", "4096"))
+
+
+def location_id_of(location_name: str) -> str:
+    """Bare location ID from any format ("locations/X", "accounts/Y/locations/X" or "X")."""
+    return location_name.split("/")[-1] if "/" in location_name else location_name
+
+
+class LocationPathCache:
+    def __init__(self, ttl: timedelta = LOCATION_PATH_TTL, maxsize: int = LOCATION_PATH_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # location_id -> (v4_path, resolved_at)
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, resolved_at: Optional[datetime]) -> bool:
+        return resolved_at is not None and datetime.utcnow() - resolved_at < self.ttl
+
+    def _remember(self, location_id: str, v4_path: str, resolved_at: datetime):
+        with self._lock:
+            self._entries[location_id] = (v4_path, resolved_at)
+            self._entries.move_to_end(location_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, location_name: str) -> Optional[str]:
+        location_id = location_id_of(location_name)
+
+        with self._lock:
+            entry = self._entries.get(location_id)
+            if entry:
+                if self._is_fresh(entry[1]):
+                    self._entries.move_to_end(location_id)
+                    return entry[0]
+                del self._entries[location_id]
+
+        # Memory miss -> persistent table
+        from database import SessionLocal
+        import models
+        db = SessionLocal()
+        try:
+            row = db.get(models.GoogleLocationPath, location_id)
+            if row and self._is_fresh(row.resolved_at):
+                self._remember(location_id, row.v4_path, row.resolved_at)
+                return row.v4_path
+        except Exception as e:
+            print(f"WARNING: Location path lookup failed (memory cache only): {e}")
+        finally:
+            db.close()
+        return None
+
+    def put_many(self, paths: Dict[str, str]):
+        """Store several resolved paths at once ({location_id: v4_path})."""
+        if not paths:
+            return
+        now = datetime.utcnow()
+        for location_id, v4_path in paths.items():
+            self._remember(location_id, v4_path, now)
+
+        from database import SessionLocal
+        import models
+        db = SessionLocal()
+        try:
+            existing = {
+                row.location_id: row
+                for row in db.query(models.GoogleLocationPath).filter(
+                    models.GoogleLocationPath.location_id.in_(list(paths.keys()))
+                )
+            }
+            for location_id, v4_path in paths.items():
+                row = existing.get(location_id)
+                if row:
+                    row.v4_path = v4_path
+                    row.resolved_at = now
+                else:
+                    db.add(models.GoogleLocationPath(location_id=location_id, v4_path=v4_path, resolved_at=now))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Failed to persist location paths: {e}")
+        finally:
+            db.close()
+
+    def put(self, location_name: str, v4_path: str):
+        self.put_many({location_id_of(location_name): v4_path})
+
+    def invalidate(self, location_name: str):
+        """Drop a cached path (e.g. Google answered 404 for it: location moved accounts)."""
+        location_id = location_id_of(location_name)
+        with self._lock:
+            self._entries.pop(location_id, None)
+
+        from database import SessionLocal
+        import models
+        db = SessionLocal()
+        try:
+            db.query(models.GoogleLocationPath).filter(
+                models.GoogleLocationPath.location_id == location_id
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Failed to invalidate location path {location_id}: {e}")
+        finally:
+            db.close()
+
+
+# Process-wide instance shared by GBPClient and AsyncGBPClient
+location_paths = LocationPathCache()
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from database import SessionLocal
+from services.credentials import credentials, build_store_credential_index
+
+# Durable queue for scheduled posts (models.PublishJob).
+# enqueue_due_posts() turns due SCHEDULED posts into jobs; drain() runs a pool of workers
+# that claim jobs one at a time under a lease and publish them. Any number of instances
+# can drain the same table: on PostgreSQL claims use SELECT ... FOR UPDATE SKIP LOCKED,
+# elsewhere (SQLite) a guarded UPDATE decides which worker wins a job.
+
+logger = logging.getLogger(__name__)
+
+# Concurrent publishing workers per instance
+PUBLISH_WORKER_CONCURRENCY = int(os.getenv("PUBLISH_WORKER_CONCURRENCY", "5"))
+# Lease per claimed job. Must exceed the slowest publish (all platforms, incl. video upload),
+# otherwise another worker may pick the job up again while it is still running.
+PUBLISH_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("PUBLISH_VISIBILITY_TIMEOUT_SECONDS", "300"))
+# Retries: attempts per job, and the backoff base (doubles per attempt, capped at 1 hour)
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+PUBLISH_RETRY_BASE_SECONDS = int(os.getenv("PUBLISH_RETRY_BASE_SECONDS", "60"))
+PUBLISH_RETRY_MAX_SECONDS = 3600
+
+PENDING, RUNNING, DONE, DEAD = "PENDING", "RUNNING", "DONE", "DEAD"
+
+# Candidate rows read per claim where rows cannot be locked (a lost race moves on to the next)
+_CLAIM_CANDIDATES = 10
+# Jobs per INSERT: keeps a 9:00 burst under the bind parameter limit
+# (PostgreSQL 65535, SQLite 32766 by default; 9 per row), like services/reconcile.py
+_ENQUEUE_CHUNK_SIZE = 500
+
+WORKER_PREFIX = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class PermanentPublishError(Exception):
+    """Retrying cannot help (store gone, no usable Google account): dead-letter right away."""
+
+
+def enqueue_due_posts(db: Session, now: datetime = None) -> int:
+    """
+    Create a job for every due SCHEDULED post that has none for its scheduled time, and
+    requeue finished jobs of posts that were set back to SCHEDULED. Commits.
+    Returns the number of jobs actually created or requeued.
+    """
+    now = now or datetime.utcnow()
+    requeued = _requeue_rescheduled(db, now)
+    has_job = db.query(models.PublishJob.id).filter(
+        models.PublishJob.post_id == models.Post.id,
+        models.PublishJob.scheduled_at == models.Post.scheduled_at,
+    ).exists()
+    due = db.query(models.Post.id, models.Post.scheduled_at).filter(
+        models.Post.status == "SCHEDULED",
+        models.Post.scheduled_at <= now,
+        ~has_job,
+    ).all()
+    if not due:
+        return requeued
+
+    rows = [
+        {
+            "id": models.generate_uuid(), "post_id": post_id, "scheduled_at": scheduled_at,
+            "status": PENDING, "run_at": scheduled_at, "attempts": 0,
+            "max_attempts": PUBLISH_MAX_ATTEMPTS, "created_at": now, "updated_at": now,
+        }
+        for post_id, scheduled_at in due
+    ]
+    # Another instance may enqueue the same posts concurrently: the unique
+    # (post_id, scheduled_at) index keeps one job each.
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        inserted = 0
+        for i in range(0, len(rows), _ENQUEUE_CHUNK_SIZE):
+            stmt = insert(models.PublishJob.__table__).values(rows[i:i + _ENQUEUE_CHUNK_SIZE]).on_conflict_do_nothing(
+                index_elements=["post_id", "scheduled_at"]
+            )
+            # rowcount: rows inserted, without the conflicts another instance won
+            inserted += db.execute(stmt).rowcount
+        db.commit()
+        return requeued + inserted
+
+    inserted = 0
+    for row in rows:
+        try:
+            db.add(models.PublishJob(**row))
+            db.commit()
+            inserted += 1
+        except Exception:
+            db.rollback()
+    return requeued + inserted
+
+
+def _requeue_rescheduled(db: Session, now: datetime) -> int:
+    """
+    A post set back to SCHEDULED for the same time (e.g. after a FAILED publish) still has
+    its DONE/DEAD job, which blocks a new one on (post_id, scheduled_at): reset that job
+    to a fresh PENDING run. Commits.
+    """
+    Job = models.PublishJob
+    rescheduled = db.query(models.Post.id).filter(
+        models.Post.id == Job.post_id,
+        models.Post.scheduled_at == Job.scheduled_at,
+        models.Post.status == "SCHEDULED",
+        models.Post.scheduled_at <= now,
+    ).exists()
+    requeued = db.query(Job).filter(Job.status.in_([DONE, DEAD]), rescheduled).update({
+        Job.status: PENDING,
+        Job.attempts: 0,
+        Job.run_at: now,
+        Job.locked_by: None,
+        Job.locked_until: None,
+        Job.updated_at: now,
+    }, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def _claimable(now: datetime):
+    Job = models.PublishJob
+    return or_(
+        and_(Job.status == PENDING, Job.run_at <= now),
+        and_(Job.status == RUNNING, Job.locked_until < now),
+    )
+
+
+def publishing_candidates(db: Session, now: datetime = None) -> Dict[str, List[str]]:
+    """
+    store_id -> ids of the users with a Google connection who can publish for it (in
+    preference order), for the stores of all claimable jobs. Built once per drain, so
+    jobs do not each rebuild the credential index.
+    """
+    now = now or datetime.utcnow()
+    store_ids = db.query(models.Post.store_id).join(
+        models.PublishJob, models.PublishJob.post_id == models.Post.id
+    ).filter(_claimable(now)).distinct()
+    index = build_store_credential_index(db, [store_id for (store_id,) in store_ids])
+    return {store_id: [user.id for user in creds.users] for store_id, creds in index.items()}
+
+
+def claim_job(db: Session, worker_id: str, now: datetime = None) -> Optional[models.PublishJob]:
+    """
+    Lease the oldest due job to worker_id (status RUNNING, attempts + 1). Commits.
+    Due: PENDING with run_at <= now, or RUNNING whose lease has expired.
+    Returns None when nothing is claimable.
+    """
+    now = now or datetime.utcnow()
+    Job = models.PublishJob
+    query = db.query(Job.id, Job.status, Job.attempts).filter(_claimable(now)).order_by(Job.run_at.asc())
+    if db.get_bind().dialect.name == "postgresql":
+        candidates = query.limit(1).with_for_update(skip_locked=True).all()
+    else:
+        candidates = query.limit(_CLAIM_CANDIDATES).all()
+
+    for job_id, status, attempts in candidates:
+        # Only matches if nobody claimed the row since we read it
+        claimed = db.query(Job).filter(
+            Job.id == job_id, Job.status == status, Job.attempts == attempts,
+        ).update({
+            Job.status: RUNNING,
+            Job.attempts: attempts + 1,
+            Job.locked_by: worker_id,
+            Job.locked_until: now + timedelta(seconds=PUBLISH_VISIBILITY_TIMEOUT_SECONDS),
+            Job.updated_at: now,
+        }, synchronize_session=False)
+        if claimed:
+            db.commit()
+            return db.query(Job).filter(Job.id == job_id).first()
+    db.rollback()
+    return None
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(PUBLISH_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), PUBLISH_RETRY_MAX_SECONDS))
+
+
+def _finish(job: models.PublishJob, status: str, error: str = None):
+    job.status = status
+    job.locked_by = None
+    job.locked_until = None
+    if error is not None:
+        job.last_error = error[:2000]
+
+
+def _fail(db: Session, job: models.PublishJob, post: models.Post, error: str, permanent: bool = False):
+    """Retry later with backoff, or dead-letter the job (and mark the post FAILED)."""
+    if permanent or job.attempts >= job.max_attempts:
+        _finish(job, DEAD, error)
+        post.status = "FAILED"
+        if not post.social_post_ids:
+            post.social_post_ids = {"error": error}
+        logger.error(f"Publish job {job.id} for post {post.id} dead after {job.attempts} attempt(s): {error}")
+    else:
+        _finish(job, PENDING, error)
+        job.run_at = datetime.utcnow() + _retry_delay(job.attempts)
+        post.status = "SCHEDULED" # still queued
+        logger.warning(f"Publish job {job.id} for post {post.id} failed (attempt {job.attempts}), retry at {job.run_at}: {error}")
+    db.commit()
+
+
+def _store_users(db: Session, store_id: str, candidates: Dict[str, List[str]] = None) -> List[models.User]:
+    """Users who can publish for the store, from the drain's candidates when it has the store."""
+    user_ids = (candidates or {}).get(store_id)
+    if user_ids is None:
+        # Job became claimable after the drain started (or run outside drain())
+        store_creds = build_store_credential_index(db, [store_id]).get(store_id)
+        return store_creds.users if store_creds else []
+    if not user_ids:
+        return []
+    users = {
+        user.id: user for user in db.query(models.User)
+        .options(joinedload(models.User.google_connection))
+        .filter(models.User.id.in_(user_ids))
+    }
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+
+async def _publish(db: Session, post: models.Post, candidates: Dict[str, List[str]] = None) -> str:
+    """Publish with the first store user whose Google token is usable. Returns the post status."""
+    store = db.query(models.Store).filter(models.Store.id == post.store_id).first()
+    if not store:
+        raise PermanentPublishError("Store not found")
+
+    # We iterate through ALL users associated with the store (direct or via company)
+    # to find ONE that has a valid (or refreshable) Google connection.
+    target_user = None
+    for user in _store_users(db, store.id, candidates):
+        conn = user.google_connection
+        if not conn:
+            continue
+        if conn.expiry and conn.expiry < datetime.utcnow() and not conn.refresh_token:
+            # Expired and no refresh token
+            continue
+        try:
+            # Refreshes (and commits) only if the token is about to expire
+            await credentials.aget_access_token(db, conn)
+            target_user = user
+            break
+        except Exception as e:
+            logger.warning(f"Failed to refresh token for user {user.email}: {e}")
+
+    if not target_user:
+        raise PermanentPublishError("No valid Google account linked. Please re-connect in Settings.")
+
+    from services.sns_service import SNSService
+    logger.info(f"Publishing post {post.id} via SNSService (User: {target_user.email})...")
+    return await SNSService(db, target_user).publish_post(post.id)
+
+
+async def run_job(db: Session, job: models.PublishJob, candidates: Dict[str, List[str]] = None):
+    """Publish a claimed job's post and record the outcome on the job."""
+    post = db.query(models.Post).filter(models.Post.id == job.post_id).first()
+    if not post or post.status != "SCHEDULED" or post.scheduled_at != job.scheduled_at:
+        # Deleted, published by hand, or rescheduled (the new time gets its own job)
+        _finish(job, DONE)
+        db.commit()
+        return
+
+    try:
+        final_status = await _publish(db, post, candidates)
+    except PermanentPublishError as e:
+        db.rollback()
+        _fail(db, job, post, str(e), permanent=True)
+        return
+    except Exception as e:
+        db.rollback()
+        _fail(db, job, post, str(e))
+        return
+
+    if final_status == "FAILED":
+        # Nothing went out on any platform, so another attempt cannot double-post
+        _fail(db, job, post, str(post.social_post_ids))
+    else:
+        _finish(job, DONE)
+        db.commit()
+        logger.info(f"Post {post.id} processed ({final_status}).")
+
+
+async def _worker(worker_id: str, candidates: Dict[str, List[str]]) -> int:
+    processed = 0
+    while True:
+        db = SessionLocal()
+        try:
+            job = claim_job(db, worker_id)
+            if job is None:
+                return processed
+            await run_job(db, job, candidates)
+            processed += 1
+        except Exception as e:
+            logger.error(f"Publish worker {worker_id} error: {e}")
+            return processed
+        finally:
+            db.close()
+
+
+async def drain(concurrency: int = None) -> int:
+    """Run `concurrency` workers until no job is claimable. Returns the number of jobs run."""
+    concurrency = max(1, concurrency or PUBLISH_WORKER_CONCURRENCY)
+    db = SessionLocal()
+    try:
+        candidates = publishing_candidates(db)
+    finally:
+        db.close()
+    counts = await asyncio.gather(*(_worker(f"{WORKER_PREFIX}:{n}", candidates) for n in range(concurrency)))
+    return sum(counts)
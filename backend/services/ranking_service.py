@@ -1,5 +1,4 @@
 import requests
-from bs4 import BeautifulSoup
 import urllib.parse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
@@ -57,6 +56,7 @@ class RankingService:
             response = requests.get(url, headers=self.headers, timeout=5)
             
             if response.status_code == 200:
+                from bs4 import BeautifulSoup # deferred: only the scraper needs it
                 soup = BeautifulSoup(response.text, 'html.parser')
                 
                 # Method 1: Check "Local Pack" (Map results)
@@ -0,0 +1,68 @@
+from typing import Callable, Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Set-based reconciliation of Google resources (reviews, media, Q&A) against local rows.
+# Instead of one SELECT per remote item, load every known row in scope once, diff the API
+# page against that dict in memory, then bulk insert the new rows. Updates go through the
+# loaded objects, so only rows whose values actually changed are written on flush.
+
+RECONCILE_INSERT_CHUNK_SIZE = 500
+
+
+class ReconcileResult(NamedTuple):
+    created: int
+    updated: int
+    ids: Dict[str, str] # Google key -> local primary key (existing and newly created rows)
+
+
+def reconcile(
+    db: Session,
+    model,
+    key_column,
+    items: Iterable[dict],
+    key_of: Callable[[dict], Optional[str]],
+    new_values: Callable[[dict], dict],
+    update_values: Optional[Callable[[dict], dict]] = None,
+    scope=(),
+) -> ReconcileResult:
+    """
+    key_column: column holding the Google ID (e.g. models.Review.google_review_id)
+    key_of(item): Google ID of an API item (falsy -> item skipped)
+    new_values(item): column values for a new row (id and key are filled in here)
+    update_values(item): columns to refresh on an existing row ({} -> leave as is)
+    scope: filters selecting the rows to compare against (e.g. the store's rows)
+    Does not commit.
+    """
+    key_name = key_column.key
+    existing = {getattr(row, key_name): row for row in db.query(model).filter(*scope)}
+    ids = {key: row.id for key, row in existing.items()}
+
+    inserts = []
+    updated = 0
+    seen = set()
+    for item in items:
+        key = key_of(item)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+
+        row = existing.get(key)
+        if row is None:
+            values = {**new_values(item), "id": models.generate_uuid(), key_name: key}
+            inserts.append(values)
+            ids[key] = values["id"]
+        elif update_values:
+            changed = False
+            for column, value in update_values(item).items():
+                if getattr(row, column) != value:
+                    setattr(row, column, value)
+                    changed = True
+            updated += changed
+
+    for i in range(0, len(inserts), RECONCILE_INSERT_CHUNK_SIZE):
+        db.bulk_insert_mappings(model, inserts[i:i + RECONCILE_INSERT_CHUNK_SIZE])
+
+    return ReconcileResult(len(inserts), updated, ids)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+# Incremental review sentiment.
+# Every review is scored once (score 0-100, label, topics) and the result is kept on the
+# Review row; editing the text clears sentiment_analyzed_at so it is scored again.
+# Store-level reports aggregate those scores over ALL reviews of the period in SQL, and the
+# AI is only asked for the narrative when the aggregate changed (StoreSentimentSummary
+# keeps the last narrative with a fingerprint of the numbers it was written from).
+
+logger = logging.getLogger(__name__)
+
+# Reviews per scoring request, and reviews scored per run of the scheduler job
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "20"))
+SENTIMENT_SCORE_LIMIT = int(os.getenv("SENTIMENT_SCORE_LIMIT", "200"))
+# Reviews scored inline by a report request (the scheduler job works through the backlog)
+SENTIMENT_REQUEST_SCORE_LIMIT = int(os.getenv("SENTIMENT_REQUEST_SCORE_LIMIT", "20"))
+
+LABELS = ("POSITIVE", "NEUTRAL", "NEGATIVE")
+# Topics and sample comments passed to the narrative prompt
+_TOP_TOPICS = 10
+_SAMPLES = 5
+_SAMPLE_CHARS = 200
+
+FALLBACK = {
+    "summary": "データなし",
+    "sentiment_score": 50,
+    "positive_points": [],
+    "negative_points": [],
+}
+
+
+def _label(score: int) -> str:
+    if score >= 60:
+        return "POSITIVE"
+    if score <= 40:
+        return "NEGATIVE"
+    return "NEUTRAL"
+
+
+def _period_filter(query, start: datetime = None, end: datetime = None):
+    if start:
+        query = query.filter(models.Review.create_time >= start)
+    if end:
+        query = query.filter(models.Review.create_time <= end)
+    return query
+
+
+def score_pending_reviews(db: Session, store_id: str, client, start: datetime = None, end: datetime = None,
+                          limit: int = None) -> int:
+    """
+    Score reviews with a comment that have not been scored yet (newest first), in batches.
+    Each batch is committed. Stops at the first failed batch. Returns the number scored.
+    client: ai_generator.AIClient (sync).
+    """
+    limit = SENTIMENT_SCORE_LIMIT if limit is None else limit
+    pending = _period_filter(db.query(models.Review).filter(
+        models.Review.store_id == store_id,
+        models.Review.sentiment_analyzed_at == None,
+        models.Review.comment != None,
+        models.Review.comment != "",
+    ), start, end).order_by(models.Review.create_time.desc()).limit(limit).all()
+
+    scored = 0
+    for i in range(0, len(pending), SENTIMENT_BATCH_SIZE):
+        batch = pending[i:i + SENTIMENT_BATCH_SIZE]
+        results = client.score_reviews([
+            {"id": r.id, "text": r.comment, "rating": r.star_rating} for r in batch
+        ])
+        if results is None:
+            logger.warning(f"Sentiment scoring failed for store {store_id}; {len(pending) - scored} review(s) left pending")
+            break
+
+        now = datetime.utcnow()
+        for review in batch:
+            entry = results.get(review.id)
+            if not entry:
+                continue # left out by the model: retried next time
+            try:
+                score = max(0, min(100, int(entry.get("score"))))
+            except (TypeError, ValueError):
+                continue
+            label = str(entry.get("label") or "").upper()
+            review.sentiment_score = score
+            review.sentiment_label = label if label in LABELS else _label(score)
+            review.sentiment_topics = [str(t) for t in (entry.get("topics") or [])][:5]
+            review.sentiment_analyzed_at = now
+            scored += 1
+        db.commit()
+    return scored
+
+
+def aggregate(db: Session, store_id: str, start: datetime = None, end: datetime = None) -> dict:
+    """Numbers for the store/period from the per-review scores (all reviews, no sampling)."""
+    Review = models.Review
+    base = _period_filter(db.query(Review).filter(Review.store_id == store_id), start, end)
+
+    review_count = base.with_entities(func.count(Review.id)).scalar() or 0
+    scored = base.filter(Review.sentiment_analyzed_at != None)
+    scored_count, average, last_analyzed_at = scored.with_entities(
+        func.count(Review.id), func.avg(Review.sentiment_score), func.max(Review.sentiment_analyzed_at)
+    ).one()
+    label_counts = {label: 0 for label in LABELS}
+    for label, count in scored.with_entities(Review.sentiment_label, func.count(Review.id)).group_by(Review.sentiment_label):
+        if label in label_counts:
+            label_counts[label] = count
+
+    positive_topics, negative_topics = Counter(), Counter()
+    for label, topics in scored.with_entities(Review.sentiment_label, Review.sentiment_topics):
+        if label == "POSITIVE":
+            positive_topics.update(topics or [])
+        elif label == "NEGATIVE":
+            negative_topics.update(topics or [])
+
+    return {
+        "review_count": review_count,
+        "scored_count": scored_count or 0,
+        "average_score": round(float(average), 1) if average is not None else None,
+        "label_counts": label_counts,
+        "positive_topics": positive_topics.most_common(_TOP_TOPICS),
+        "negative_topics": negative_topics.most_common(_TOP_TOPICS),
+        "last_analyzed_at": last_analyzed_at,
+    }
+
+
+def _samples(db: Session, store_id: str, start: datetime = None, end: datetime = None) -> dict:
+    """Highest and lowest scored comments, to give the narrative concrete examples."""
+    scored = _period_filter(db.query(models.Review.comment, models.Review.star_rating).filter(
+        models.Review.store_id == store_id,
+        models.Review.sentiment_analyzed_at != None,
+    ), start, end)
+    pick = lambda rows: [{"text": (c or "")[:_SAMPLE_CHARS], "rating": rating} for c, rating in rows]
+    return {
+        "positive_examples": pick(scored.order_by(models.Review.sentiment_score.desc()).limit(_SAMPLES)),
+        "negative_examples": pick(scored.order_by(models.Review.sentiment_score.asc()).limit(_SAMPLES)),
+    }
+
+
+def _period_key(start: datetime = None, end: datetime = None) -> str:
+    if not start and not end:
+        return "all"
+    return f"{start.date() if start else ''}:{end.date() if end else ''}"
+
+
+def fingerprint(stats: dict) -> str:
+    payload = json.dumps(stats, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def store_sentiment(db: Session, store_id: str, client=None, start: datetime = None, end: datetime = None,
+                    score_limit: int = None) -> Optional[dict]:
+    """
+    Store sentiment report for the period (same keys as AIClient.analyze_sentiment, plus
+    the aggregate numbers). Scores up to score_limit pending reviews first, then reuses the
+    stored narrative unless the aggregate changed. Returns None if the narrative could not
+    be generated.
+    client: ai_generator.AIClient (sync), or None to use only what is already stored (no AI
+    calls; the numbers come without a new narrative). db must be a writable session.
+    """
+    if client:
+        score_limit = SENTIMENT_REQUEST_SCORE_LIMIT if score_limit is None else score_limit
+        score_pending_reviews(db, store_id, client, start, end, limit=score_limit)
+
+    stats = aggregate(db, store_id, start, end)
+    if not stats["scored_count"]:
+        return dict(FALLBACK, review_count=stats["review_count"], scored_count=0)
+
+    period_key = _period_key(start, end)
+    digest = fingerprint(stats)
+    summary = db.query(models.StoreSentimentSummary).filter(
+        models.StoreSentimentSummary.store_id == store_id,
+        models.StoreSentimentSummary.period_key == period_key,
+    ).first()
+    if summary and summary.fingerprint == digest:
+        return summary.result
+
+    if not client:
+        # Nothing to write the narrative with: numbers only
+        narrative = dict(FALLBACK)
+    else:
+        narrative = client.narrate_sentiment(dict(stats, **_samples(db, store_id, start, end)))
+        if not narrative:
+            return None
+
+    result = dict(
+        narrative,
+        sentiment_score=round(stats["average_score"]),
+        review_count=stats["review_count"],
+        scored_count=stats["scored_count"],
+        label_counts=stats["label_counts"],
+        positive_topics=stats["positive_topics"],
+        negative_topics=stats["negative_topics"],
+    )
+    if client:
+        if summary is None:
+            summary = models.StoreSentimentSummary(store_id=store_id, period_key=period_key)
+            db.add(summary)
+        summary.fingerprint = digest
+        summary.result = result
+        db.commit()
+    return result
@@ -1,110 +1,68 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
 from datetime import datetime, timedelta
-from services import google_api
+from services import google_api, publish_queue, auto_reply
+from services.concurrency import KeyedSemaphore, KeyedRateLimiter
+from services.credentials import credentials, build_store_credential_index
+import asyncio
 import logging
+import os
+import time
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-scheduler = AsyncIOScheduler()
+# false: this instance serves requests only (apscheduler is then never imported)
+ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "true").lower() == "true"
+
+scheduler = None # AsyncIOScheduler, created by start_scheduler()
+
+# Multi-store sync worker pool (sync_all_locations)
+SYNC_WORKER_CONCURRENCY = int(os.getenv("SYNC_WORKER_CONCURRENCY", "10"))
+# Per Google account: concurrent stores, and store syncs started per minute (0 = unlimited)
+SYNC_ACCOUNT_CONCURRENCY = int(os.getenv("SYNC_ACCOUNT_CONCURRENCY", "2"))
+SYNC_ACCOUNT_RATE_PER_MINUTE = float(os.getenv("SYNC_ACCOUNT_RATE_PER_MINUTE", "30"))
+
+_account_slots = KeyedSemaphore(SYNC_ACCOUNT_CONCURRENCY)
+_account_rate = KeyedRateLimiter(SYNC_ACCOUNT_RATE_PER_MINUTE)
 
 async def check_and_publish_scheduled_posts():
     """
-    Check for posts that are scheduled and due for publishing.
-    Delegates to SNSService for multi-platform support.
+    Queue scheduled posts that are due, then drain the publish queue with a worker pool.
+    Jobs are leased in the database (services/publish_queue.py), so several instances can
+    run this job at once without publishing a post twice.
     """
     logger.info("Scheduler: Checking for scheduled posts...")
     db: Session = SessionLocal()
     try:
-        now = datetime.utcnow()
-        due_posts = db.query(models.Post).filter(
-            models.Post.status == 'SCHEDULED',
-            models.Post.scheduled_at <= now
-        ).all()
-
-        logger.info(f"Scheduler: Found {len(due_posts)} posts to publish.")
-
-        for post in due_posts:
-            try:
-                store = db.query(models.Store).filter(models.Store.id == post.store_id).first()
-                if not store:
-                    logger.warning(f"Store not found for post {post.id}")
-                    post.status = "FAILED"
-                    post.social_post_ids = {"error": "Store not found"}
-                    continue
-
-                # Find valid user connection
-                # We iterate through ALL users associated with the store (direct or via company)
-                # to find ONE that has a valid (or refreshable) Google connection.
-                
-                target_user = None
-                valid_connection = None
-                
-                potential_users = list(store.users)
-                if store.company and store.company.users:
-                     # Add company users, avoiding duplicates
-                     existing_ids = [u.id for u in potential_users]
-                     potential_users.extend([u for u in store.company.users if u.id not in existing_ids])
-
-                for user in potential_users:
-                    if user.google_connection:
-                        conn = user.google_connection
-                        # Check expiry and refresh if needed
-                        if conn.expiry and conn.expiry < datetime.utcnow():
-                            if conn.refresh_token:
-                                try:
-                                    logger.info(f"Refreshing token for user {user.email}...")
-                                    new_tokens = google_api.refresh_access_token(conn.refresh_token)
-                                    conn.access_token = new_tokens.get("access_token")
-                                    expires_in = new_tokens.get("expires_in", 3600)
-                                    conn.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
-                                    db.commit() # Commit the refresh immediately
-                                    logger.info("Token refreshed successfully.")
-                                    target_user = user
-                                    valid_connection = conn
-                                    break # Found a working user!
-                                except Exception as e:
-                                    logger.warning(f"Failed to refresh token for user {user.email}: {e}")
-                                    # Continue to next user
-                            else:
-                                # Expired and no refresh token
-                                continue
-                        else:
-                            # Valid token
-                            target_user = user
-                            valid_connection = conn
-                            break
-                
-                if not target_user:
-                     logger.error(f"No valid user/token found to execute post {post.id} for store {store.name}")
-                     post.status = "FAILED"
-                     post.social_post_ids = {"error": "No valid Google account linked. Please re-connect in Settings."}
-                     continue
-
-                from services.sns_service import SNSService
-                # Re-fetch user to ensure attached to session (though likely still is)
-                service = SNSService(db, target_user)
-                
-                logger.info(f"Publishing post {post.id} via SNSService (User: {target_user.email})...")
-                await service.publish_post(post.id)
-                logger.info(f"Post {post.id} processed.")
-
-            except Exception as e:
-                logger.error(f"Failed to publish post {post.id}: {e}")
-                post.status = "FAILED"
-                post.social_post_ids = {"error": str(e)}
-        
-        db.commit()
+        queued = publish_queue.enqueue_due_posts(db)
+        if queued:
+            logger.info(f"Scheduler: Queued {queued} posts to publish.")
     except Exception as e:
         logger.error(f"Scheduler Error: {e}")
     finally:
         db.close()
 
+    try:
+        processed = await publish_queue.drain()
+        if processed:
+            logger.info(f"Scheduler: Processed {processed} publish jobs.")
+    except Exception as e:
+        logger.error(f"Scheduler Error: {e}")
+
+def is_running() -> bool:
+    return scheduler is not None and scheduler.running
+
 def start_scheduler():
+    global scheduler
+    if not ENABLE_SCHEDULER:
+        logger.info("Scheduler disabled (ENABLE_SCHEDULER=false).")
+        return
+    if scheduler is None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        scheduler = AsyncIOScheduler()
     if not scheduler.running:
         # Delay first run by 30 seconds to allow app startup/health check
         start_delay = datetime.utcnow() + timedelta(seconds=30)
@@ -112,6 +70,7 @@ def start_scheduler():
         scheduler.add_job(check_and_publish_scheduled_posts, 'interval', minutes=1, start_date=start_delay)
         scheduler.add_job(auto_reply_to_reviews, 'interval', minutes=5, start_date=start_delay)  # Check every 5 minutes
         scheduler.add_job(sync_all_locations, 'interval', minutes=60, start_date=start_delay) # Sync every hour
+        scheduler.add_job(score_review_sentiment, 'interval', minutes=15, start_date=start_delay) # Score newly synced reviews
         
         # Enterprise Jobs
         scheduler.add_job(check_daily_rankings, 'interval', hours=24, start_date=start_delay) # Daily Rank Check
@@ -123,7 +82,7 @@ def start_scheduler():
         scheduler.add_job(lambda: logger.info("Scheduler Heartbeat: Tick-tock"), 'interval', minutes=1)
 
 def shutdown_scheduler():
-    if scheduler.running:
+    if is_running():
         scheduler.shutdown()
         logger.info("Scheduler shut down.")
 
@@ -135,109 +94,8 @@ async def auto_reply_to_reviews():
     logger.info("Scheduler: Checking for reviews to auto-reply...")
     db: Session = SessionLocal()
     try:
-        from services import ai_generator
-        
-        # Find stores with auto-reply enabled
-        auto_reply_stores = db.query(models.Store).filter(
-            models.Store.auto_reply_enabled == True
-        ).all()
-        
-        logger.info(f"Found {len(auto_reply_stores)} stores with auto-reply enabled.")
-        
-        for store in auto_reply_stores:
-            # Find unreplied reviews for this store
-            query = db.query(models.Review).filter(
-                models.Review.store_id == store.id,
-                models.Review.reply_comment == None
-            )
-
-            # Filter by start date if set
-            if store.auto_reply_start_date:
-                query = query.filter(models.Review.create_time >= store.auto_reply_start_date)
-            
-            unreplied_reviews = query.limit(5).all()  # Process max 5 per store per cycle
-            
-            if not unreplied_reviews:
-                continue
-                
-            logger.info(f"Store {store.name}: Found {len(unreplied_reviews)} unreplied reviews.")
-            
-            # Find a user with Google connection for this store
-            valid_connection = None
-            api_key = None
-            
-            # Combine store users and company users (if company exists)
-            potential_users = list(store.users)
-            if store.company and store.company.users:
-                # Add company users who might not be currently selecting this store
-                company_users = [u for u in store.company.users if u.id not in [su.id for su in store.users]]
-                potential_users.extend(company_users)
-                
-            for user in potential_users:
-                if user.google_connection and user.google_connection.access_token:
-                    # Check if user has OpenAI key saved (in settings)
-                    user_settings = db.query(models.UserSettings).filter(
-                        models.UserSettings.user_id == user.id
-                    ).first()
-                    
-                    if user_settings and user_settings.openai_api_key:
-                        valid_connection = user.google_connection
-                        api_key = user_settings.openai_api_key
-                        logger.info(f"Found valid connection and API key from user {user.email}")
-                        break
-            
-            # If still no connection, check if any user has connection, and any user has API key? 
-            # (Currently we require same user to have both for simplicity/security, 
-            # but we could mix if they belong to same company)
-            
-            if not valid_connection:
-                logger.warning(f"No valid Google connection for store {store.name}")
-                continue
-                
-            if not api_key:
-                logger.warning(f"No OpenAI API key found for store {store.name}")
-                continue
-            
-            # Refresh token if needed
-            from services import google_api
-            if valid_connection.expiry and valid_connection.expiry < datetime.utcnow():
-                if valid_connection.refresh_token:
-                    new_tokens = google_api.refresh_access_token(valid_connection.refresh_token)
-                    valid_connection.access_token = new_tokens.get("access_token")
-                    valid_connection.expiry = datetime.utcnow() + timedelta(seconds=new_tokens.get("expires_in", 3600))
-                    db.commit()
-            
-            client = google_api.GBPClient(valid_connection.access_token)
-            ai_client = ai_generator.AIClient(api_key=api_key)
-            
-            for review in unreplied_reviews:
-                try:
-                    # Generate AI reply
-                    reply_text = ai_client.generate_review_reply(
-                        review_text=review.comment or "",
-                        reviewer_name=review.reviewer_name,
-                        star_rating=review.star_rating,
-                        tone="friendly",
-                        custom_instruction=store.auto_reply_prompt
-                    )
-                    
-                    # Post reply to Google
-                    review_name = f"{store.google_location_id}/reviews/{review.google_review_id}"
-                    client.reply_to_review(review_name, reply_text)
-                    
-                    # Update local record
-                    review.reply_comment = reply_text
-                    review.reply_time = datetime.utcnow()
-                    
-                    logger.info(f"Auto-replied to review {review.id} for store {store.name}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to auto-reply to review {review.id}: {e}")
-                    continue
-            
-            
-            db.commit()
-            
+        counts = await auto_reply.run_cycle(db)
+        logger.info(f"Auto-reply cycle: {counts}")
     except Exception as e:
         logger.error(f"Auto-reply scheduler error: {e}")
     finally:
@@ -246,50 +104,42 @@ async def auto_reply_to_reviews():
 async def sync_all_locations():
     """
     Periodically sync location details from Google for all connected stores.
+    Stores are processed by a bounded worker pool: each store gets its own DB session,
+    and stores sharing a Google account are throttled together.
     """
     logger.info("Scheduler: Syncing all location details...")
+    started = time.monotonic()
+    jobs = []
     db: Session = SessionLocal()
     try:
-        from services.sync_service import get_sync_service
         from services import google_api
         
         stores = db.query(models.Store).filter(models.Store.google_location_id != None).all()
+        cred_index = build_store_credential_index(db, [s.id for s in stores])
         
         for store in stores:
             try:
                 # Find a valid connection
-                valid_connection = None
-                
-                potential_users = list(store.users)
-                if store.company and store.company.users:
-                     potential_users.extend([u for u in store.company.users if u.id not in [su.id for su in store.users]])
-
-                for user in potential_users:
-                    if user.google_connection and user.google_connection.access_token:
-                        valid_connection = user.google_connection
-                        break
+                store_creds = cred_index.get(store.id)
+                valid_connection = store_creds.connection if store_creds else None
                 
                 if not valid_connection:
                     continue
 
                 # Refresh if needed
-                if valid_connection.expiry and valid_connection.expiry < datetime.utcnow():
-                    if valid_connection.refresh_token:
-                        new_tokens = google_api.refresh_access_token(valid_connection.refresh_token)
-                        valid_connection.access_token = new_tokens.get("access_token")
-                        expires_in = new_tokens.get("expires_in", 3600)
-                        valid_connection.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
-                        db.commit()
-
-                # Sync
-                client = google_api.GBPClient(valid_connection.access_token)
-                from services.sync_service import GoogleSyncService
-                service = GoogleSyncService(client)
-                await service.sync_location_details(db, store.id, store.google_location_id)
-                logger.info(f"Synced location details for {store.name}")
+                await credentials.aget_access_token(db, valid_connection)
+
+                # Plain values only: workers run on their own sessions
+                jobs.append({
+                    "store_id": store.id,
+                    "store_name": store.name,
+                    "location_id": store.google_location_id,
+                    "account_key": valid_connection.id,
+                    "access_token": valid_connection.access_token,
+                })
                 
             except Exception as e:
-                logger.error(f"Error syncing store {store.id}: {e}")
+                logger.error(f"Error preparing sync for store {store.id}: {e}")
                 continue
                 
     except Exception as e:
@@ -297,6 +147,79 @@ async def sync_all_locations():
     finally:
         db.close()
 
+    workers = asyncio.Semaphore(SYNC_WORKER_CONCURRENCY)
+    results = await asyncio.gather(*(_sync_store_location(job, workers) for job in jobs))
+
+    elapsed = time.monotonic() - started
+    succeeded = sum(1 for ok in results if ok)
+    rate = len(jobs) / elapsed * 60 if elapsed > 0 else 0
+    logger.info(
+        f"Scheduler: Location sync cycle done. {succeeded}/{len(jobs)} stores OK, "
+        f"{len(jobs) - succeeded} failed in {elapsed:.1f}s ({rate:.1f} stores/min, "
+        f"concurrency={SYNC_WORKER_CONCURRENCY})"
+    )
+
+async def _sync_store_location(job: dict, workers: asyncio.Semaphore) -> bool:
+    """One worker unit of sync_all_locations. Returns True on success."""
+    from services import google_api
+    from services.sync_service import GoogleSyncService
+
+    # Wait for the account first: a worker slot is only taken once this store can actually
+    # sync, so stores queued behind a busy account do not hold slots other accounts need.
+    async with _account_slots(job["account_key"]):
+        await _account_rate.wait(job["account_key"])
+        async with workers:
+            db: Session = SessionLocal()
+            try:
+                client = google_api.AsyncGBPClient(job["access_token"])
+                service = GoogleSyncService(client)
+                result = await service.sync_location_details(db, job["store_id"], job["location_id"])
+                if result.get("status") == "error":
+                    logger.error(f"Error syncing store {job['store_id']}: {result.get('message')}")
+                    return False
+                logger.info(f"Synced location details for {job['store_name']}")
+                return True
+            except Exception as e:
+                logger.error(f"Error syncing store {job['store_id']}: {e}")
+                return False
+            finally:
+                db.close()
+
+def score_review_sentiment():
+    """
+    Score the sentiment of new (or edited) reviews, so reports only aggregate.
+    Stores without a user that has an OpenAI key are left for the next report request.
+    Plain function: apscheduler runs it in its thread pool, off the event loop.
+    """
+    from services import ai_generator, review_sentiment
+
+    db: Session = SessionLocal()
+    try:
+        store_ids = [store_id for (store_id,) in db.query(models.Review.store_id).filter(
+            models.Review.sentiment_analyzed_at == None,
+            models.Review.comment != None,
+            models.Review.comment != "",
+        ).distinct()]
+        if not store_ids:
+            return
+        cred_index = build_store_credential_index(db, store_ids)
+        scored = 0
+        for store_id in store_ids:
+            store_creds = cred_index.get(store_id)
+            if not store_creds or not store_creds.openai_api_key:
+                continue
+            try:
+                client = ai_generator.AIClient(api_key=store_creds.openai_api_key)
+                scored += review_sentiment.score_pending_reviews(db, store_id, client)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Sentiment scoring failed for store {store_id}: {e}")
+        logger.info(f"Scheduler: Scored sentiment of {scored} review(s) in {len(store_ids)} store(s).")
+    except Exception as e:
+        logger.error(f"Sentiment scheduler error: {e}")
+    finally:
+        db.close()
+
 async def check_daily_rankings():
     """
     Mock function to simulate checking keyword rankings daily.
@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+import asyncio
 import models
 from datetime import datetime
 import json
@@ -15,7 +16,7 @@ except ImportError:
     print("WARNING: requests_oauthlib not found. Twitter v1.1 features will be disabled.")
 
 from services import google_api
-from services.ai_generator import AIClient
+from services.ai_generator import AsyncAIClient
 
 logger = logging.getLogger(__name__)
 
@@ -168,7 +169,8 @@ class SNSService:
                     post_data["media"] = [{"mediaFormat": media_format, "sourceUrl": resolved_url}]
                 
                 # API呼び出し
-                res = client.create_local_post(store.google_location_id, post_data)
+                # Off the event loop, so concurrent publish workers are not serialized on it
+                res = await asyncio.to_thread(client.create_local_post, store.google_location_id, post_data)
                 
                 if res and "name" in res:
                     results["google"] = {
@@ -305,8 +307,8 @@ class SNSService:
                 openai_key = user_settings.openai_api_key if user_settings else None
                 
                 if openai_key:
-                    ai_client = AIClient(api_key=openai_key)
-                    summarized = ai_client.summarize_text(content, max_chars=max_chars)
+                    ai_client = AsyncAIClient(api_key=openai_key)
+                    summarized = await ai_client.summarize_text(content, max_chars=max_chars)
                     if summarized:
                         content = summarized
                         logger.info(f"AI Summarized for X: {content}")
@@ -1,16 +1,54 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
-from .google_api import GBPClient
+from .google_api import GBPClient, AsyncGBPClient
+from .reconcile import reconcile
+from .insight_writer import (
+    upsert_daily_insights, insights_fetch_start, advance_insight_watermarks, INSIGHTS_REVISION_DAYS
+)
+from .insight_rollups import refresh_rollups
+from .google_api import PERFORMANCE_DAILY_METRICS
 from sqlalchemy.orm import Session
 import models
 # import database.crud as crud 
 
+# Max number of sync sections (reviews, posts, insights, ...) in flight at once for one store
+SYNC_SECTION_CONCURRENCY = int(os.getenv("SYNC_SECTION_CONCURRENCY", "3"))
+
 class GoogleSyncService:
-    def __init__(self, gbp_client: GBPClient):
+    def __init__(self, gbp_client: AsyncGBPClient):
+        # Must be the async client: every sync_* awaits Google calls so the
+        # event loop stays free for API traffic while a sync is running.
         self.gbp = gbp_client
+        # All sections share one Session; DB phases are serialized through this lock
+        # while the Google round trips run concurrently. Invariant: a section touches the
+        # Session only inside _db_write()/_rollback(), and leaves no uncommitted writes
+        # behind when it releases the lock (commit, or rollback on error). A rollback
+        # therefore never discards another section's writes, even if a locked block awaits.
+        self._db_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def _db_write(self, db: Session):
+        """Exclusive use of the shared Session; rolls back this block's writes if it fails."""
+        async with self._db_lock:
+            try:
+                yield
+            except Exception:
+                db.rollback()
+                raise
+
+    async def _rollback(self, db: Session):
+        # Under the lock: never in the middle of another section's write phase
+        async with self._db_lock:
+            db.rollback()
         
-    async def sync_all(self, db: Session, store_id: str, location_id: str):
-        """Orchestrate full sync for a store"""
+    async def sync_all(self, db: Session, store_id: str, location_id: str, backfill: bool = False):
+        """
+        Orchestrate full sync for a store.
+        backfill: re-fetch the full insights history instead of the incremental window.
+        """
         
         # Resolve v4 name (accounts/{accountId}/locations/{locationId})
         # location_id from DB is strictly 'locations/XXX' (v1 format)
@@ -19,31 +57,10 @@ class GoogleSyncService:
         resolve_error = None
         
         try:
-            accounts_data = self.gbp.list_accounts()
-            if accounts_data.get("accounts"):
-                location_suffix = location_id.split("/")[-1]
-                
-                # Iterate through accounts to find the correct one
-                for account in accounts_data["accounts"]:
-                    account_name = account["name"]
-                    candidate_name = f"{account_name}/locations/{location_suffix}"
-                    
-                    # Verify if this account has access to the location using a lightweight v4 call
-                    # We use list_reviews as a check, as it requires v4 access
-                    try:
-                        # Just check if we can access the endpoint (even if empty)
-                        self.gbp.list_reviews(candidate_name)
-                        v4_location_name = candidate_name
-                        break
-                    except Exception as e:
-                        # If 404 or 403, this is likely not the right account (or API not enabled)
-                        # We continue to the next account
-                        continue
-                
-                if not v4_location_name:
-                    resolve_error = "Location not found in any of the connected Google Accounts."
-            else:
-                 resolve_error = "No Google Accounts found for this user."
+            # Cached resolver (memory + DB); only scans accounts on a cache miss
+            v4_location_name = await self.gbp._get_v4_location_path(location_id)
+        except ValueError:
+            resolve_error = "Location not found in any of the connected Google Accounts."
         except Exception as e:
             resolve_error = f"Failed to list accounts: {e}"
             
@@ -56,71 +73,108 @@ class GoogleSyncService:
                  return {"status": "error", "message": f"Google Account ID Resolution Failed: {resolve_error}"}
              return {"status": "error", "message": "Google Account ID not found."}
         
-        results = {
-            "reviews": await self.sync_reviews(db, store_id, v4_location_name),
-            "posts": await self.sync_posts(db, store_id, v4_location_name),
-            "insights": await self.sync_insights(db, store_id, location_id), # Insights uses v1 (locations/XXX)
-            "media": await self.sync_media(db, store_id, v4_location_name),
-            "qa": await self.sync_qa(db, store_id, v4_location_name),
-            "location": await self.sync_location_details(db, store_id, location_id), # Business Info uses v1
-            "synced_at": datetime.now().isoformat()
+        # Sections hit independent Google endpoints, so run them concurrently
+        # (bounded per store). Each section reports its own status; one failing
+        # section never hides the others' results.
+        sections = {
+            "reviews": lambda: self.sync_reviews(db, store_id, v4_location_name),
+            "posts": lambda: self.sync_posts(db, store_id, v4_location_name),
+            "insights": lambda: self.sync_insights(db, store_id, location_id, backfill=backfill), # Insights uses v1 (locations/XXX)
+            "media": lambda: self.sync_media(db, store_id, v4_location_name),
+            "qa": lambda: self.sync_qa(db, store_id, v4_location_name),
+            "location": lambda: self.sync_location_details(db, store_id, location_id), # Business Info uses v1
         }
+        semaphore = asyncio.Semaphore(SYNC_SECTION_CONCURRENCY)
+
+        async def run_section(name, section):
+            async with semaphore:
+                try:
+                    return await section()
+                except Exception as e:
+                    print(f"Sync section '{name}' failed: {e}")
+                    return {"status": "error", "message": str(e)}
+
+        outcomes = await asyncio.gather(*(run_section(name, section) for name, section in sections.items()))
+        results = dict(zip(sections.keys(), outcomes))
+        results["synced_at"] = datetime.now().isoformat()
         
         # Update store's last_synced_at in DB
-        store = db.query(models.Store).filter(models.Store.id == store_id).first()
-        if store:
-             store.last_synced_at = datetime.utcnow()
-             db.commit()
+        async with self._db_write(db):
+            store = db.query(models.Store).filter(models.Store.id == store_id).first()
+            if store:
+                 store.last_synced_at = datetime.utcnow()
+                 db.commit()
              
         return results
 
     async def sync_reviews(self, db: Session, store_id: str, location_id: str):
-        """Fetch latest reviews from Google and update local DB"""
+        """
+        Fetch latest reviews from Google and update local DB.
+        Streams page by page: each page is reconciled and committed before the next one
+        is requested, so memory stays bounded and progress survives a later failure.
+        """
+        synced_count = 0
+        seen_count = 0
+        pages = 0
         try:
-            google_reviews = self.gbp.list_reviews(location_id)
-            synced_count = 0
-            
-            # Handle empty response
-            if not google_reviews or not google_reviews.get("reviews"):
-                return {"status": "success", "count": 0, "message": "No reviews found"}
-            
-            for review_data in google_reviews.get("reviews", []):
-                review_id = review_data.get("reviewId") or review_data.get("name", "").split("/")[-1]
-                existing = db.query(models.Review).filter(models.Review.google_review_id == review_id).first()
-                
+            def review_key(review_data):
+                return review_data.get("reviewId") or review_data.get("name", "").split("/")[-1]
+
+            def new_review(review_data):
                 # Parse timestamp safely
                 create_time_str = review_data.get("createTime", datetime.utcnow().isoformat()).replace("Z", "+00:00")
                 try:
                     create_time = datetime.fromisoformat(create_time_str)
                 except:
                     create_time = datetime.utcnow()
+                return {
+                    "store_id": store_id,
+                    "reviewer_name": review_data.get("reviewer", {}).get("displayName", "Anonymous"),
+                    "comment": review_data.get("comment"),
+                    "star_rating": review_data.get("starRating"),
+                    "reply_comment": review_data.get("reviewReply", {}).get("comment"),
+                    "create_time": create_time,
+                }
 
-                if not existing:
-                    new_review = models.Review(
-                        store_id=store_id,
-                        google_review_id=review_id,
-                        reviewer_name=review_data.get("reviewer", {}).get("displayName", "Anonymous"),
-                        comment=review_data.get("comment"),
-                        star_rating=review_data.get("starRating"),
-                        reply_comment=review_data.get("reviewReply", {}).get("comment"),
-                        create_time=create_time,
-                    )
-                    db.add(new_review)
-                    synced_count += 1
-                else:
-                    # Update potentially changed fields (reply etc)
-                    if review_data.get("reviewReply", {}).get("comment"):
-                        existing.reply_comment = review_data.get("reviewReply", {}).get("comment")
+            def review_updates(review_data):
+                # Update potentially changed fields (reply etc)
+                reply = review_data.get("reviewReply", {}).get("comment")
+                return {"reply_comment": reply} if reply else {}
 
-            return {"status": "success", "count": synced_count}
+            async for page in self.gbp.iter_review_pages(location_id):
+                page_reviews = page.get("reviews", [])
+                pages += 1
+                seen_count += len(page_reviews)
+                if not page_reviews:
+                    continue
+                async with self._db_write(db):
+                    result = reconcile(
+                        db, models.Review, models.Review.google_review_id,
+                        page_reviews,
+                        key_of=review_key,
+                        new_values=new_review,
+                        update_values=review_updates,
+                        scope=[
+                            models.Review.store_id == store_id,
+                            models.Review.google_review_id.in_([review_key(r) for r in page_reviews]),
+                        ],
+                    )
+                    synced_count += result.created
+                    db.commit()
+            
+            # Handle empty response
+            if not seen_count:
+                return {"status": "success", "count": 0, "message": "No reviews found"}
+            return {"status": "success", "count": synced_count, "pages": pages}
         except Exception as e:
+            await self._rollback(db) # Failed write blocks already rolled back; this clears a failed read
             error_msg = str(e)
             if hasattr(e, 'response') and e.response is not None:
                 try:
                      error_msg += f" | Details: {e.response.text}"
                 except:
                      pass
-            print(f"Sync Reviews Error: {error_msg}")
+            print(f"Sync Reviews Error (after {pages} pages, {synced_count} new): {error_msg}")
             
             if "403" in error_msg and "Forbidden" in error_msg:
                  return {"status": "error", "message": "Google My Business API (Classic) not enabled. Please enable it in Cloud Console."}
@@ -131,43 +185,45 @@ class GoogleSyncService:
     async def sync_posts(self, db: Session, store_id: str, location_id: str):
         """Fetch latest posts from Google"""
         try:
-            google_posts = self.gbp.list_local_posts(location_id)
+            google_posts = await self.gbp.list_local_posts(location_id)
             synced_count = 0
             
             # Handle empty response
             if not google_posts or not google_posts.get("localPosts"):
                 return {"status": "success", "count": 0, "message": "No posts found"}
             
-            for post_data in google_posts.get("localPosts", []):
-                content = post_data.get("summary", "")
+            async with self._db_write(db):
+                for post_data in google_posts.get("localPosts", []):
+                    content = post_data.get("summary", "")
                 
-                # Check duplication by content match
-                existing = db.query(models.Post).filter(models.Post.store_id == store_id, models.Post.content == content).first()
+                    # Check duplication by content match
+                    existing = db.query(models.Post).filter(models.Post.store_id == store_id, models.Post.content == content).first()
 
-                if not existing and content:
-                    create_time_str = post_data.get("createTime", datetime.utcnow().isoformat()).replace("Z", "+00:00")
-                    try:
-                        create_time = datetime.fromisoformat(create_time_str)
-                    except:
-                        create_time = datetime.utcnow()
+                    if not existing and content:
+                        create_time_str = post_data.get("createTime", datetime.utcnow().isoformat()).replace("Z", "+00:00")
+                        try:
+                            create_time = datetime.fromisoformat(create_time_str)
+                        except:
+                            create_time = datetime.utcnow()
 
-                    new_post = models.Post(
-                        store_id=store_id,
-                        content=content,
-                        status="PUBLISHED",
-                        created_at=create_time,
-                    )
+                        new_post = models.Post(
+                            store_id=store_id,
+                            content=content,
+                            status="PUBLISHED",
+                            created_at=create_time,
+                        )
                     
-                    media_list = post_data.get("media", [])
-                    if media_list:
-                         new_post.media_url = media_list[0].get("sourceUrl")
+                        media_list = post_data.get("media", [])
+                        if media_list:
+                             new_post.media_url = media_list[0].get("sourceUrl")
 
-                    db.add(new_post)
-                    synced_count += 1
+                        db.add(new_post)
+                        synced_count += 1
             
-            db.commit()
+                db.commit()
             return {"status": "success", "count": synced_count}
         except Exception as e:
+            await self._rollback(db) # Failed write blocks already rolled back; this clears a failed read
             error_msg = str(e)
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -181,18 +237,23 @@ class GoogleSyncService:
                 return {"status": "success", "count": 0, "message": "No posts on GBP yet"}
             return {"status": "error", "message": error_msg}
 
-    async def sync_insights(self, db: Session, store_id: str, location_id: str):
-        """Fetch latest insights (metrics)"""
+    async def sync_insights(self, db: Session, store_id: str, location_id: str, backfill: bool = False):
+        """
+        Fetch latest insights (metrics).
+        Incremental by default: only the days after the stored per-metric watermark
+        (minus a revision window). New stores and backfill=True get the full ~2 years.
+        """
         try:
-            # Fetch for last 730 days (approx 2 years) to capture all available history (API limit usually ~18 months)
             end_date = datetime.now()
-            start_date = end_date - timedelta(days=730)
+            async with self._db_write(db):
+                start_date, is_backfill = insights_fetch_start(db, store_id, PERFORMANCE_DAILY_METRICS, end_date, backfill)
+            print(f"DEBUG: Insights fetch {start_date.date()} -> {end_date.date()} (backfill={is_backfill})")
             
             # Format dates for API
             start_date_dict = {"year": start_date.year, "month": start_date.month, "day": start_date.day}
             end_date_dict = {"year": end_date.year, "month": end_date.month, "day": end_date.day}
 
-            metrics_data = self.gbp.fetch_performance_metrics(location_id, start_date_dict, end_date_dict)
+            metrics_data = await self.gbp.fetch_performance_metrics(location_id, start_date_dict, end_date_dict)
             
             synced_count = 0
             
@@ -205,6 +266,7 @@ class GoogleSyncService:
             
             # 1. Organize data by Date
             daily_data = {} # "YYYY-MM-DD": { queries_direct: 0, ... }
+            last_dates = {} # metric -> latest day returned (watermark)
             
             # Actual API structure:
             # multiDailyMetricTimeSeries[0].dailyMetricTimeSeries[].dailyMetric
@@ -224,6 +286,10 @@ class GoogleSyncService:
                         date_str = f"{d['year']}-{d['month']:02d}-{d['day']:02d}"
                         val = int(day_val.get("value", 0))
                         
+                        day = datetime(d["year"], d["month"], d["day"])
+                        if metric_key and (metric_key not in last_dates or day > last_dates[metric_key]):
+                            last_dates[metric_key] = day
+                        
                         if date_str not in daily_data:
                             daily_data[date_str] = {}
                             
@@ -243,30 +309,24 @@ class GoogleSyncService:
                         elif metric_key == "BUSINESS_DIRECTION_REQUESTS":
                              daily_data[date_str]["actions_driving_directions"] = daily_data[date_str].get("actions_driving_directions", 0) + val
             
-            # 2. Upsert to DB
-            from datetime import date as dt_date
+            # 2. Bulk upsert to DB (one read for the whole range, chunked writes)
+            rows_by_day = {}
             for date_str, values in daily_data.items():
                 y, m, d = map(int, date_str.split("-"))
-                target_date = datetime(y, m, d)
-                
-                insight = db.query(models.Insight).filter(
-                    models.Insight.store_id == store_id, 
-                    models.Insight.date == target_date
-                ).first()
-                
-                if not insight:
-                    insight = models.Insight(store_id=store_id, date=target_date)
-                    db.add(insight)
-                    synced_count += 1
-                
-                # Update fields
-                if "views_maps" in values: insight.views_maps = values["views_maps"]
-                if "views_search" in values: insight.views_search = values["views_search"]
-                if "actions_website" in values: insight.actions_website = values["actions_website"]
-                if "actions_phone" in values: insight.actions_phone = values["actions_phone"]
-                if "actions_driving_directions" in values: insight.actions_driving_directions = values["actions_driving_directions"]
-                
-            db.commit()
+                rows_by_day[datetime(y, m, d)] = values
+            
+            async with self._db_write(db):
+                synced_count = upsert_daily_insights(db, store_id, rows_by_day)
+                if rows_by_day:
+                    # Re-total the weeks/months this sync touched
+                    refresh_rollups(db, store_id, min(rows_by_day), max(rows_by_day))
+                # Metrics Google returned nothing for still get a watermark, otherwise
+                # they would force a full backfill on every run.
+                fallback_date = datetime(end_date.year, end_date.month, end_date.day) - timedelta(days=INSIGHTS_REVISION_DAYS)
+                for metric in PERFORMANCE_DAILY_METRICS:
+                    last_dates.setdefault(metric, fallback_date)
+                advance_insight_watermarks(db, store_id, last_dates)
+                db.commit()
             
             # Include debug info about API response structure
             first_series = metrics_data.get("multiDailyMetricTimeSeries", [{}])[0] if metrics_data else {}
@@ -277,8 +337,9 @@ class GoogleSyncService:
                 "first_series_sample": str(first_series)[:500] if first_series else "empty",
             }
             
-            return {"status": "success", "message": f"Metrics updated for {len(daily_data)} days", "count": synced_count, "debug": debug_info}
+            return {"status": "success", "message": f"Metrics updated for {len(daily_data)} days", "count": synced_count, "backfill": is_backfill, "debug": debug_info}
         except Exception as e:
+            await self._rollback(db) # Failed write blocks already rolled back; this clears a failed read
             error_msg = str(e)
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -291,38 +352,36 @@ class GoogleSyncService:
     async def sync_media(self, db: Session, store_id: str, location_id: str):
         """Fetch photos/videos"""
         try:
-            media_items = self.gbp.list_media(location_id)
+            media_items = await self.gbp.list_media(location_id)
             synced_count = 0
             
             # Handle empty
             if not media_items or not media_items.get("mediaItems"):
                  return {"status": "success", "count": 0, "message": "No media found"}
             
-            for item in media_items.get("mediaItems", []):
-                media_id = item.get("name") # resource name
-                
-                existing = db.query(models.MediaItem).filter(models.MediaItem.google_media_id == media_id).first()
-                
-                if not existing:
-                    new_item = models.MediaItem(
-                        store_id=store_id,
-                        google_media_id=media_id,
-                        media_format=item.get("mediaFormat", "PHOTO"),
-                        location_association=item.get("locationAssociation", {}).get("category"),
-                        google_url=item.get("googleUrl"),
-                        thumbnail_url=item.get("thumbnailUrl"),
-                        description=item.get("description"),
-                        views=item.get("insights", {}).get("viewCount", 0),
-                        create_time=datetime.utcnow() # API might not provide create time easily
-                    )
-                    db.add(new_item)
-                    synced_count += 1
-                else:
-                    existing.views = item.get("insights", {}).get("viewCount", 0)
-
-            db.commit()
+            async with self._db_write(db):
+                result = reconcile(
+                    db, models.MediaItem, models.MediaItem.google_media_id,
+                    media_items.get("mediaItems", []),
+                    key_of=lambda item: item.get("name"), # resource name
+                    new_values=lambda item: {
+                        "store_id": store_id,
+                        "media_format": item.get("mediaFormat", "PHOTO"),
+                        "location_association": item.get("locationAssociation", {}).get("category"),
+                        "google_url": item.get("googleUrl"),
+                        "thumbnail_url": item.get("thumbnailUrl"),
+                        "description": item.get("description"),
+                        "views": item.get("insights", {}).get("viewCount", 0),
+                        "create_time": datetime.utcnow(), # API might not provide create time easily
+                    },
+                    update_values=lambda item: {"views": item.get("insights", {}).get("viewCount", 0)},
+                    scope=[models.MediaItem.store_id == store_id],
+                )
+                synced_count = result.created
+                db.commit()
             return {"status": "success", "count": synced_count}
         except Exception as e:
+            await self._rollback(db) # Failed write blocks already rolled back; this clears a failed read
             error_msg = str(e)
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -338,36 +397,33 @@ class GoogleSyncService:
     async def sync_qa(self, db: Session, store_id: str, location_id: str):
         """Fetch Questions and Answers"""
         try:
-            questions = self.gbp.list_questions(location_id)
+            questions = await self.gbp.list_questions(location_id)
             q_count = 0
             
             # Handle empty
             if not questions or not questions.get("questions"):
                  return {"status": "success", "count": 0, "message": "No questions found"}
             
-            for q_data in questions.get("questions", []):
-                q_id = q_data.get("name")
-                existing_q = db.query(models.Question).filter(models.Question.google_question_id == q_id).first()
-                
-                if not existing_q:
-                    existing_q = models.Question(
-                        store_id=store_id,
-                        google_question_id=q_id,
-                        text=q_data.get("text"),
-                        authore_name=q_data.get("author", {}).get("displayName", "Anonymous"),
-                        upvote_count=q_data.get("upvoteCount", 0),
-                        create_time=datetime.utcnow() # Approx
-                    )
-                    db.add(existing_q)
-                    q_count += 1
-                    db.flush() # get ID
-                
+            async with self._db_write(db):
+                result = reconcile(
+                    db, models.Question, models.Question.google_question_id,
+                    questions.get("questions", []),
+                    key_of=lambda q: q.get("name"),
+                    new_values=lambda q_data: {
+                        "store_id": store_id,
+                        "text": q_data.get("text"),
+                        "authore_name": q_data.get("author", {}).get("displayName", "Anonymous"),
+                        "upvote_count": q_data.get("upvoteCount", 0),
+                        "create_time": datetime.utcnow(), # Approx
+                    },
+                    scope=[models.Question.store_id == store_id],
+                )
                 # Fetch Answers logic skipped for brevity/rate limits as before
-                pass 
-                
-            db.commit()
+                q_count = result.created
+                db.commit()
             return {"status": "success", "message": f"Synced {q_count} questions"}
         except Exception as e:
+            await self._rollback(db) # Failed write blocks already rolled back; this clears a failed read
             error_msg = str(e)
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -387,7 +443,8 @@ class GoogleSyncService:
             # We don't trust the stored location_id. We verify it against the live account list.
             print(f"DEBUG: Starting Aggressive Discovery for Store {store_id} (Current ID: {location_id})")
             
-            store = db.query(models.Store).filter(models.Store.id == store_id).first()
+            async with self._db_write(db):
+                store = db.query(models.Store).filter(models.Store.id == store_id).first()
             if not store:
                 return {"status": "error", "message": "Store not found in DB"}
 
@@ -395,7 +452,7 @@ class GoogleSyncService:
             fresh_details = None
             
             try:
-                accounts = self.gbp.list_accounts()
+                accounts = await self.gbp.list_accounts()
                 target_suffix = location_id.split("/")[-1] if location_id else ""
                 
                 # We also look for title match if ID fails
@@ -406,7 +463,7 @@ class GoogleSyncService:
                 single_candidate = None
 
                 for account in accounts.get("accounts", []):
-                    locs = self.gbp.list_locations(account["name"])
+                    locs = await self.gbp.list_locations(account["name"])
                     if not locs.get("locations"):
                         continue
                         
@@ -446,11 +503,12 @@ class GoogleSyncService:
             # Update DB if we found a better ID
             final_location_id = fresh_location_id if fresh_location_id else location_id
             
-            if fresh_location_id and fresh_location_id != location_id:
-                 print(f"DEBUG: Updating Rotten ID {location_id} -> {fresh_location_id}")
-                 store.google_location_id = fresh_location_id
-                 db.commit() # Commit ID change immediately
-                 final_location_id = fresh_location_id
+            async with self._db_write(db):
+                if fresh_location_id and fresh_location_id != location_id:
+                     print(f"DEBUG: Updating Rotten ID {location_id} -> {fresh_location_id}")
+                     store.google_location_id = fresh_location_id
+                     db.commit() # Commit ID change immediately
+                     final_location_id = fresh_location_id
 
             # --- FETCH DETAILS ---
             # If we already have details from discovery (full mask), use them.
@@ -458,7 +516,7 @@ class GoogleSyncService:
             if fresh_details:
                 details = fresh_details
             else:
-                details = self.gbp.get_location_details(final_location_id)
+                details = await self.gbp.get_location_details(final_location_id)
 
             # --- NORMALIZATION & ENRICHMENT ---
             # 1. Address: Map storeAddress -> postalAddress (v1 -> v4/DB compatibility)
@@ -474,14 +532,14 @@ class GoogleSyncService:
                      # 2a. Fetch Location Attributes (Values)
                      current_attrs = details.get("attributes", [])
                      if not current_attrs:
-                         attrs_resp = self.gbp.list_attributes(final_location_id)
+                         attrs_resp = await self.gbp.list_attributes(final_location_id)
                          current_attrs = attrs_resp.get("attributes", [])
                      
                      if current_attrs:
                          print(f"DEBUG: Found {len(current_attrs)} attributes. Fetching metadata for display names...")
                          # 2b. Fetch Metadata (Display Names)
                          # TODO: Cache this? For now, fetch every time (it's fast enough for single location syncs)
-                         meta_resp = self.gbp.get_attribute_metadata(language_code="ja", country_code="JP")
+                         meta_resp = await self.gbp.get_attribute_metadata(language_code="ja", country_code="JP")
                          meta_map = { a["attributeId"]: a.get("displayName") for a in meta_resp.get("attributes", []) }
                          
                          # 2c. Merge Display Names
@@ -515,10 +573,10 @@ class GoogleSyncService:
                 try:
                     # 1. Iterate accounts to find the location using robust search
                     account_name = None
-                    accounts = self.gbp.list_accounts()
+                    accounts = await self.gbp.list_accounts()
                     for acc in accounts.get("accounts", []):
                         # Use robust find which filters server-side
-                        loc = self.gbp.find_location_robust(acc["name"], location_id)
+                        loc = await self.gbp.find_location_robust(acc["name"], location_id)
                         if loc:
                             print(f"DEBUG: Found location via robust fallback: {loc['name']}")
                             
@@ -552,7 +610,7 @@ class GoogleSyncService:
             # Rescue Address
             if not details.get("postalAddress") or not details.get("postalAddress", {}).get("postalCode"):
                 print("DEBUG: Attempting isolated rescue for postalAddress...")
-                rescue_data = self.gbp.get_location_details(final_location_id, read_mask="postalAddress")
+                rescue_data = await self.gbp.get_location_details(final_location_id, read_mask="postalAddress")
                 if rescue_data.get("postalAddress"):
                     details["postalAddress"] = rescue_data["postalAddress"]
                     print("DEBUG: Isolated rescue for postalAddress SUCCESS")
@@ -561,7 +619,7 @@ class GoogleSyncService:
             if not details.get("attributes"):
                 print("DEBUG: Attempting isolated rescue for attributes...")
                 try:
-                    attrs_resp = self.gbp.list_attributes(final_location_id)
+                    attrs_resp = await self.gbp.list_attributes(final_location_id)
                     if attrs_resp.get("attributes"):
                         details["attributes"] = attrs_resp["attributes"]
                         print("DEBUG: Isolated rescue for attributes SUCCESS")
@@ -570,14 +628,14 @@ class GoogleSyncService:
             # Rescue Hours
             if not details.get("regularHours"):
                 print("DEBUG: Attempting isolated rescue for regularHours...")
-                rescue_data = self.gbp.get_location_details(location_id, read_mask="regularHours")
+                rescue_data = await self.gbp.get_location_details(location_id, read_mask="regularHours")
                 if rescue_data.get("regularHours"):
                     details["regularHours"] = rescue_data["regularHours"]
                     print("DEBUG: Isolated rescue for regularHours SUCCESS")
                     
             # Rescue Service Area
             if not details.get("serviceArea"):
-                 rescue_data = self.gbp.get_location_details(location_id, read_mask="serviceArea")
+                 rescue_data = await self.gbp.get_location_details(location_id, read_mask="serviceArea")
                  if rescue_data.get("serviceArea"):
                      details["serviceArea"] = rescue_data["serviceArea"]
             
@@ -600,88 +658,90 @@ class GoogleSyncService:
                          print("DEBUG: Sanitizer Polyfilled addressLines with administrativeArea")
                 details["postalAddress"] = addr
 
-            store = db.query(models.Store).filter(models.Store.id == store_id).first()
-            if store:
-                store.gbp_data = details
-                store.last_synced_at = datetime.utcnow()
+            async with self._db_write(db):
+                store = db.query(models.Store).filter(models.Store.id == store_id).first()
+                if store:
+                    store.gbp_data = details
+                    store.last_synced_at = datetime.utcnow()
                 
-                # Map top-level fields for system consistency (AI context, etc.)
-                if details.get("title"): 
-                    store.name = details.get("title")
+                    # Map top-level fields for system consistency (AI context, etc.)
+                    if details.get("title"): 
+                        store.name = details.get("title")
                 
-                # Description
-                if details.get("profile") and details["profile"].get("description"):
-                    store.description = details["profile"]["description"]
+                    # Description
+                    if details.get("profile") and details["profile"].get("description"):
+                        store.description = details["profile"]["description"]
                 
-                # Category
-                if details.get("categories") and details["categories"].get("primaryCategory"):
-                    store.category = details["categories"]["primaryCategory"].get("displayName")
+                    # Category
+                    if details.get("categories") and details["categories"].get("primaryCategory"):
+                        store.category = details["categories"]["primaryCategory"].get("displayName")
 
-                # --- Detailed Sync Implementation (Copied from locations.py) ---
+                    # --- Detailed Sync Implementation (Copied from locations.py) ---
        
-                # Phone Number
-                if details.get("phoneNumbers") and details["phoneNumbers"].get("primaryPhone"):
-                   store.phone_number = details["phoneNumbers"]["primaryPhone"]
+                    # Phone Number
+                    if details.get("phoneNumbers") and details["phoneNumbers"].get("primaryPhone"):
+                       store.phone_number = details["phoneNumbers"]["primaryPhone"]
            
-                # Website
-                if details.get("websiteUri"):
-                   store.website_url = details["websiteUri"]
+                    # Website
+                    if details.get("websiteUri"):
+                       store.website_url = details["websiteUri"]
            
-                # Address Components
-                # Try to use formatted address first as it's most reliable for display
-                if details.get("postalAddress"):
-                   addr = details["postalAddress"]
-                   store.zip_code = addr.get("postalCode")
-                   store.prefecture = addr.get("administrativeArea")
+                    # Address Components
+                    # Try to use formatted address first as it's most reliable for display
+                    if details.get("postalAddress"):
+                       addr = details["postalAddress"]
+                       store.zip_code = addr.get("postalCode")
+                       store.prefecture = addr.get("administrativeArea")
            
-                   # Logic for Japanese Addresses usually:
-                   # Prefecture + Locality + AddressLines
+                       # Logic for Japanese Addresses usually:
+                       # Prefecture + Locality + AddressLines
                    
-                   city_val = addr.get("locality", "")
-                   sub_locality = addr.get("subLocality", "") # Some JP addresses use this
+                       city_val = addr.get("locality", "")
+                       sub_locality = addr.get("subLocality", "") # Some JP addresses use this
                    
-                   if sub_locality:
-                        city_val = f"{city_val}{sub_locality}"
+                       if sub_locality:
+                            city_val = f"{city_val}{sub_locality}"
 
-                   address_lines = addr.get("addressLines", [])
+                       address_lines = addr.get("addressLines", [])
            
-                   if address_lines:
-                        store.address_line2 = "".join(address_lines)
-                   else:
-                       store.address_line2 = None
+                       if address_lines:
+                            store.address_line2 = "".join(address_lines)
+                       else:
+                           store.address_line2 = None
                
-                   store.city = city_val
+                       store.city = city_val
            
-                   # Update full address string as fallback/display
-                   full_addr = f"〒{store.zip_code or ''} {store.prefecture or ''}{store.city or ''}{store.address_line2 or ''}"
-                   store.address = full_addr
-                else:
-                    # If we have basic info but no address, it might be an SAB.
-                    if details.get("serviceArea"):
-                        store.address = "出張型サービス/非店舗型" # "Service Area Business"
+                       # Update full address string as fallback/display
+                       full_addr = f"〒{store.zip_code or ''} {store.prefecture or ''}{store.city or ''}{store.address_line2 or ''}"
+                       store.address = full_addr
+                    else:
+                        # If we have basic info but no address, it might be an SAB.
+                        if details.get("serviceArea"):
+                            store.address = "出張型サービス/非店舗型" # "Service Area Business"
 
-                # Regular Hours
-                if details.get("regularHours"):
-                   # Store as JSON 
-                   store.regular_hours = details["regularHours"]
+                    # Regular Hours
+                    if details.get("regularHours"):
+                       # Store as JSON 
+                       store.regular_hours = details["regularHours"]
            
-                # Attributes
-                if details.get("attributes"):
-                    store.attributes = details["attributes"]
+                    # Attributes
+                    if details.get("attributes"):
+                        store.attributes = details["attributes"]
                     
-                 # Lat/Lng
-                # if details.get("latlng"):
-                #    store.latitude = details["latlng"].get("latitude")
-                #    store.longitude = details["latlng"].get("longitude")
+                     # Lat/Lng
+                    # if details.get("latlng"):
+                    #    store.latitude = details["latlng"].get("latitude")
+                    #    store.longitude = details["latlng"].get("longitude")
 
-                db.commit()
+                    db.commit()
                 
-                # Return the final details object so caller has the latest
-                return {"status": "success", "message": "Location details updated", "data": details}
+                    # Return the final details object so caller has the latest
+                    return {"status": "success", "message": "Location details updated", "data": details}
                  
         except Exception as e:
              import traceback
              traceback.print_exc()
+             await self._rollback(db)
              return {"status": "error", "message": f"Sync Location Error: {str(e)}"}
 
 # Helper to instantiate service
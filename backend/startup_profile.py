@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Boot-time profile: main.py wraps each startup phase in phase(), and the lifespan
+# prints report() once the app is ready to serve. Import this module first so the
+# clock starts as close to process start as possible.
+# scripts/check_startup_time.py gives the per-module breakdown (python -X importtime).
+
+STARTED_AT = time.perf_counter()
+
+# Cold start budget (seconds, import of main.py through lifespan startup).
+# Render fails the deploy when the health check does not answer in time.
+STARTUP_TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", "5"))
+
+# Loaded on first use by the routes/jobs that need them; listed in the report if something
+# pulls them in at boot again.
+DEFERRED_MODULES = ("openai", "reportlab", "bs4", "requests_oauthlib", "apscheduler", "googleapiclient")
+
+_phases = []
+
+@contextmanager
+def phase(label: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((label, time.perf_counter() - start))
+
+def elapsed() -> float:
+    return time.perf_counter() - STARTED_AT
+
+def report():
+    total = elapsed()
+    print(f"Startup profile: ready in {total:.2f}s (target {STARTUP_TARGET_SECONDS:.1f}s)")
+    for label, seconds in _phases:
+        print(f"  {label:<24} {seconds:6.2f}s")
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    if loaded:
+        print(f"  deferred modules loaded at boot: {', '.join(loaded)}")
+    if total > STARTUP_TARGET_SECONDS:
+        print(f"WARNING: startup took {total:.2f}s, over the {STARTUP_TARGET_SECONDS:.1f}s target")
+    return total